@@ -0,0 +1,79 @@
+# benchmark_callback_router.py
+# مقایسه هزینه پیدا کردن هندلر دکمه‌ها: پیمایش خطی فیلترهای lambda (رفتار قبلی callback_query_handler ها)
+# و مسیریاب Trie (bot.utils.callback_router) با همه مسیرهای فعلی ربات.
+# اجرا: python benchmark_callback_router.py
+import time
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot.utils.callback_router import callback_router
+# ایمپورت روترها همه مسیرها را ثبت می‌کند (ترتیب همان custom_bot)
+from bot.admin_router import handle_unknown_admin_callback
+import bot.user_router  # noqa: F401 -- فقط برای ثبت مسیرهای دکمه‌های کاربر در callback_router
+
+ADMIN_ID = 1
+
+
+def _linear_filters():
+    """معادل فیلترهای قبلی: هر مسیر یک lambda که به ترتیب ثبت امتحان می‌شود."""
+    filters = []
+    for route in sorted(callback_router.routes, key=lambda r: r.seq):
+        kind, key = route.name.split(':', 1)
+        if kind == 'exact':
+            filters.append((lambda call, k=key: call.data == k, route))
+        else:
+            filters.append((lambda call, k=key: call.data.startswith(k), route))
+    return filters
+
+
+def _samples():
+    """برای هر مسیر یک callback_data نمونه (مسیرهای پیشوندی با پارامتر)."""
+    samples = []
+    for route in callback_router.routes:
+        kind, key = route.name.split(':', 1)
+        data = key if kind == 'exact' else f"{key}12345:2"
+        samples.append(SimpleNamespace(data=data, from_user=SimpleNamespace(id=ADMIN_ID)))
+    return samples
+
+
+def benchmark(rounds: int = 200):
+    # گارد ادمین در بنچمارک همیشه True است تا مسیرهای ادمین هم سنجیده شوند
+    for route in callback_router.routes:
+        if route.guard is not None:
+            route.guard = lambda call: True
+    callback_router.prefix("admin:")(handle_unknown_admin_callback)
+
+    filters = _linear_filters()
+    samples = _samples()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for call in samples:
+            for check, route in filters:
+                if check(call):
+                    break
+    linear_us = (time.perf_counter() - started) * 1e6 / (rounds * len(samples))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for call in samples:
+            callback_router.match(call)
+    trie_us = (time.perf_counter() - started) * 1e6 / (rounds * len(samples))
+
+    mismatches = 0
+    for call in samples:
+        expected = next((route for check, route in filters if check(call)), None)
+        if callback_router.match(call) is not expected:
+            mismatches += 1
+
+    print(f"routes: {len(callback_router.routes)}   samples: {len(samples)}   rounds: {rounds}")
+    print(f"{'dispatcher':<12}{'us/callback':>14}")
+    print(f"{'linear':<12}{linear_us:>14.2f}")
+    print(f"{'trie':<12}{trie_us:>14.2f}")
+    print(f"speedup: {linear_us / trie_us:.1f}x   route mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    benchmark()
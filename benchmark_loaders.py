@@ -0,0 +1,63 @@
+# benchmark_loaders.py
+# مقایسه تعداد کوئری‌ها و زمان اسکن‌های حجیم با رفتار قدیمی (lazy="selectin" روی همه روابط)
+# و حالت فعلی (بدون لود ضمنی، فقط پروفایل‌های صریح bot.db.loaders).
+# اجرا: python benchmark_loaders.py
+import asyncio
+import os
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot.db.base import DatabaseManager, User, UserUUID
+from bot.db.instrumentation import query_scope, query_stats
+
+# معادل لودهایی که قبلا با هر select(UserUUID) / select(User) به‌طور خودکار اجرا می‌شد
+LEGACY_UUID_OPTIONS = (
+    selectinload(UserUUID.user).selectinload(User.uuids),
+    selectinload(UserUUID.allowed_panels),
+)
+LEGACY_USER_OPTIONS = (
+    selectinload(User.uuids).selectinload(UserUUID.allowed_panels),
+)
+
+SCANS = [
+    # (نام، کوئری) — همان الگوی hourly_snapshots / sync_users_with_panels / بکاپ JSON / گزارش هفتگی
+    ("uuids_legacy", lambda: select(UserUUID).options(*LEGACY_UUID_OPTIONS)),
+    ("uuids_lazy", lambda: select(UserUUID)),
+    ("active_uuids_legacy", lambda: select(UserUUID).where(UserUUID.is_active == True).options(*LEGACY_UUID_OPTIONS)),
+    ("active_uuids_lazy", lambda: select(UserUUID).where(UserUUID.is_active == True)),
+    ("users_legacy", lambda: select(User).options(*LEGACY_USER_OPTIONS)),
+    ("users_lazy", lambda: select(User)),
+]
+
+
+async def benchmark(rounds: int = 3):
+    if not os.getenv("DATABASE_URL"):
+        print("❌ خطا: DATABASE_URL پیدا نشد. مطمئن شوید فایل .env وجود دارد.")
+        return
+
+    db = DatabaseManager()
+    query_stats.reset()
+    rows = {}
+
+    for _ in range(rounds):
+        for name, build in SCANS:
+            # هر اجرا در سشن جدا تا identity map نتیجه را تحت تاثیر قرار ندهد
+            async with db.read_session() as session:
+                with query_scope(name):
+                    result = await session.execute(build())
+                    rows[name] = len(result.scalars().all())
+
+    print(f"{'scan':<22}{'rows':>8}{'queries/run':>14}{'sql ms/run':>14}")
+    for name, _ in SCANS:
+        st = query_stats.scopes.get(name)
+        if not st:
+            continue
+        print(f"{name:<22}{rows[name]:>8}{st['queries'] / st['runs']:>14.1f}{st['sql_ms'] / st['runs']:>14.1f}")
+
+    await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
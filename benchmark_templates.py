@@ -0,0 +1,90 @@
+# benchmark_templates.py
+# مقایسه سرعت رندر گزارش‌ها: مسیر قدیمی (get_string + format + escape_markdown با regex)
+# و قالب‌های کامپایل‌شده (bot.language.get_template) روی داده‌های ساختگی گزارش شبانه.
+# اجرا: python benchmark_templates.py
+import re
+import time
+
+from bot.language import get_string, get_template
+from bot.utils.formatters import format_gb_ltr
+from bot.formatters.user.notifications import NotificationFormatter
+
+_ESCAPE_CHARS = r'_*[]()~`>#+-=|{}.!'
+
+
+def legacy_escape(text) -> str:
+    """پیاده‌سازی قبلی escape_markdown (regex در هر فراخوانی)."""
+    return re.sub(f'([{re.escape(_ESCAPE_CHARS)}])', r'\\\1', str(text))
+
+
+def _fake_users(count: int, services: int = 3) -> list:
+    return [
+        {
+            'name': f"user_{i}.test",
+            'breakdown': {
+                f"panel_{p}": {'type': 'marzban', 'data': {
+                    'usage_limit_GB': 50 + p, 'current_usage_GB': 12.345 + i % 7,
+                    'package_days': 30, 'flag': '🇩🇪',
+                }}
+                for p in range(services)
+            },
+        }
+        for i in range(count)
+    ]
+
+
+KEYS = (
+    ('fmt_report_total_volume', 'volume', 'usage_limit_GB'),
+    ('fmt_report_used_volume', 'usage', 'current_usage_GB'),
+    ('fmt_report_remaining_volume', 'remaining', 'usage_limit_GB'),
+)
+
+
+def render_legacy(user: dict, lang: str) -> str:
+    lines = [f"👤 اکانت : *{legacy_escape(user['name'])}*"]
+    for p_info in user['breakdown'].values():
+        data = p_info['data']
+        for key, field, source in KEYS:
+            lines.append(legacy_escape(get_string(key, lang).format(**{field: format_gb_ltr(data[source])})))
+        lines.append(legacy_escape(get_string('fmt_report_expiry', lang).format(expiry="30 روز")))
+    return "\n".join(lines)
+
+
+def render_compiled(user: dict, lang: str) -> str:
+    lines = [f"👤 اکانت : *{legacy_escape(user['name'])}*"]
+    for p_info in user['breakdown'].values():
+        data = p_info['data']
+        for key, field, source in KEYS:
+            lines.append(get_template(key, lang).render(**{field: format_gb_ltr(data[source])}))
+        lines.append(get_template('fmt_report_expiry', lang).render(expiry="30 روز"))
+    return "\n".join(lines)
+
+
+def _throughput(func, users: list, *args) -> float:
+    started = time.perf_counter()
+    for user in users:
+        func(user, *args)
+    return len(users) / (time.perf_counter() - started)
+
+
+def benchmark(users_count: int = 20000):
+    users = _fake_users(users_count)
+    daily = {'marzban': 0.42}
+
+    mismatches = sum(render_legacy(u, 'fa') != render_compiled(u, 'fa') for u in users[:200])
+
+    print(f"users: {users_count}   services/user: 3")
+    print(f"{'renderer':<22}{'reports/sec':>14}")
+    for name, func, args in (
+        ("legacy (fa)", render_legacy, ('fa',)),
+        ("compiled (fa)", render_compiled, ('fa',)),
+        ("legacy (en)", render_legacy, ('en',)),
+        ("compiled (en)", render_compiled, ('en',)),
+        ("nightly_report", NotificationFormatter.nightly_report, (daily, {})),
+    ):
+        print(f"{name:<22}{_throughput(func, users, *args):>14,.0f}")
+    print(f"output mismatches (first 200): {mismatches}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -10,6 +10,7 @@ from telebot import types
 from sqlalchemy import select
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards.admin import admin_keyboard as admin_menu
 from bot.database import db
 from bot.db.base import Panel, UserUUID
@@ -28,7 +29,7 @@ async def _get_panel_types():
 # ---------------------------------------------------------
 # 1. هندلر منوی اصلی
 # ---------------------------------------------------------
-@bot.callback_query_handler(func=lambda call: call.data == "admin:backup_menu")
+@callback_router.exact("admin:backup_menu")
 async def backup_menu_handler(call: types.CallbackQuery):
     panel_types = await _get_panel_types()
     
@@ -49,7 +50,7 @@ async def backup_menu_handler(call: types.CallbackQuery):
 # ---------------------------------------------------------
 # 2. هندلر تغییر فیلتر
 # ---------------------------------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("admin:backup_filter:"))
+@callback_router.prefix("admin:backup_filter:")
 async def change_backup_filter(call: types.CallbackQuery):
     new_filter = call.data.split(":")[2]
     panel_types = await _get_panel_types()
@@ -78,7 +79,7 @@ async def change_backup_filter(call: types.CallbackQuery):
 # ---------------------------------------------------------
 # 3. هندلر بکاپ از پنل‌ها (API Fetch)
 # ---------------------------------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("admin:backup:"))
+@callback_router.prefix("admin:backup:")
 async def backup_panel_data(call: types.CallbackQuery):
     parts = call.data.split(":")
     
@@ -3,17 +3,33 @@
 import asyncio
 import logging
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from telebot import types
-from sqlalchemy import select, func, distinct, and_, or_
+from telebot.apihelper import ApiTelegramException
 
 from bot.bot_instance import bot
 from bot.keyboards.admin import admin_keyboard as admin_menu
 from bot.database import db
-from bot.db.base import User, UserUUID, BroadcastTask, UsageSnapshot
+from bot.db.base import BroadcastTask
+from bot.db.broadcast import BASE_SEGMENTS
+from bot.services.send_scheduler import Priority, send_priority
+from bot.utils.formatters import escape_markdown
 
 logger = logging.getLogger(__name__)
 
+BROADCAST_BATCH_SIZE = 50
+
+# تسک‌هایی که همین الان در این پروسه در حال ارسال هستند (جلوگیری از اجرای تکراری)
+_running_broadcasts = set()
+# ارجاع به تسک‌های پس‌زمینه برادکست؛ حلقه رویداد فقط ارجاع ضعیف نگه می‌دارد
+_broadcast_tasks = set()
+
+
+def _spawn_broadcast(task_id: int):
+    task = asyncio.create_task(_run_persistent_broadcast(task_id))
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
+
 async def start_broadcast_flow(call: types.CallbackQuery, params: list):
     """شروع فرآیند: محاسبه تعداد و نمایش منوی انتخاب هدف"""
     uid = call.from_user.id
@@ -22,42 +38,16 @@ async def start_broadcast_flow(call: types.CallbackQuery, params: list):
     if uid in bot.context_state:
         del bot.context_state[uid]
 
-    # محاسبه تعداد کاربران برای هر گروه
-    counts = {
-        "all": 0,
-        "online": 0,
-        "active_1": 0,
-        "inactive_7": 0,
-        "inactive_0": 0
-    }
-
-    async with db.get_session() as session:
-        # 1. همه کاربران
-        counts["all"] = await session.scalar(select(func.count(User.user_id))) or 0
-
-        # 2. کاربران فعال (سرویس فعال دارند)
-        counts["active_1"] = await session.scalar(select(func.count(UserUUID.id)).where(UserUUID.is_active == True)) or 0
-
-        # 3. کاربران آنلاین (۲۴ ساعت اخیر)
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        # استفاده از distinct برای شمارش کاربرانی که حداقل یک اسنپ‌شات در ۲۴ ساعت اخیر دارند
-        counts["online"] = await session.scalar(
-            select(func.count(distinct(UsageSnapshot.uuid_id)))
-            .where(UsageSnapshot.taken_at >= yesterday)
-        ) or 0
-
-        # 4. هرگز متصل نشده (ترافیک مصرفی 0 یا بدون اولین اتصال)
-        counts["inactive_0"] = await session.scalar(
-            select(func.count(UserUUID.id))
-            .where(and_(UserUUID.is_active == True, or_(UserUUID.traffic_used == 0, UserUUID.first_connection_time.is_(None))))
-        ) or 0
-        
-        # 5. غیرفعال هفتگی (محاسبه دقیقش سنگینه، فعلا تقریبی یا 0 میذاریم یا باید کوئری پیچیده زد)
-        # برای سرعت بیشتر فعلا 0 یا یک کوئری ساده‌تر
-        counts["inactive_7"] = "?" 
+    # تعداد اعضای هر بخش از قبل محاسبه شده است (بعد از هر اسنپ‌شات/همگام‌سازی)؛ شمارش زنده انجام نمی‌شود
+    segments = await db.get_audience_segments()
+    if not segments:
+        await db.refresh_audience_segments()
+        segments = await db.get_audience_segments()
+    counts = {seg['key']: seg['count'] for seg in segments}
+    extra_segments = [seg for seg in segments if seg['key'] not in BASE_SEGMENTS]
 
     # ارسال تعداد به کیبورد
-    markup = await admin_menu.broadcast_target_menu(counts)
+    markup = await admin_menu.broadcast_target_menu(counts, extra_segments)
     
     await bot.edit_message_text(
         "لطفاً جامعه هدف برای ارسال پیام همگانی را انتخاب کنید:", # ✅ متن تغییر کرد
@@ -79,7 +69,11 @@ async def ask_for_broadcast_message(call: types.CallbackQuery, params: list):
         "inactive_7": "غیرفعال",
         "inactive_0": "هرگز متصل نشده"
     }
-    target_name = targets_fa.get(target_type, target_type)
+    target_name = targets_fa.get(target_type)
+    if not target_name:
+        # بخش‌های پلن و دسته‌بندی
+        labels = {seg['key']: seg['label'] for seg in await db.get_audience_segments()}
+        target_name = escape_markdown(labels.get(target_type, target_type))
 
     markup = types.InlineKeyboardMarkup()
     markup.add(types.InlineKeyboardButton("🔙 بازگشت به منوی قبل", callback_data="admin:broadcast"))
@@ -205,62 +199,97 @@ async def broadcast_confirm(call: types.CallbackQuery, params: list):
         parse_mode='MarkdownV2'
     )
 
-    asyncio.create_task(_run_persistent_broadcast(task_id))
+    _spawn_broadcast(task_id)
+
+def _classify_failure(error: Exception) -> str:
+    """نوع خطای ارسال: blocked، deactivated، flood یا other."""
+    if isinstance(error, ApiTelegramException):
+        if error.error_code == 429:
+            return 'flood'
+        description = (error.description or '').lower()
+        if 'blocked' in description:
+            return 'blocked'
+        if 'deactivated' in description:
+            return 'deactivated'
+    return 'other'
+
 
 async def _run_persistent_broadcast(task_id: int):
-    """تسک اصلی ارسال پیام‌ها"""
-    async with db.get_session() as session:
-        task = await session.get(BroadcastTask, task_id)
-        if not task: return
-        
-        target = task.target_type
-        msg_id = task.message_id
-        from_chat = task.from_chat_id
-        admin_id = task.admin_id
-
-        stmt = select(User.user_id).distinct()
-        if target == 'active_1':
-            stmt = stmt.join(UserUUID).where(UserUUID.is_active == True)
-        elif target == 'online':
-            yesterday = datetime.utcnow() - timedelta(days=1)
-            stmt = stmt.join(UserUUID).join(UsageSnapshot).where(UsageSnapshot.taken_at >= yesterday)
-        elif target == 'inactive_0':
-             stmt = stmt.join(UserUUID).where(and_(UserUUID.is_active == True, or_(UserUUID.traffic_used == 0, UserUUID.first_connection_time.is_(None))))
-        
-        result = await session.execute(stmt)
-        user_ids = result.scalars().all()
-        
-        task.total_users = len(user_ids)
-        await session.commit()
+    """
+    تسک اصلی ارسال پیام‌ها.
+    مخاطبان دسته به دسته و به ترتیب user_id خوانده می‌شوند و بعد از هر دسته نقطه ادامه و شمارنده‌ها
+    در BroadcastTask ذخیره می‌شود؛ پس از ری‌استارت، ارسال از همان نقطه ادامه پیدا می‌کند
+    (در بدترین حالت فقط آخرین دسته دوباره ارسال می‌شود).
+    """
+    if task_id in _running_broadcasts:
+        return
+    _running_broadcasts.add(task_id)
+    cursor = None
+    try:
+        async with db.get_session() as session:
+            task = await session.get(BroadcastTask, task_id)
+            if not task or task.status != 'in_progress':
+                return
+            target = task.target_type
+            msg_id = task.message_id
+            from_chat = task.from_chat_id
+            admin_id = task.admin_id
+            cursor = task.last_user_id
+
+        if cursor is None:
+            await db.set_broadcast_status(task_id, 'in_progress', total_users=await db.count_broadcast_audience(target))
+        else:
+            logger.info(f"BROADCAST #{task_id}: resuming after user {cursor}")
+
+        # سرعت ارسال را صف مرکزی تعیین می‌کند؛ هر دسته به صورت هم‌زمان و با کمترین اولویت در صف قرار می‌گیرد
+        with send_priority(Priority.BROADCAST):
+            async for batch in db.stream_broadcast_audience(target, cursor, BROADCAST_BATCH_SIZE):
+                # کپی کردن پیام (نیاز دارد که پیام اصلی پاک نشده باشد)
+                results = await asyncio.gather(
+                    *(bot.copy_message(chat_id=uid, from_chat_id=from_chat, message_id=msg_id) for uid in batch),
+                    return_exceptions=True
+                )
+
+                counts = {'sent': 0, 'failed': 0, 'blocked': 0, 'deactivated': 0, 'flood': 0}
+                unreachable = []
+                for uid, result in zip(batch, results):
+                    if not isinstance(result, Exception):
+                        counts['sent'] += 1
+                        continue
+                    counts['failed'] += 1
+                    kind = _classify_failure(result)
+                    if kind in counts:
+                        counts[kind] += 1
+                    if kind in ('blocked', 'deactivated'):
+                        unreachable.append(uid)
+
+                cursor = batch[-1]
+                await db.mark_users_bot_blocked(unreachable)
+                await db.save_broadcast_progress(task_id, cursor, counts)
+
+        await db.set_broadcast_status(task_id, 'completed')
+
+        async with db.get_session() as session:
+            task = await session.get(BroadcastTask, task_id)
 
-    success, failed = 0, 0
-    for uid in user_ids:
         try:
-            # کپی کردن پیام (نیاز دارد که پیام اصلی پاک نشده باشد)
-            await bot.copy_message(chat_id=uid, from_chat_id=from_chat, message_id=msg_id)
-            success += 1
+            await bot.send_message(
+                admin_id,
+                f"✅ *پایان برادکست \\#{task_id}*\n\n"
+                f"📤 موفق: {task.sent_count}\n❌ ناموفق: {task.failed_count}\n"
+                f"🚫 بلاک: {task.blocked_count} \\| 🗑 حذف حساب: {task.deactivated_count} \\| ⏳ محدودیت: {task.flood_count}",
+                parse_mode='MarkdownV2'
+            )
         except Exception:
-            failed += 1
-        await asyncio.sleep(0.05)
+            pass
+    except Exception as e:
+        logger.error(f"BROADCAST #{task_id}: stopped at user {cursor}: {e}", exc_info=True)
+    finally:
+        _running_broadcasts.discard(task_id)
 
-    async with db.get_session() as session:
-        await session.execute(
-            select(BroadcastTask).where(BroadcastTask.id == task_id)
-        ) # فقط برای اطمینان از سشن
-        # آپدیت وضعیت
-        stmt = (
-            BroadcastTask.__table__.update()
-            .where(BroadcastTask.id == task_id)
-            .values(status='completed', sent_count=success, failed_count=failed, updated_at=datetime.utcnow())
-        )
-        await session.execute(stmt)
-        await session.commit()
 
-    try:
-        await bot.send_message(
-            admin_id, 
-            f"✅ *پایان برادکست \#{task_id}*\n\n📤 موفق: {success}\n❌ ناموفق: {failed}", 
-            parse_mode='MarkdownV2'
-        )
-    except Exception:
-        pass
\ No newline at end of file
+async def resume_unfinished_broadcasts():
+    """ادامه برادکست‌هایی که با توقف ربات نیمه‌کاره مانده‌اند (در شروع ربات صدا زده می‌شود)."""
+    for task_id in await db.get_unfinished_broadcast_ids():
+        logger.info(f"BROADCAST #{task_id}: scheduling resume")
+        _spawn_broadcast(task_id)
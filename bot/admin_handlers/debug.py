@@ -2,12 +2,16 @@
 
 import logging
 import asyncio
+import html
 from telebot import types
 from bot.config import ADMIN_IDS
 from bot.utils.formatters import escape_markdown
 from bot.utils.network import _safe_edit
 from bot.database import db
 from bot.keyboards import admin as admin_menu
+from bot.db.instrumentation import query_stats
+from bot.utils.callback_router import callback_router
+from bot.services.send_scheduler import edit_dedup
 
 logger = logging.getLogger(__name__)
 bot = None
@@ -17,7 +21,7 @@ def register_debug_handlers(b, scheduler):
     global bot
     bot = b
 
-    @bot.callback_query_handler(func=lambda call: call.data == "admin:system_stats")
+    @callback_router.exact("admin:system_stats")
     async def system_stats_callback(call: types.CallbackQuery):
         """نمایش وضعیت سرورها به صورت همزمان (Parallel)."""
         uid = call.from_user.id
@@ -66,6 +70,65 @@ def register_debug_handlers(b, scheduler):
 
         await _safe_edit(uid, msg_id, report, reply_markup=kb, parse_mode="MarkdownV2")
 
+    @bot.message_handler(commands=['sqlstats'], func=lambda m: m.from_user.id in ADMIN_IDS)
+    async def sql_stats_command(message):
+        """آمار کوئری‌ها به تفکیک هندلر/جاب و آخرین موارد N+1. با /sqlstats reset آمار صفر می‌شود."""
+        args = message.text.split()[1:]
+        if args and args[0] == 'reset':
+            query_stats.reset()
+            await bot.reply_to(message, "✅ آمار کوئری‌ها صفر شد.")
+            return
+
+        lines = ["🧮 <b>پرهزینه‌ترین هندلرها/جاب‌ها (زمان کل SQL)</b>"]
+        for s in query_stats.top_scopes(8):
+            avg = s['queries'] / s['runs'] if s['runs'] else 0
+            lines.append(f"• <code>{html.escape(s['scope'])}</code>: {s['runs']} اجرا، "
+                         f"میانگین {avg:.1f} کوئری (حداکثر {s['max_queries']})، {s['sql_ms']:.0f}ms")
+
+        lines.append("\n🐢 <b>پرهزینه‌ترین کوئری‌ها</b>")
+        for q in query_stats.top_shapes(5):
+            lines.append(f"• <code>{html.escape(q['scope'])}</code> ×{q['count']} (حداکثر {q['max_per_run']} در یک اجرا)، "
+                         f"{q['total_ms']:.0f}ms\n  <code>{html.escape(q['shape'][:150])}</code>")
+
+        flags = list(query_stats.flags)[-5:]
+        if flags:
+            lines.append("\n⚠️ <b>موارد N+1 اخیر</b>")
+            for f in reversed(flags):
+                lines.append(f"• <code>{html.escape(f['scope'])}</code> ×{f['count']}\n  <code>{html.escape(f['shape'][:150])}</code>")
+
+        text = ""
+        for line in lines:
+            if len(text) + len(line) > 4000:
+                break
+            text += line + "\n"
+        await bot.send_message(message.chat.id, text, parse_mode="HTML")
+
+    @bot.message_handler(commands=['routestats'], func=lambda m: m.from_user.id in ADMIN_IDS)
+    async def route_stats_command(message):
+        """زمان اجرای هندلرهای دکمه‌ها به تفکیک مسیر. با /routestats reset آمار صفر می‌شود."""
+        args = message.text.split()[1:]
+        if args and args[0] == 'reset':
+            callback_router.reset_stats()
+            await bot.reply_to(message, "✅ آمار مسیرها صفر شد.")
+            return
+
+        lines = [f"🧭 <b>پرهزینه‌ترین مسیرهای دکمه‌ها</b> ({len(callback_router.routes)} مسیر ثبت‌شده)"]
+        for r in callback_router.top_routes(15):
+            lines.append(f"• <code>{html.escape(r['route'])}</code>: {r['calls']} اجرا، "
+                         f"میانگین {r['avg_ms']:.1f}ms (حداکثر {r['max_ms']:.0f}ms)، کل {r['total_ms']:.0f}ms"
+                         + (f"، {r['errors']} خطا" if r['errors'] else ""))
+
+        dedup = edit_dedup.stats()
+        lines.append(f"\n✏️ <b>ویرایش‌های بدون تغییر رد شده</b>: {dedup['skipped']} از {dedup['lookups']} "
+                     f"({dedup['tracked']} پیام در حافظه)")
+
+        text = ""
+        for line in lines:
+            if len(text) + len(line) > 4000:
+                break
+            text += line + "\n"
+        await bot.send_message(message.chat.id, text, parse_mode="HTML")
+
     # هندلرهای تست و دیباگ (بدون تغییر عمده، فقط تمیزکاری)
     @bot.message_handler(commands=['test'], func=lambda m: m.from_user.id in ADMIN_IDS)
     async def run_tests(message):
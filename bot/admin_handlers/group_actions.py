@@ -5,7 +5,7 @@ import logging
 from datetime import datetime, timedelta
 from telebot import types
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from bot.db.loaders import loader
 
 from bot.bot_instance import bot
 from bot.keyboards import admin as admin_menu
@@ -176,7 +176,7 @@ async def run_group_action_task(admin_id, action, value, target_type, target_val
     
     async with db.get_session() as session:
         # ساخت کوئری پایه
-        stmt = select(UserUUID).options(selectinload(UserUUID.allowed_panels)).where(UserUUID.is_active == True)
+        stmt = select(UserUUID).options(*loader('uuid_panels')).where(UserUUID.is_active == True)
         
         # اعمال فیلترها (ساده‌سازی شده)
         if target_type == 'filter' and target_value == 'inactive_30_days':
@@ -2,20 +2,19 @@
 
 import uuid as uuid_lib
 import logging
-import asyncio
 import time
 from datetime import datetime, timedelta
 from telebot import types
 from sqlalchemy import select, or_, and_, update
-from sqlalchemy.orm import selectinload
 
 from bot.bot_instance import bot
 from bot.keyboards.admin import admin_keyboard as admin_menu
 from bot.keyboards.base import CATEGORY_META
 from bot.database import db
 from bot.db.base import User, UserUUID, Panel, UserUUID, ServerCategory
+from bot.db.loaders import loader
 from bot.utils.formatters import escape_markdown
-from bot.utils.network import _safe_edit
+from bot.utils.network import _safe_edit, delete_message_delayed
 from bot.utils.date_helpers import to_shamsi
 from bot.utils.parsers import validate_uuid
 from bot import combined_handler
@@ -82,7 +81,7 @@ async def process_search_input(message: types.Message):
     step = data['step']
     
     async with db.get_session() as session:
-        stmt = select(User).distinct().options(selectinload(User.uuids))
+        stmt = select(User).distinct().options(*loader('user_uuids'))
         
         if step == 'tid_search':
             if not query.isdigit():
@@ -417,7 +416,7 @@ async def get_new_user_telegram_id(message: types.Message):
     
     if not text.isdigit():
         msg = await bot.send_message(uid, "❌ لطفاً فقط عدد وارد کنید.")
-        asyncio.create_task(_auto_delete(msg, 3))
+        await _auto_delete(msg, 3)
         return
 
     admin_conversations[uid]['data']['telegram_id'] = text
@@ -663,12 +662,8 @@ async def handle_cancel_process(call: types.CallbackQuery, params: list):
     except: pass
 
 async def _auto_delete(msg, seconds):
-    """پیام را بعد از چند ثانیه حذف می‌کند"""
-    await asyncio.sleep(seconds)
-    try:
-        await msg.delete()
-    except:
-        pass
+    """پیام را بعد از چند ثانیه حذف می‌کند (تایمر پایدار timer_wheel)"""
+    await delete_message_delayed(msg.chat.id, msg.message_id, seconds)
 
 # ==============================================================================
 # 4. ویرایش سرویس (Edit User - Volume/Days)
@@ -1759,12 +1754,11 @@ async def handle_user_access_panel_list(call, params):
     async with db.get_session() as session:
         from bot.db.base import UserUUID, Panel, PanelNode, ServerCategory
         from sqlalchemy import select
-        from sqlalchemy.orm import selectinload
         
         # دریافت کاربر و پنل‌های مجاز
         stmt_user = (
             select(UserUUID)
-            .options(selectinload(UserUUID.allowed_panels))
+            .options(*loader('uuid_panels'))
             .where(UserUUID.user_id == input_id)
             .limit(1)
         )
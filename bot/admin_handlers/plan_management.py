@@ -142,6 +142,7 @@ async def handle_delete_plan_execute(call, params):
         if plan:
             await session.delete(plan)
             await session.commit()
+            db.invalidate_menu_cache()
             await bot.answer_callback_query(call.id, "✅ حذف شد.")
             await handle_plan_management_menu(call, [])
         else:
@@ -285,6 +286,7 @@ async def get_plan_save(message: types.Message):
             )
             session.add(new_plan)
             await session.commit()
+        db.invalidate_menu_cache()
             
         await _safe_edit(uid, msg_id, "✅ پلن جدید ساخته شد\.", reply_markup=types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 بازگشت", callback_data="admin:plan_manage")))
     
@@ -412,6 +414,7 @@ async def get_plan_edit_finish(message: types.Message):
         stmt = update(Plan).where(Plan.id == plan_id).values(**changes)
         await session.execute(stmt)
         await session.commit()
+    db.invalidate_menu_cache()
     
     await _safe_edit(uid, msg_id, "✅ پلن با موفقیت ویرایش شد\.", reply_markup=types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 بازگشت", callback_data=f"admin:plan_details:{plan_id}")))
     
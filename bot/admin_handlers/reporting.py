@@ -5,27 +5,24 @@ import os
 import functools
 import asyncio
 import aiofiles
-from abc import ABC, abstractmethod
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from telebot import types
-from sqlalchemy import select, func, and_, or_, desc, distinct, String
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, and_, desc, distinct
+from bot.db.loaders import loader
+from bot.db.pagination import is_cursor
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards.admin import admin_keyboard as admin_menu
 from bot.database import db
 from bot.db.base import (
     User, UserUUID, WalletTransaction, ScheduledMessage, 
-    Panel, SystemConfig, UsageSnapshot
+    Panel
 )
-from bot.db import queries
-from bot.utils.date_helpers import to_shamsi, format_relative_time, days_until_next_birthday
 from bot.utils.network import _safe_edit
 from bot.utils.formatters import escape_markdown, write_csv_sync, format_usage, format_currency
-from bot.services.panels import PanelFactory
 from bot.services.report_strategies import (
-    ReportStrategy,
     OnlineUsersStrategy,
     ActiveUsersStrategy,
     InactiveUsersStrategy,
@@ -49,345 +46,9 @@ LRM = "\u200e"
 RLM = "\u200f"
 
 # ---------------------------------------------------------
-# بخش ۱: استراتژی‌های گزارش (Report Strategies)
+# بخش ۱: استراتژی‌های گزارش (پیاده‌سازی در bot/services/report_strategies.py)
 # ---------------------------------------------------------
 
-class ReportStrategy(ABC):
-    """کلاس پایه برای تمام انواع گزارش‌ها"""
-    @abstractmethod
-    async def generate(self, session, params: list, offset: int, limit: int) -> tuple[list, int, str]:
-        """
-        خروجی: (لیست آیتم‌های فرمت شده، تعداد کل، عنوان گزارش)
-        """
-        pass
-
-# --- استراتژی‌های مربوط به پنل ---
-
-class BasePanelStrategy(ReportStrategy):
-    """کلاس والد برای گزارش‌های پنل جهت جلوگیری از تکرار کد"""
-    
-    async def _fetch_and_parse_users(self, session, panel_id):
-        panel_obj = await session.get(Panel, panel_id)
-        if not panel_obj:
-            raise ValueError("Panel not found")
-
-        try:
-            panel_service = await PanelFactory.get_panel(panel_obj.name)
-            all_users = await panel_service.get_all_users()
-        except Exception as e:
-            logger.error(f"Failed to fetch users from panel {panel_obj.name}: {e}")
-            return [], panel_obj
-        
-        parsed_users = []
-        for u in all_users:
-            last_seen_raw = u.get('online_at') or u.get('last_online') or u.get('last_connection')
-            last_seen_dt = None
-            if last_seen_raw:
-                try:
-                    if isinstance(last_seen_raw, (int, float)):
-                        last_seen_dt = datetime.utcfromtimestamp(float(last_seen_raw))
-                    elif isinstance(last_seen_raw, str):
-                        clean_time = last_seen_raw.replace('Z', '').split('.')[0]
-                        last_seen_dt = datetime.fromisoformat(clean_time)
-                except: pass
-            
-            u['_parsed_last_seen'] = last_seen_dt
-            u['_used_bytes'] = u.get('used_traffic') or (u.get('current_usage_GB', 0) * 1024**3)
-            u['_limit_bytes'] = u.get('transfer_enable') or (u.get('usage_limit_GB', 0) * 1024**3)
-            parsed_users.append(u)
-            
-        return parsed_users, panel_obj
-
-    async def _enrich_with_db_info(self, session, users_list, panel_id):
-        idents = [u.get('uuid') or u.get('username') for u in users_list]
-        idents = [i for i in idents if i]
-        
-        telegram_map = {}
-        db_id_map = {}
-        
-        if idents:
-            stmt = select(UserUUID).where(
-                and_(
-                    UserUUID.allowed_panels.any(id=panel_id),
-                    or_(UserUUID.uuid.cast(String).in_(idents), UserUUID.name.in_(idents))
-                )
-            )
-            db_users = (await session.execute(stmt)).scalars().all()
-            for du in db_users:
-                key_uuid = str(du.uuid) if du.uuid else None
-                key_name = du.name
-                
-                if du.user_id:
-                    if key_uuid: telegram_map[key_uuid] = du.user_id
-                    if key_name: telegram_map[key_name] = du.user_id
-                
-                if key_uuid: db_id_map[key_uuid] = du.id
-                if key_name: db_id_map[key_name] = du.id
-                
-        return telegram_map, db_id_map
-
-    def _format_user_line(self, user, display_name, telegram_id=None):
-        clean_name = display_name.replace('<', '').replace('>', '').replace('[', '').replace(']', '')
-        name_esc = escape_markdown(clean_name)
-        if telegram_id:
-            return f"[{name_esc}](tg://user?id={telegram_id})"
-        return name_esc
-
-class OnlineUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        # فیلتر آنلاین‌ها (۳ دقیقه اخیر)
-        window = timedelta(minutes=3)
-        now_utc = datetime.utcnow()
-        filtered = [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
-        
-        tg_map, db_id_map = await self._enrich_with_db_info(session, filtered, panel_id)
-        
-        # محاسبه مصرف روزانه
-        daily_usage = {}
-        if db_id_map:
-            start_of_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            snap_stmt = select(UsageSnapshot).where(
-                and_(
-                    UsageSnapshot.uuid_id.in_(list(db_id_map.values())),
-                    UsageSnapshot.taken_at >= start_of_day
-                )
-            )
-            snapshots = (await session.execute(snap_stmt)).scalars().all()
-            
-            first_usage_today = {}
-            for snap in snapshots:
-                if snap.uuid_id not in first_usage_today:
-                    total_gb = (snap.hiddify_usage_gb or 0) + (snap.marzban_usage_gb or 0)
-                    first_usage_today[snap.uuid_id] = total_gb * (1024**3)
-
-            for u in filtered:
-                ident = u.get('uuid') or u.get('username')
-                if ident and ident in db_id_map:
-                    db_id = db_id_map[ident]
-                    if db_id in first_usage_today:
-                        daily = u['_used_bytes'] - first_usage_today[db_id]
-                        daily_usage[ident] = max(0, daily)
-
-        total_count = len(filtered)
-        paged_users = filtered[offset : offset + limit]
-        
-        items = []
-        for u in paged_users:
-            ident = u.get('uuid') or u.get('username')
-            name = u.get('username') or u.get('name') or "No Name"
-            link = self._format_user_line(u, name, tg_map.get(ident))
-            
-            usage_bytes = daily_usage.get(ident, 0)
-            usage_str = f"{usage_bytes / (1024**3):.2f} GB" if usage_bytes >= 0.01 * (1024**3) else f"{usage_bytes / (1024**2):.0f} MB"
-            
-            days_str = "?"
-            try:
-                if 'remaining_days' in u and u['remaining_days'] is not None:
-                    days_str = f"{int(u['remaining_days'])}d"
-                elif 'expire' in u and u['expire']:
-                    ts = float(u['expire'])
-                    if ts > 0:
-                        rem = int((ts - datetime.now().timestamp()) / 86400)
-                        days_str = f"{rem}d" if rem >= 0 else "Exp"
-                    else:
-                        days_str = "∞"
-            except: pass
-
-            items.append(f"• {link} \| `{escape_markdown(usage_str)}` \| `{escape_markdown(days_str)}`")
-
-        return items, total_count, f"⚡️ *{escape_markdown(f'کاربران آنلاین ({panel_obj.name})')}*"
-
-class ActiveUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        window = timedelta(hours=24)
-        now_utc = datetime.utcnow()
-        filtered = [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
-        
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
-        items = []
-        
-        for u in paged:
-            ident = u.get('uuid') or u.get('username')
-            name = u.get('username') or u.get('name') or "No Name"
-            link = self._format_user_line(u, name, tg_map.get(ident))
-            
-            last_seen = to_shamsi(u['_parsed_last_seen'])
-            percent = int((u['_used_bytes'] / u['_limit_bytes']) * 100) if u['_limit_bytes'] > 0 else 0
-            
-            items.append(f"• {link}{LRM} \| {RLM}{escape_markdown(last_seen)} {RLM}\| {RLM}`{percent}%`")
-            
-        return items, total_count, f"✅ *{escape_markdown(f'کاربران فعال ({panel_obj.name})')}*"
-
-class InactiveUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        now = datetime.utcnow()
-        filtered = []
-        for u in users:
-            dt = u['_parsed_last_seen']
-            if dt:
-                diff = now - dt
-                if timedelta(days=1) <= diff < timedelta(days=7):
-                    filtered.append(u)
-
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
-        items = []
-
-        for u in paged:
-            ident = u.get('uuid') or u.get('username')
-            name = u.get('username') or u.get('name') or "No Name"
-            link = self._format_user_line(u, name, tg_map.get(ident))
-            time_ago = format_relative_time(u['_parsed_last_seen'])
-            
-            items.append(f"• {link}{LRM} \| {RLM}{escape_markdown(time_ago)}")
-            
-        return items, total_count, f"⏳ *{escape_markdown(f'کاربران غیرفعال ({panel_obj.name})')}*"
-
-class NeverConnectedStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        filtered = [u for u in users if not u['_parsed_last_seen'] or u['_used_bytes'] == 0]
-        
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
-        items = []
-
-        for u in paged:
-            ident = u.get('uuid') or u.get('username')
-            name = u.get('username') or u.get('name') or "No Name"
-            link = self._format_user_line(u, name, tg_map.get(ident))
-            
-            limit_gb = u.get('_limit_bytes', 0) / (1024**3)
-            limit_str = f"{limit_gb:.0f}GB" if limit_gb.is_integer() else f"{limit_gb:.1f}GB"
-            
-            items.append(f"• {link}{LRM} \| `0/{limit_str}`")
-            
-        return items, total_count, f"🚫 *{escape_markdown(f'هرگز متصل نشده ({panel_obj.name})')}*"
-
-class PanelUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        tg_map, _ = await self._enrich_with_db_info(session, users, panel_id)
-        total_count = len(users)
-        paged = users[offset : offset + limit]
-        items = []
-
-        for u in paged:
-            ident = u.get('uuid') or u.get('username')
-            name = u.get('username') or u.get('name') or "No Name"
-            link = self._format_user_line(u, name, tg_map.get(ident))
-            items.append(f"• {link}")
-            
-        return items, total_count, f"👥 *{escape_markdown(f'همه کاربران پنل {panel_obj.name}')}*"
-
-# --- استراتژی‌های دیتابیس داخلی ---
-
-class BirthdayStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(User).where(User.birthday.isnot(None))
-        result = await session.execute(stmt)
-        users = result.scalars().all()
-        
-        # سورت بر اساس نزدیکی تولد
-        users_sorted = sorted(users, key=lambda u: days_until_next_birthday(u.birthday) if u.birthday else 999)
-        total_count = len(users_sorted)
-        paged = users_sorted[offset : offset + limit]
-        
-        items = []
-        for user in paged:
-            name = escape_markdown((user.first_name or 'ناشناس').replace('|', ''))
-            shamsi = to_shamsi(user.birthday)
-            rem = days_until_next_birthday(user.birthday)
-            
-            if rem == 0: days_str = "امروز! 🎉"
-            elif rem is not None: days_str = f"{rem} روز"
-            else: days_str = "نامشخص"
-            
-            items.append(f"🎂 {name} \| {shamsi} \| {escape_markdown(days_str)}")
-            
-        return items, total_count, f"🎂 *{escape_markdown('لیست تولد کاربران') }*"
-
-class PlanReportStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        plan_id = int(params[1])
-        stmt = queries.get_users_by_plan_query(plan_id)
-        
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        users = result.scalars().all()
-        
-        items = []
-        for user in users:
-            name = escape_markdown(user.first_name or "بدون نام")
-            link = f"[{name}](tg://user?id={user.user_id})"
-            items.append(f"• {link}{LRM} \(`{user.user_id}`\)")
-            
-        return items, total_count, f"📊 *{escape_markdown('گزارش بر اساس پلن')}*"
-
-class BotUsersStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(User).order_by(User.user_id.desc())
-        
-        count_stmt = select(func.count(User.user_id))
-        total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        users = result.scalars().all()
-        
-        items = []
-        for user in users:
-            name = escape_markdown(user.first_name or "بدون نام")
-            link = f"[{name}](tg://user?id={user.user_id})"
-            items.append(f"• {link}{LRM} \(`{user.user_id}`\)")
-            
-        return items, total_count, f"👥 *{escape_markdown('کل کاربران ربات')}*"
-
-class PaymentsReportStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(WalletTransaction).order_by(WalletTransaction.transaction_date.desc())
-        
-        count_stmt = select(func.count(WalletTransaction.id))
-        total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(stmt.options(selectinload(WalletTransaction.user)).offset(offset).limit(limit))
-        txs = result.scalars().all()
-        
-        items = []
-        for tx in txs:
-            u_name = tx.user.first_name if tx.user else str(tx.user_id)
-            clean_name = escape_markdown(u_name)
-            amount = f"{int(abs(tx.amount)):,}"
-            date_str = to_shamsi(tx.transaction_date)
-            
-            icon = "🟢" if tx.amount > 0 else "🔴"
-            type_map = {'charge': 'شارژ', 'purchase': 'خرید', 'addon_purchase': 'خرید حجم'}
-            t_type = type_map.get(tx.type, tx.type)
-            
-            # Icon | Name | Type | Amount | Date
-            items.append(f"{icon} {clean_name} \| {t_type} \| `{amount}` \| {date_str}")
-            
-        return items, total_count, f"💰 *{escape_markdown('آخرین تراکنش‌های مالی')}*"
-
 # مپینگ استراتژی‌ها
 REPORT_STRATEGIES = {
     'online_users': OnlineUsersStrategy(),
@@ -398,7 +59,6 @@ REPORT_STRATEGIES = {
     'birthdays': BirthdayStrategy(),
     'by_plan': PlanReportStrategy(),
     'bot_users': BotUsersStrategy(),
-    'payments': PaymentsReportStrategy(),
     'payments': PaymentHistoryStrategy(),
     'balances': WalletBalancesStrategy(),
     'connected_devices': ConnectedDevicesStrategy(),
@@ -411,17 +71,13 @@ REPORT_STRATEGIES = {
 
 async def get_report_settings():
     defaults = {"report_page_size": 15}
-    async with db.get_session() as session:
-        stmt = select(SystemConfig).where(SystemConfig.key.in_(defaults.keys()))
-        results = await session.execute(stmt)
-        configs = {row.key: row.value for row in results.scalars()}
-    return {key: int(configs.get(key, default_val)) for key, default_val in defaults.items()}
+    return {key: int(await db.get_config(key, default_val)) for key, default_val in defaults.items()}
 
 # ---------------------------------------------------------
 # هندلرهای منو (Menu Handlers)
 # ---------------------------------------------------------
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:reports_menu")
+@callback_router.exact("admin:reports_menu")
 async def handle_reports_menu(call: types.CallbackQuery, params: list = None):
     """منوی اصلی گزارش‌گیری."""
     active_panels = await db.get_active_panels()
@@ -433,11 +89,11 @@ async def handle_reports_menu(call: types.CallbackQuery, params: list = None):
         parse_mode='HTML'
     )
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:quick_dashboard")
+@callback_router.exact("admin:quick_dashboard")
 async def handle_quick_dashboard(call: types.CallbackQuery, params: list = None):
     """داشبورد سریع."""
     uid = call.from_user.id
-    async with db.get_session() as session:
+    async with db.read_session() as session:
         total_users = await session.scalar(select(func.count(User.user_id)))
         active_uuids = await session.scalar(select(func.count(UserUUID.id)).where(UserUUID.is_active == True))
         
@@ -464,7 +120,7 @@ async def handle_quick_dashboard(call: types.CallbackQuery, params: list = None)
     kb.add(types.InlineKeyboardButton("🔙 بازگشت", callback_data="admin:panel"))
     await _safe_edit(uid, call.message.message_id, text, reply_markup=kb, parse_mode='HTML')
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("admin:panel_report"))
+@callback_router.prefix("admin:panel_report")
 async def handle_panel_specific_reports_menu(call: types.CallbackQuery, params: list = None):
     """منوی گزارش‌های اختصاصی یک پنل."""
     if params is None:
@@ -475,7 +131,7 @@ async def handle_panel_specific_reports_menu(call: types.CallbackQuery, params:
 
     panel_id = int(params[0])
     
-    async with db.get_session() as session:
+    async with db.read_session() as session:
         panel_obj = await session.get(Panel, panel_id)
         panel_name = panel_obj.name if panel_obj else f"Panel {panel_id}"
 
@@ -491,7 +147,7 @@ async def handle_panel_specific_reports_menu(call: types.CallbackQuery, params:
 # هندلرهای گزارش مالی و اکسل (Financial & Excel)
 # ---------------------------------------------------------
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:report_financial")
+@callback_router.exact("admin:report_financial")
 async def handle_financial_report(call: types.CallbackQuery, params: list = None):
     """گزارش مالی دقیق."""
     uid = call.from_user.id
@@ -501,7 +157,7 @@ async def handle_financial_report(call: types.CallbackQuery, params: list = None
     today = now.replace(hour=0, minute=0, second=0)
     month = now.replace(day=1, hour=0, minute=0, second=0)
 
-    async with db.get_session() as session:
+    async with db.read_session() as session:
         async def calc(type_list, date_filter=None):
             stmt = select(func.sum(WalletTransaction.amount)).where(WalletTransaction.type.in_(type_list))
             if date_filter: stmt = stmt.where(WalletTransaction.transaction_date >= date_filter)
@@ -530,13 +186,13 @@ async def handle_financial_report(call: types.CallbackQuery, params: list = None
     kb.add(types.InlineKeyboardButton("🔙 بازگشت", callback_data="admin:reports_menu"))
     await _safe_edit(uid, call.message.message_id, text, reply_markup=kb, parse_mode='HTML')
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:financial_details")
+@callback_router.exact("admin:financial_details")
 async def handle_financial_details(call: types.CallbackQuery, params: list = None):
     """نمایش لیست تراکنش‌ها."""
     # ارسال به هندلر عمومی با نوع گزارش payments
     await handle_paginated_list(call, ["payments", "0"])
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:report_excel")
+@callback_router.exact("admin:report_excel")
 async def handle_report_excel(call: types.CallbackQuery):
     """خروجی اکسل (CSV) کاربران."""
     uid = call.from_user.id
@@ -546,8 +202,8 @@ async def handle_report_excel(call: types.CallbackQuery):
     filepath = os.path.join(REPORT_DIR, f"users_{datetime.now().strftime('%H%M')}.csv")
     
     try:
-        async with db.get_session() as session:
-            result = await session.execute(select(User).options(selectinload(User.uuids)))
+        async with db.read_session() as session:
+            result = await session.execute(select(User).options(*loader('user_uuids')))
             users = result.scalars().all()
             
             users_data = []
@@ -578,12 +234,12 @@ async def handle_report_excel(call: types.CallbackQuery):
 # هندلرهای تسک‌های زمان‌بندی شده
 # ---------------------------------------------------------
 
-@bot.callback_query_handler(func=lambda call: call.data == "admin:scheduled_tasks")
+@callback_router.exact("admin:scheduled_tasks")
 async def handle_show_scheduled_tasks(call: types.CallbackQuery, params: list = None):
     """نمایش وضعیت کارهای زمان‌بندی شده."""
     uid = call.from_user.id
     
-    async with db.get_session() as session:
+    async with db.read_session() as session:
         count = await session.scalar(select(func.count(ScheduledMessage.id)))
         stmt = select(ScheduledMessage).order_by(ScheduledMessage.created_at.desc()).limit(5)
         result = await session.execute(stmt)
@@ -624,11 +280,20 @@ async def handle_paginated_list(call: types.CallbackQuery, params: list):
     # [type, page] -> birthdays,0
     # [type, panel_id, page] -> online_users,1,0
     # [type, plan_id, page] -> by_plan,5,0
-    
+    # از صفحه دوم به بعد توکن صفحه (keyset cursor) بعد از شماره صفحه می‌آید:
+    # [type, (id), page, cursor] -> payments,3,nd1ab2c~i9x
+    cursor = None
+    if len(params) > 1 and is_cursor(params[-1]):
+        cursor = params[-1]
+        params = params[:-1]
+
     try:
         page = int(params[-1])
     except (ValueError, IndexError):
         page = 0
+    if cursor is None:
+        # بدون توکن همیشه صفحه اول نمایش داده می‌شود (دکمه‌های قدیمی با شماره صفحه)
+        page = 0
 
     # بررسی خاص برای اینکه آیا پارامتر ماقبل آخر ID است یا خیر
     # این فقط برای بازسازی دکمه‌ها (Callback Data) مهم است
@@ -639,17 +304,16 @@ async def handle_paginated_list(call: types.CallbackQuery, params: list):
          except: pass
 
     PAGE_SIZE = 20
-    offset = page * PAGE_SIZE
     
-    items, total_count, title = [], 0, ""
+    items, total_count, title, nav = [], 0, "", {'next': None, 'prev': None}
 
     # 3. اجرای استراتژی
-    async with db.get_session() as session:
+    async with db.read_session() as session:
         try:
             # نمایش وضعیت "در حال بارگذاری" برای کاربر
             # await bot.answer_callback_query(call.id, "⏳ در حال دریافت داده‌ها...")
             
-            items, total_count, title = await strategy.generate(session, params, offset, PAGE_SIZE)
+            items, total_count, title, nav = await strategy.generate(session, params, cursor, PAGE_SIZE, page)
         except Exception as e:
             logger.error(f"Error generating report {list_type}: {e}", exc_info=True)
             await bot.answer_callback_query(call.id, "❌ خطا در دریافت اطلاعات.")
@@ -667,7 +331,7 @@ async def handle_paginated_list(call: types.CallbackQuery, params: list):
     nav_btns = []
     
     # تابع کمکی برای ساخت دکمه‌های ناوبری
-    def get_cb_data(target_page):
+    def get_cb_data(target_page, token):
         # بازسازی دقیق فرمت ورودی برای دکمه‌های بعدی/قبلی
         base = f"admin:list:{list_type}"
         
@@ -679,17 +343,17 @@ async def handle_paginated_list(call: types.CallbackQuery, params: list):
             # اگر روتر شما فرمت admin:list_by_plan را جدا هندل می‌کند، باید آن را اینجا رعایت کنید.
             # با توجه به کد اصلی، by_plan جدا صدا زده می‌شد.
             # برای اطمینان، از فرمت جنریک استفاده می‌کنیم:
-            return f"admin:list_by_plan:{extra_id}:{target_page}"
+            return f"admin:list_by_plan:{extra_id}:{target_page}:{token}"
         
         if extra_id is not None:
-            return f"{base}:{extra_id}:{target_page}"
+            return f"{base}:{extra_id}:{target_page}:{token}"
         
-        return f"{base}:{target_page}"
+        return f"{base}:{target_page}:{token}"
 
-    if page > 0:
-        nav_btns.append(types.InlineKeyboardButton("⬅️ قبلی", callback_data=get_cb_data(page - 1)))
-    if (page + 1) * PAGE_SIZE < total_count:
-        nav_btns.append(types.InlineKeyboardButton("بعدی ➡️", callback_data=get_cb_data(page + 1)))
+    if nav['prev'] and page > 0:
+        nav_btns.append(types.InlineKeyboardButton("⬅️ قبلی", callback_data=get_cb_data(page - 1, nav['prev'])))
+    if nav['next']:
+        nav_btns.append(types.InlineKeyboardButton("بعدی ➡️", callback_data=get_cb_data(page + 1, nav['next'])))
 
     if nav_btns: kb.add(*nav_btns)
 
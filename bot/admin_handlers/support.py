@@ -1,9 +1,11 @@
 # bot/admin_handlers/support.py
 
 import logging
-import asyncio
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
+from bot.utils.network import delete_message_delayed
+from bot.services.timer_wheel import timer_wheel
 from bot.database import db
 from bot.keyboards import user as user_menu
 from bot.config import ADMIN_IDS
@@ -98,27 +100,23 @@ async def handle_admin_reply_in_group(message: types.Message):
 
         # اسکژول کردن حذف پیام ربات + پیام فوروارد شده
         if delete_delay > 0:
-            asyncio.create_task(
-                delete_ticket_chain(message.chat.id, reply_msg.message_id, forwarded_msg_id, delete_delay)
-            )
+            await delete_ticket_chain(message.chat.id, reply_msg.message_id, forwarded_msg_id, delete_delay)
 
     except Exception as e:
         logger.error(f"Failed to handle admin reply: {e}")
         await bot.reply_to(message, f"❌ خطا: {str(e)}")
 
 async def delete_ticket_chain(chat_id, bot_msg_id, fwd_msg_id, delay):
-    """حذف پیام‌های سمت ادمین"""
-    await asyncio.sleep(delay)
-    try: await bot.delete_message(chat_id, bot_msg_id)
-    except: pass
-    if fwd_msg_id:
-        try: await bot.delete_message(chat_id, fwd_msg_id)
-        except: pass
+    """حذف پیام‌های سمت ادمین (تایمر پایدار timer_wheel)"""
+    await timer_wheel.schedule_many([
+        {'action': 'delete_message', 'chat_id': chat_id, 'message_id': msg_id, 'delay': delay}
+        for msg_id in (bot_msg_id, fwd_msg_id) if msg_id
+    ])
 
 # =============================================================================
 # 2. هندلر دکمه بستن تیکت توسط ادمین
 # =============================================================================
-@bot.callback_query_handler(func=lambda call: call.data.startswith('admin:ticket:close:'))
+@callback_router.prefix('admin:ticket:close:')
 async def close_ticket_callback(call: types.CallbackQuery):
     try:
         ticket = await db.get_ticket_by_admin_message_id(call.message.message_id)
@@ -158,25 +156,14 @@ async def close_ticket_callback(call: types.CallbackQuery):
                 sent_msg = await bot.send_message(target_user_id, msg_text, parse_mode="Markdown")
                 
                 if delete_delay > 0:
-                    asyncio.create_task(
-                        user_delete_message_only(target_user_id, sent_msg.message_id, delete_delay)
-                    )
+                    await delete_message_delayed(target_user_id, sent_msg.message_id, delete_delay)
             except Exception as e:
                 logger.error(f"Error sending closed msg to user: {e}")
             
             # حذف سمت ادمین
             if delete_delay > 0:
-                asyncio.create_task(
-                    delete_ticket_chain(call.message.chat.id, call.message.message_id, forwarded_msg_id, delete_delay)
-                )
+                await delete_ticket_chain(call.message.chat.id, call.message.message_id, forwarded_msg_id, delete_delay)
             
         await bot.answer_callback_query(call.id, "تیکت بسته شد.")
     except Exception as e:
         logger.error(f"Error closing ticket: {e}")
-
-async def user_delete_message_only(chat_id, msg_id, delay):
-    """✅ فقط پیام را حذف می‌کند و منو را ارسال نمی‌کند"""
-    await asyncio.sleep(delay)
-    try:
-        await bot.delete_message(chat_id, msg_id)
-    except: pass
\ No newline at end of file
@@ -4,7 +4,7 @@ import time
 from telebot import types
 from datetime import datetime
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from bot.db.loaders import loader
 
 from bot.database import db
 from bot.db.base import User, UserUUID, Panel, PanelNode, ServerCategory
@@ -160,7 +160,7 @@ async def handle_user_access_panel_list(call, params):
         # دریافت کاربر
         stmt_user = (
             select(UserUUID)
-            .options(selectinload(UserUUID.allowed_panels))
+            .options(*loader('uuid_panels'))
             .where(UserUUID.user_id == input_id)
             .limit(1)
         )
@@ -1,8 +1,8 @@
 # bot/admin_handlers/user_management/helpers.py
 
-import asyncio
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.network import delete_message_delayed
 
 async def _delete_user_message(msg: types.Message):
     """حذف پیام کاربر جهت تمیز نگه داشتن چت"""
@@ -13,9 +13,5 @@ async def _delete_user_message(msg: types.Message):
         pass
 
 async def _auto_delete(msg, seconds):
-    """پیام را بعد از چند ثانیه حذف می‌کند"""
-    await asyncio.sleep(seconds)
-    try:
-        await msg.delete()
-    except:
-        pass
\ No newline at end of file
+    """پیام را بعد از چند ثانیه حذف می‌کند (تایمر پایدار timer_wheel)"""
+    await delete_message_delayed(msg.chat.id, msg.message_id, seconds)
\ No newline at end of file
@@ -10,6 +10,9 @@ from bot.utils.network import _safe_edit
 from bot.utils.decorators import admin_only
 from bot.keyboards.admin import admin_keyboard as admin_menu
 from bot.bot_instance import bot
+from bot.db.pagination import is_cursor
+
+MAPPING_PAGE_SIZE = 20
 
 # ==============================================================================
 # 1. منوی اصلی و لیست (Menu & List)
@@ -40,7 +43,10 @@ async def handle_mapping_menu(call: types.CallbackQuery, params: list):
 async def handle_mapping_list(call: types.CallbackQuery, params: list):
     """نمایش لیست خلاصه اتصال‌ها"""
     uid, msg_id = call.from_user.id, call.message.message_id
-    mappings = await db.get_all_marzban_mappings()
+    # params: [] یا [cursor] (توکن صفحه)
+    cursor = params[0] if params and is_cursor(params[0]) else None
+    page = await db.get_marzban_mappings_page(cursor, MAPPING_PAGE_SIZE)
+    mappings = page['rows']
     
     if not mappings:
         text = "📭 *لیست اتصال‌ها خالی است\.*\n\nهیچ اتصالی تعریف نشده است\."
@@ -57,6 +63,14 @@ async def handle_mapping_list(call: types.CallbackQuery, params: list):
         short_uuid = str(m['hiddify_uuid'])[:8]
         btn_text = f"👤 {m['marzban_username']} | 🆔 {short_uuid}..."
         kb.add(types.InlineKeyboardButton(btn_text, callback_data=f"admin:map_detail:{m['hiddify_uuid']}"))
+
+    nav_btns = []
+    if page['prev']:
+        nav_btns.append(types.InlineKeyboardButton("⬅️ قبلی", callback_data=f"admin:mapping_list:{page['prev']}"))
+    if page['next']:
+        nav_btns.append(types.InlineKeyboardButton("بعدی ➡️", callback_data=f"admin:mapping_list:{page['next']}"))
+    if nav_btns:
+        kb.row(*nav_btns)
         
     kb.add(types.InlineKeyboardButton("🔙 بازگشت", callback_data="admin:mapping_menu"))
     
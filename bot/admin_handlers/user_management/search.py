@@ -3,7 +3,7 @@
 import time
 from telebot import types
 from sqlalchemy import select, or_, cast, String  # ✅ اضافه شدن cast و String
-from sqlalchemy.orm import selectinload
+from bot.db.loaders import loader
 
 from bot.bot_instance import bot  # ایمپورت بات اصلی
 from bot.admin_handlers.user_management import state  # ایمپورت ماژول state
@@ -77,7 +77,7 @@ async def process_search_input(message: types.Message):
     step = data['step']
     
     async with db.get_session() as session:
-        stmt = select(User).distinct().options(selectinload(User.uuids))
+        stmt = select(User).distinct().options(*loader('user_uuids'))
         
         if step == 'tid_search':
             if not query.isdigit():
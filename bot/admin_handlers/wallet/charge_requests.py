@@ -1,7 +1,6 @@
 # bot/admin_handlers/wallet/charge_requests.py
 
 import logging
-import asyncio
 from telebot import types
 from sqlalchemy import select
 from bot.database import db
@@ -102,9 +101,7 @@ async def handle_charge_request_callback(call: types.CallbackQuery, params: list
 
                     # زمان‌بندی برای حذف پیام ادمین
                     delete_delay = int(await db.get_config('ticket_auto_delete_time', 60))
-                    asyncio.create_task(
-                        delete_message_delayed(call.message.chat.id, call.message.message_id, delete_delay)
-                    )
+                    await delete_message_delayed(call.message.chat.id, call.message.message_id, delete_delay)
 
                     await bot.answer_callback_query(call.id, "✅ تایید شد.")
                 else:
@@ -163,9 +160,7 @@ async def handle_charge_request_callback(call: types.CallbackQuery, params: list
                 delete_delay = int(await db.get_config('ticket_auto_delete_time', 60))
                 
                 # استفاده از تابع عمومی که در utils/network.py تعریف کردید
-                asyncio.create_task(
-                    delete_message_delayed(call.message.chat.id, call.message.message_id, delete_delay)
-                )
+                await delete_message_delayed(call.message.chat.id, call.message.message_id, delete_delay)
                 
                 await bot.answer_callback_query(call.id, "❌ رد شد.")
                 
@@ -9,6 +9,7 @@ from telebot.asyncio_filters import SimpleCustomFilter
 # --- Imports ---
 from .bot_instance import bot
 from .utils import initialize_utils
+from .utils.callback_router import callback_router
 from .config import ADMIN_IDS
 
 # --- Import Handlers ---
@@ -108,6 +109,9 @@ def register_admin_handlers(bot_instance, scheduler_instance):
     if hasattr(debug, 'register_debug_handlers') and callable(debug.register_debug_handlers):
         debug.register_debug_handlers(bot_instance, scheduler_instance)
 
+    # Catch-all for unknown admin:* buttons, registered after every admin route (including debug's)
+    callback_router.prefix("admin:", guard=_is_admin_call)(handle_unknown_admin_callback)
+
 # ===================================================================
 # 3. Route Helpers & Logic
 # ===================================================================
@@ -371,38 +375,42 @@ async def global_step_handler(message: types.Message):
                 logger.error(f"❌ Error: next_handler for user {uid} is NOT callable: {next_func}")
                 await bot.reply_to(message, "❌ Internal error: Step handler is missing or invalid.")
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("admin:"), is_admin=True)
-@safe_handler
-async def handle_admin_callbacks(call: types.CallbackQuery):
-    """Central admin button handler"""
-    uid = call.from_user.id
-    # Extend state time
-    if uid in bot.context_state:
-        bot.context_state[uid]['timestamp'] = time.time()
+# ===================================================================
+# 6. Callback Routes
+# ===================================================================
 
-    parts = call.data.split(':')
-    if len(parts) < 2: return
-        
-    action = parts[1]
-    params = parts[2:]
-    
-    if action == "renew_exec":
-        from bot.admin_handlers.user_management import actions
-        await actions.handle_renew_confirm_exec(call, params)
-        return
-
-    if action == "none":
-        await bot.answer_callback_query(call.id)
-        return
-    
-    handler = ADMIN_CALLBACK_HANDLERS.get(action)
-    
-    if handler:
-        if callable(handler):
-            await handler(call, params)
-        else:
+def _is_admin_call(call: types.CallbackQuery) -> bool:
+    return call.from_user.id in ADMIN_IDS
+
+def _admin_route(action: str, handler):
+    """Wrap an ADMIN_CALLBACK_HANDLERS entry as a router handler: admin:<action>[:params...]"""
+    @safe_handler
+    async def route(call: types.CallbackQuery):
+        uid = call.from_user.id
+        # Extend state time
+        if uid in bot.context_state:
+            bot.context_state[uid]['timestamp'] = time.time()
+
+        if not callable(handler):
             logger.error(f"❌ Handler for action '{action}' is NOT callable (it's a {type(handler)}). Check ADMIN_CALLBACK_HANDLERS.")
             await bot.answer_callback_query(call.id, f"❌ Error: Handler for {action} is invalid.", show_alert=True)
-    else:
-        logger.warning(f"Handler not found for: {action}")
-        await bot.answer_callback_query(call.id, "❌ Command not found.", show_alert=True)
\ No newline at end of file
+            return
+        await handler(call, call.data.split(':')[2:])
+
+    route.__name__ = f"admin_{action}"
+    return route
+
+async def _renew_exec(call: types.CallbackQuery, params: list):
+    from bot.admin_handlers.user_management import actions
+    await actions.handle_renew_confirm_exec(call, params)
+
+async def _answer_none(call: types.CallbackQuery, params: list):
+    await bot.answer_callback_query(call.id)
+
+@safe_handler
+async def handle_unknown_admin_callback(call: types.CallbackQuery):
+    logger.warning(f"Handler not found for: {call.data}")
+    await bot.answer_callback_query(call.id, "❌ Command not found.", show_alert=True)
+
+for _action, _handler in {**ADMIN_CALLBACK_HANDLERS, "renew_exec": _renew_exec, "none": _answer_none}.items():
+    callback_router.action(f"admin:{_action}", _admin_route(_action, _handler), guard=_is_admin_call)
@@ -1,9 +1,10 @@
 # bot/bot_instance.py
 import os
-from telebot.async_telebot import AsyncTeleBot
 from bot.config import BOT_TOKEN
+from bot.services.send_scheduler import ScheduledTeleBot
 
 if not BOT_TOKEN:
     raise ValueError("Error: BOT_TOKEN is not set in .env file!")
 
-bot = AsyncTeleBot(BOT_TOKEN)
\ No newline at end of file
+# ارسال پیام‌ها از صف مرکزی (bot.services.send_scheduler) با رعایت محدودیت‌های تلگرام
+bot = ScheduledTeleBot(BOT_TOKEN)
\ No newline at end of file
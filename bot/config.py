@@ -27,6 +27,72 @@ API_RETRY_COUNT = 3
 TEHRAN_TZ = pytz.timezone("Asia/Tehran")
 PAGE_SIZE = 35
 
+# --- Usage Snapshots ---
+# فقط در صورت تغییر شمارنده‌ها اسنپ‌شات ثبت می‌شود؛ هر HEARTBEAT ساعت یک ردیف اجباری برای حفظ بیس‌لاین‌ها
+SNAPSHOT_CHANGE_ONLY = os.getenv("SNAPSHOT_CHANGE_ONLY", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_HEARTBEAT_HOURS = int(os.getenv("SNAPSHOT_HEARTBEAT_HOURS", "24"))
+# فشرده‌سازی: اسنپ‌شات ساعتی برای N روز، روزانه برای M ماه، سپس حذف
+SNAPSHOT_HOURLY_RETENTION_DAYS = int(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", "31"))
+SNAPSHOT_DAILY_RETENTION_MONTHS = int(os.getenv("SNAPSHOT_DAILY_RETENTION_MONTHS", "12"))
+SNAPSHOT_COMPACTION_BATCH = int(os.getenv("SNAPSHOT_COMPACTION_BATCH", "500"))
+
+# --- User Cache ---
+# کش رکورد کاربران (LRU + انقضای زمانی)؛ با هر نوشتن روی کاربر باطل می‌شود
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+
+# --- Menu Render Cache ---
+# کیبوردهای ثابت و نیمه‌ثابت به صورت سریال‌شده نگه داشته می‌شوند؛ با تغییر دسته‌بندی‌ها، پلن‌ها، پنل‌ها یا تنظیمات باطل می‌شوند
+MENU_CACHE_SIZE = int(os.getenv("MENU_CACHE_SIZE", "2000"))
+MENU_CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "3600"))
+
+# --- SQL Instrumentation ---
+# زمان‌سنجی کوئری‌ها به تفکیک هندلر/جاب و تشخیص الگوی N+1 (تکرار یک کوئری بیش از آستانه در یک اجرا)
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "500"))
+
+# --- ORM Loading ---
+# روابط مدل‌ها به‌صورت پیش‌فرض لود نمی‌شوند؛ در حالت توسعه هر لود ضمنی خطا می‌دهد تا از پروفایل‌های bot.db.loaders استفاده شود
+DB_STRICT_LOADING = os.getenv("DB_STRICT_LOADING", "false").lower() in ("1", "true", "yes")
+# اندازه هر دسته در خواندن دسته‌ای (keyset) لیست‌های بزرگ مثل مخاطبان برادکست
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "500"))
+
+# --- Outbound Send Scheduler ---
+# همه send_message/copy_message/edit_message_text از یک صف اولویت‌دار با رعایت محدودیت‌های تلگرام عبور می‌کنند
+SEND_SCHEDULER_ENABLED = os.getenv("SEND_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SEND_GLOBAL_PER_SECOND = int(os.getenv("SEND_GLOBAL_PER_SECOND", "30"))
+# چت خصوصی: حداکثر N پیام در هر پنجره (به طور میانگین یک پیام در ثانیه با امکان ارسال پشت سر هم)
+SEND_PER_CHAT_LIMIT = int(os.getenv("SEND_PER_CHAT_LIMIT", "3"))
+SEND_PER_CHAT_WINDOW = float(os.getenv("SEND_PER_CHAT_WINDOW", "3"))
+SEND_PER_GROUP_PER_MINUTE = int(os.getenv("SEND_PER_GROUP_PER_MINUTE", "20"))
+SEND_MAX_CONCURRENCY = int(os.getenv("SEND_MAX_CONCURRENCY", "16"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# هش آخرین (متن، کیبورد) هر پیام؛ ویرایش بدون تغییر بدون تماس با تلگرام رد می‌شود
+EDIT_DEDUP_SIZE = int(os.getenv("EDIT_DEDUP_SIZE", "10000"))
+EDIT_DEDUP_TTL = int(os.getenv("EDIT_DEDUP_TTL", "86400"))
+
+# --- Delayed Actions (Timer Wheel) ---
+# حذف پیام با تاخیر و سایر کارهای زمان‌دار در جدول delayed_actions؛ یک ورکر آن‌ها را دسته به دسته اجرا می‌کند
+TIMER_BATCH_SIZE = int(os.getenv("TIMER_BATCH_SIZE", "200"))
+TIMER_POLL_INTERVAL = int(os.getenv("TIMER_POLL_INTERVAL", "30"))
+TIMER_LEASE_SECONDS = int(os.getenv("TIMER_LEASE_SECONDS", "120"))
+TIMER_MAX_ATTEMPTS = int(os.getenv("TIMER_MAX_ATTEMPTS", "3"))
+# حذف خودکار گزارش‌های شبانه/هفتگی برای کاربرانی که auto_delete_reports را فعال کرده‌اند
+REPORT_AUTO_DELETE_HOURS = int(os.getenv("REPORT_AUTO_DELETE_HOURS", "12"))
+
+# --- Bot Mode (polling / webhook) ---
+# در حالت webhook آپدیت‌ها از سرور aiohttp وارد صف محدود می‌شوند؛ در صورت خطای راه‌اندازی به polling برمی‌گردد
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or (f"https://{BOT_DOMAIN}{WEBHOOK_PATH}" if BOT_DOMAIN else None)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+
 TUTORIAL_LINKS = {
     "android": {
         "v2rayng": "https://telegra.ph/Your-V2rayNG-Tutorial-Link-Here-01-01",
@@ -13,6 +13,12 @@ from bot.user_router import register_user_handlers
 from bot.services import cache_manager 
 # --- تغییر ۱: ایمپورت اسکجولر ---
 from bot.scheduler import SchedulerManager
+from bot.config import SQL_INSTRUMENTATION, BOT_MODE
+from bot.utils.middlewares import QueryScopeMiddleware
+from bot.utils.callback_router import callback_router
+from bot.admin_handlers.broadcast import resume_unfinished_broadcasts
+from bot.webhook_server import run_webhook
+from bot.services.timer_wheel import timer_wheel
 
 # --- تغییر ۲: تنظیمات لاگینگ (ذخیره در فایل + نمایش در کنسول) ---
 logging.basicConfig(
@@ -40,6 +46,10 @@ async def main():
         logger.info("📡 Registering Handlers...")
         register_admin_handlers(bot, None)
         register_user_handlers()
+        # همه دکمه‌ها از یک callback_query_handler و مسیریاب Trie عبور می‌کنند
+        callback_router.attach(bot)
+        if SQL_INSTRUMENTATION:
+            bot.setup_middleware(QueryScopeMiddleware())
         
         # --- تغییر ۳: فعال‌سازی سیستم زمان‌بندی (گزارش‌ها و هشدارها) ---
         logger.info("⏰ Starting Scheduler...")
@@ -49,17 +59,29 @@ async def main():
         # 4. شروع تسک بروزرسانی خودکار کش در پس‌زمینه
         logger.info("⏳ Starting Background Cache Sync...")
         asyncio.create_task(cache_manager.sync_task())
+        asyncio.create_task(db.listen_config_changes())
+        # ورکر تایمرهای پایدار (حذف پیام با تاخیر، حذف خودکار گزارش‌ها)
+        asyncio.create_task(timer_wheel.run())
+
+        # ادامه برادکست‌هایی که با توقف قبلی ربات نیمه‌کاره مانده‌اند
+        await resume_unfinished_broadcasts()
         
-        # 5. حذف وب‌هوک‌های احتمالی قبلی
-        await bot.delete_webhook(drop_pending_updates=True)
-        
-        # 6. استارت پولینگ (بی‌نهایت)
         print("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
         print("   🤖 Bot is running successfully!   ")
         print("   📂 Logs are being saved to bot.log")
         print("   Press Ctrl+C to stop              ")
         print("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
-        
+
+        # 5. حالت وب‌هوک (در صورت تنظیم)؛ اگر راه‌اندازی نشد به پولینگ برمی‌گردیم
+        if BOT_MODE == 'webhook':
+            try:
+                logger.info("🌐 Starting webhook server...")
+                await run_webhook(bot)
+            except Exception as e:
+                logger.error(f"❌ Webhook mode failed, falling back to polling: {e}", exc_info=True)
+
+        # 6. حذف وب‌هوک‌های احتمالی قبلی و استارت پولینگ (بی‌نهایت)
+        await bot.delete_webhook(drop_pending_updates=True)
         await bot.infinity_polling()
 
     except Exception as e:
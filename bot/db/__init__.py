@@ -12,11 +12,22 @@ from .notifications import NotificationsDB
 from .feedback import FeedbackDB
 from .admin_log import AdminLogDB
 from .settings import SettingsDB
+from .broadcast import BroadcastDB
+from .timers import TimerDB
+from .cache import LRUCache
+from ..config import USER_CACHE_SIZE, USER_CACHE_TTL
 
 class BotDatabase(DatabaseManager, UserDB, UsageDB, FinancialsDB, PanelDB, 
                   ProductDB, SupportDB, WalletDB, NotificationsDB, 
-                  FeedbackDB, AdminLogDB, SettingsDB):
+                  FeedbackDB, AdminLogDB, SettingsDB, BroadcastDB, TimerDB):
     
     def __init__(self, db_url: str = None):
         super().__init__(db_url)
-        self._user_cache = {}
\ No newline at end of file
+        self._user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        self._day_baselines = {'day': None, 'rows': {}}
+        self._last_snapshots = None
+        self._panel_map = None
+        self._config_cache = None
+        self._category_codes = None
+        self._server_categories = None
+        self._menu_version = 0
\ No newline at end of file
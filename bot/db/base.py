@@ -3,12 +3,13 @@
 import logging
 import os
 import uuid as uuid_lib
-from typing import Optional, List, AsyncGenerator
+from typing import Any, Optional, List, AsyncGenerator
 from datetime import datetime, date
 
 from sqlalchemy import (
     BigInteger, String, Boolean, Float, Date, DateTime, 
-    ForeignKey, Integer, Text, func, JSON, select, delete, Index, inspect
+    ForeignKey, Integer, Text, func, JSON, select, delete, Index, inspect,
+    PrimaryKeyConstraint
 )
 from sqlalchemy.ext.asyncio import (
     create_async_engine, AsyncSession, async_sessionmaker, AsyncAttrs
@@ -18,8 +19,14 @@ from sqlalchemy.sql import expression
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from contextlib import asynccontextmanager
 
+from ..config import SQL_INSTRUMENTATION, DB_STRICT_LOADING, DB_STREAM_BATCH_SIZE
+from .instrumentation import attach_instrumentation
+
 logger = logging.getLogger(__name__)
 
+# روابط فقط با پروفایل‌های صریح (bot/db/loaders.py) لود می‌شوند؛ در حالت توسعه دسترسی ضمنی خطا می‌دهد
+RELATIONSHIP_LAZY = "raise" if DB_STRICT_LOADING else "select"
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
@@ -42,8 +49,10 @@ class User(Base):
     referral_reward_applied: Mapped[bool] = mapped_column(Boolean, default=False)
     wallet_balance: Mapped[float] = mapped_column(Float, default=0.0)
     plan_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("plans.id", ondelete="SET NULL"))
-    uuids: Mapped[List["UserUUID"]] = relationship("UserUUID", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
-    transactions: Mapped[List["WalletTransaction"]] = relationship("WalletTransaction", back_populates="user")
+    # زمان آخرین خطای «ربات بلاک شده/حساب حذف شده»؛ تا تعامل بعدی کاربر از برادکست‌ها حذف می‌شود
+    bot_blocked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    uuids: Mapped[List["UserUUID"]] = relationship("UserUUID", back_populates="user", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
+    transactions: Mapped[List["WalletTransaction"]] = relationship("WalletTransaction", back_populates="user", lazy=RELATIONSHIP_LAZY)
 
 
 class UserUUID(Base):
@@ -65,9 +74,9 @@ class UserUUID(Base):
     is_vip: Mapped[bool] = mapped_column(Boolean, default=False)
     allowed_categories: Mapped[List[str]] = mapped_column(JSONB, default=[])
     allowed_panels: Mapped[List["Panel"]] = relationship(
-        "Panel", secondary="uuid_panel_access", back_populates="allowed_uuids", lazy="selectin"
+        "Panel", secondary="uuid_panel_access", back_populates="allowed_uuids", lazy=RELATIONSHIP_LAZY
     )
-    user: Mapped["User"] = relationship("User", back_populates="uuids", lazy="selectin")
+    user: Mapped["User"] = relationship("User", back_populates="uuids", lazy=RELATIONSHIP_LAZY)
     snapshots: Mapped[List["UsageSnapshot"]] = relationship("UsageSnapshot", back_populates="uuid_rel", cascade="all, delete-orphan")
     __table_args__ = (
         Index('idx_uuid_active', 'uuid', 'is_active'),
@@ -84,7 +93,7 @@ class Panel(Base):
     api_token2: Mapped[Optional[str]] = mapped_column(String(255))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    allowed_uuids: Mapped[List["UserUUID"]] = relationship("UserUUID", secondary="uuid_panel_access", back_populates="allowed_panels")
+    allowed_uuids: Mapped[List["UserUUID"]] = relationship("UserUUID", secondary="uuid_panel_access", back_populates="allowed_panels", lazy=RELATIONSHIP_LAZY)
 
 class PanelNode(Base):
     """نودهای متصل به هر پنل (برای پنل‌های چند سروره مثل Remnawave یا Hiddify چند نود)"""
@@ -199,12 +208,13 @@ class WalletTransaction(Base):
     type: Mapped[str] = mapped_column(String(50))
     description: Mapped[Optional[str]] = mapped_column(Text)
     transaction_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    user: Mapped["User"] = relationship("User", back_populates="transactions")
+    user: Mapped["User"] = relationship("User", back_populates="transactions", lazy=RELATIONSHIP_LAZY)
     __table_args__ = (
         Index('idx_wallet_user_type', 'user_id', 'type'),
     )    
 
 class UsageSnapshot(Base):
+    """ساختار قدیمی اسنپ‌شات‌ها (یک ستون برای هر نوع پنل)؛ فقط برای مهاجرت به panel_usage_snapshots نگه داشته شده"""
     __tablename__ = "usage_snapshots"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     uuid_id: Mapped[int] = mapped_column(Integer, ForeignKey("user_uuids.id", ondelete="CASCADE"))
@@ -218,6 +228,32 @@ class UsageSnapshot(Base):
             Index('idx_usage_uuid_time', 'uuid_id', 'taken_at'),
         )
 
+class PanelUsageSnapshot(Base):
+    """
+    شمارنده مصرف (بایت) هر سرویس روی هر پنل در یک لحظه.
+    پنل (و نوع پنل) جدید فقط ردیف جدید است و نیازی به تغییر ساختار جدول ندارد.
+    """
+    __tablename__ = "panel_usage_snapshots"
+    uuid_id: Mapped[int] = mapped_column(Integer, ForeignKey("user_uuids.id", ondelete="CASCADE"))
+    panel_id: Mapped[int] = mapped_column(Integer, ForeignKey("panels.id", ondelete="CASCADE"))
+    taken_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    used_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    __table_args__ = (
+        # used_bytes داخل ایندکس‌ها است تا کوئری‌های مصرف فقط از ایندکس خوانده شوند (Index-Only Scan)
+        PrimaryKeyConstraint('uuid_id', 'panel_id', 'taken_at', postgresql_include=['used_bytes']),
+        Index('idx_panel_usage_panel_time', 'panel_id', 'taken_at', postgresql_include=['uuid_id', 'used_bytes']),
+        Index('idx_panel_usage_time', 'taken_at', postgresql_include=['uuid_id', 'panel_id', 'used_bytes']),
+    )
+
+class UsageDayBaseline(Base):
+    """شمارنده مصرف (بایت) هر سرویس روی هر پنل در لحظه نیمه‌شب تهران (برای محاسبه سریع مصرف امروز)"""
+    __tablename__ = "usage_day_baseline"
+    uuid_id: Mapped[int] = mapped_column(Integer, ForeignKey("user_uuids.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    panel_id: Mapped[int] = mapped_column(Integer, ForeignKey("panels.id", ondelete="CASCADE"), primary_key=True)
+    used_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    captured_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
 class ScheduledMessage(Base):
     __tablename__ = "scheduled_messages"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -232,6 +268,10 @@ class WarningLog(Base):
     uuid_id: Mapped[int] = mapped_column(Integer)
     warning_type: Mapped[str] = mapped_column(String(50))
     sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        # هر نوع هشدار برای هر سرویس فقط یک ردیف دارد (Upsert با ON CONFLICT)
+        Index('uq_warning_uuid_type', 'uuid_id', 'warning_type', unique=True),
+    )
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -342,9 +382,46 @@ class BroadcastTask(Base):
     total_users: Mapped[int] = mapped_column(Integer, default=0)
     sent_count: Mapped[int] = mapped_column(Integer, default=0)
     failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    # تفکیک خطاها (زیرمجموعه failed_count)
+    blocked_count: Mapped[int] = mapped_column(Integer, default=0)
+    deactivated_count: Mapped[int] = mapped_column(Integer, default=0)
+    flood_count: Mapped[int] = mapped_column(Integer, default=0)
+    # نقطه ادامه: آخرین user_id پردازش شده (مخاطبان به ترتیب user_id ارسال می‌شوند)
+    last_user_id: Mapped[Optional[int]] = mapped_column(BigInteger)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
 
+class AudienceSegment(Base):
+    """بخش‌های از پیش محاسبه‌شده مخاطبان (all, online, active_1, plan_<id>, cat_<code>, ...) و تعداد اعضا"""
+    __tablename__ = "audience_segments"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    label: Mapped[str] = mapped_column(String(128))
+    member_count: Mapped[int] = mapped_column(Integer, default=0)
+    refreshed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+class AudienceSegmentMember(Base):
+    """اعضای هر بخش؛ کلید (segment, user_id) همان ترتیب ارسال برادکست است"""
+    __tablename__ = "audience_segment_members"
+
+    segment: Mapped[str] = mapped_column(String(64), ForeignKey("audience_segments.key", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+class DelayedAction(Base):
+    """
+    تایمرهای پایدار (حذف پیام با تاخیر و سایر کارهای زمان‌دار)؛ یک ورکر آن‌ها را به ترتیب due_at
+    دسته به دسته برمی‌دارد. ردیف تا اجرای موفق باقی می‌ماند تا با ری‌استارت از دست نرود.
+    """
+    __tablename__ = "delayed_actions"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    action: Mapped[str] = mapped_column(String(32))
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    payload: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
 class SharedRequest(Base):
     """جدول درخواست‌های اشتراک‌گذاری سرویس"""
     __tablename__ = "shared_requests"
@@ -373,7 +450,7 @@ class MonthlyCost(Base):
 # ---------------------------------------------------------
 
 class DatabaseManager:
-    def __init__(self, db_url: Optional[str] = None):
+    def __init__(self, db_url: Optional[str] = None, read_db_url: Optional[str] = None):
         self.db_url = db_url or os.getenv("DATABASE_URL")
         if not self.db_url:
             raise ValueError("DATABASE_URL environment variable is not set!")
@@ -393,6 +470,32 @@ class DatabaseManager:
             bind=self.engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
         )
 
+        # رپلیکای فقط-خواندنی (اختیاری) برای گزارش‌ها و آمار؛ در نبود آن از دیتابیس اصلی استفاده می‌شود
+        self.read_db_url = read_db_url or os.getenv("DATABASE_READ_URL")
+        if self.read_db_url and self.read_db_url.startswith("postgresql://"):
+            self.read_db_url = self.read_db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+        if self.read_db_url:
+            self.read_engine = create_async_engine(
+                self.read_db_url,
+                echo=False,
+                pool_pre_ping=True,
+                pool_size=int(os.getenv("DB_READ_POOL_SIZE", "10")),
+                max_overflow=5
+            )
+            self.read_session_maker = async_sessionmaker(
+                bind=self.read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+            )
+            logger.info("📖 Read replica configured for reports and analytics.")
+        else:
+            self.read_engine = None
+            self.read_session_maker = self.session_maker
+
+        if SQL_INSTRUMENTATION:
+            attach_instrumentation(self.engine)
+            if self.read_engine is not None:
+                attach_instrumentation(self.read_engine)
+
     @property
     def session(self) -> AsyncGenerator[AsyncSession, None]:
         return self.get_session()
@@ -407,6 +510,38 @@ class DatabaseManager:
                 logger.error(f"Database session error: {e}", exc_info=True)
                 raise
 
+    @asynccontextmanager
+    async def read_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        سشن فقط-خواندنی برای گزارش‌ها و آمار (روی رپلیکا در صورت تنظیم DATABASE_READ_URL).
+        چیزی commit نمی‌شود؛ برای نوشتن از get_session استفاده کنید.
+        """
+        async with self.read_session_maker() as session:
+            try:
+                yield session
+            finally:
+                await session.rollback()
+
+    async def keyset_scalars(self, stmt, key_column, batch_size: Optional[int] = None,
+                             after: Optional[Any] = None) -> AsyncGenerator[list, None]:
+        """
+        مقادیر key_column را دسته به دسته با کوئری‌های کوتاه keyset می‌خواند (WHERE key > :last ORDER BY key LIMIT n).
+        هر دسته در سشن جداگانه خوانده و سشن پیش از yield بسته می‌شود؛ پردازش طولانی دسته‌ها (ارسال پیام)
+        اتصال یا تراکنشی را باز نگه نمی‌دارد و حافظه مصرفی به اندازه یک دسته است.
+        """
+        batch_size = batch_size or DB_STREAM_BATCH_SIZE
+        last = after
+        while True:
+            page = stmt if last is None else stmt.where(key_column > last)
+            async with self.session_maker() as session:
+                batch = list((await session.execute(page.order_by(key_column).limit(batch_size))).scalars().all())
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last = batch[-1]
+
     async def init_db(self):
         try:
             async with self.engine.begin() as conn:
@@ -429,6 +564,8 @@ class DatabaseManager:
 
     async def close(self):
         await self.engine.dispose()
+        if self.read_engine is not None:
+            await self.read_engine.dispose()
 
     async def get_by_id(self, model, item_id: int, session: AsyncSession = None):
         """
@@ -0,0 +1,236 @@
+# bot/db/broadcast.py
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, delete, func, exists, literal, or_
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .base import (
+    User, UserUUID, BroadcastTask, PanelUsageSnapshot, Panel, UUIDPanelAccess,
+    Plan, ServerCategory, AudienceSegment, AudienceSegmentMember
+)
+
+logger = logging.getLogger(__name__)
+
+INACTIVE_SEGMENT_DAYS = 7
+
+# بخش‌های ثابت مخاطبان؛ بخش‌های پلن (plan_<id>) و دسته‌بندی (cat_<code>) از دیتابیس ساخته می‌شوند
+BASE_SEGMENTS = {
+    'all': "همه کاربران",
+    'online': "آنلاین در ۲۴ ساعت اخیر",
+    'active_1': "دارای سرویس فعال",
+    f'inactive_{INACTIVE_SEGMENT_DAYS}': f"بدون مصرف در {INACTIVE_SEGMENT_DAYS} روز گذشته",
+    'inactive_0': "هرگز متصل نشده",
+}
+
+
+class BroadcastDB:
+    """
+    مخاطبان (بخش‌های از پیش محاسبه‌شده) و پیشرفت برادکست‌ها.
+    این کلاس به عنوان Mixin روی DatabaseManager سوار می‌شود.
+    """
+
+    def _segment_condition(self, key: str):
+        """شرط عضویت یک بخش روی جدول users (None یعنی همه کاربران)."""
+        owns_uuid = UserUUID.user_id == User.user_id
+        if key == 'all':
+            return None
+        if key == 'active_1':
+            return exists().where(owns_uuid, UserUUID.is_active == True)
+        if key == 'online':
+            return exists().where(owns_uuid, self._recent_usage(timedelta(days=1)))
+        if key == f'inactive_{INACTIVE_SEGMENT_DAYS}':
+            return exists().where(
+                owns_uuid, UserUUID.is_active == True,
+                ~self._recent_usage(timedelta(days=INACTIVE_SEGMENT_DAYS))
+            )
+        if key == 'inactive_0':
+            return exists().where(
+                owns_uuid, UserUUID.is_active == True,
+                or_(UserUUID.traffic_used == 0, UserUUID.first_connection_time.is_(None))
+            )
+        if key.startswith('plan_') and key[5:].isdigit():
+            return User.plan_id == int(key[5:])
+        if key.startswith('cat_'):
+            in_category = exists().where(
+                UUIDPanelAccess.uuid_id == UserUUID.id,
+                Panel.id == UUIDPanelAccess.panel_id,
+                Panel.category == key[4:],
+            )
+            return exists().where(owns_uuid, UserUUID.is_active == True, in_category)
+        raise ValueError(f"Unknown audience segment: {key}")
+
+    @staticmethod
+    def _recent_usage(period: timedelta):
+        """
+        سرویس در بازه اخیر مصرف داشته است: اسنپ‌شاتی در بازه که شمارنده‌اش از ردیف قبلی همان پنل بیشتر است.
+        وجود ردیف به تنهایی کافی نیست چون ردیف heartbeat بدون تغییر شمارنده هم ثبت می‌شود؛
+        ریست شمارنده (تمدید) هم مصرف حساب نمی‌شود. ردیف قبلی با یک Seek روی کلید اصلی پیدا می‌شود.
+        """
+        snap, prev = aliased(PanelUsageSnapshot), aliased(PanelUsageSnapshot)
+        prev_bytes = (
+            select(prev.used_bytes)
+            .where(prev.uuid_id == snap.uuid_id, prev.panel_id == snap.panel_id, prev.taken_at < snap.taken_at)
+            .order_by(prev.taken_at.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return exists().where(
+            snap.uuid_id == UserUUID.id,
+            snap.taken_at >= datetime.now(timezone.utc) - period,
+            snap.used_bytes > func.coalesce(prev_bytes, 0),
+        )
+
+    def _live_audience_stmt(self, key: str):
+        """
+        کوئری زنده اعضای یک بخش (بدون کاربرانی که ربات را بلاک کرده‌اند).
+        شرط‌ها با EXISTS نوشته شده‌اند تا نیازی به JOIN و DISTINCT نباشد و ترتیب user_id از ایندکس کلید اصلی خوانده شود.
+        """
+        stmt = select(User.user_id).where(User.bot_blocked_at.is_(None))
+        condition = self._segment_condition(key)
+        return stmt if condition is None else stmt.where(condition)
+
+    async def _segment_labels(self, session) -> Dict[str, str]:
+        """همه بخش‌ها: بخش‌های ثابت + یک بخش برای هر پلن و هر دسته‌بندی سرور."""
+        labels = dict(BASE_SEGMENTS)
+        for plan_id, name in (await session.execute(select(Plan.id, Plan.name).order_by(Plan.display_order, Plan.id))).all():
+            labels[f'plan_{plan_id}'] = f"پلن {name}"
+        categories = await session.execute(
+            select(ServerCategory.code, ServerCategory.name, ServerCategory.emoji)
+            .where(ServerCategory.is_active == True).order_by(ServerCategory.display_order)
+        )
+        for code, name, emoji in categories.all():
+            labels[f'cat_{code}'] = f"{emoji or ''} {name}".strip()
+        return labels
+
+    async def refresh_audience_segments(self) -> Dict[str, int]:
+        """
+        به‌روزرسانی افزایشی اعضای بخش‌ها: فقط کاربرانی که وارد یا خارج شده‌اند نوشته/حذف می‌شوند
+        و تعداد هر بخش ذخیره می‌شود. بعد از اسنپ‌شات ساعتی و همگام‌سازی پنل‌ها اجرا می‌شود.
+        """
+        now = datetime.now(timezone.utc)
+        counts = {}
+        async with self.get_session() as session:
+            labels = await self._segment_labels(session)
+
+            for key, label in labels.items():
+                await session.execute(
+                    pg_insert(AudienceSegment).values(key=key, label=label, member_count=0)
+                    .on_conflict_do_update(index_elements=[AudienceSegment.key], set_={'label': label})
+                )
+                desired = self._live_audience_stmt(key).subquery()
+                await session.execute(
+                    delete(AudienceSegmentMember).where(
+                        AudienceSegmentMember.segment == key,
+                        AudienceSegmentMember.user_id.not_in(select(desired.c.user_id)),
+                    )
+                )
+                await session.execute(
+                    pg_insert(AudienceSegmentMember)
+                    .from_select(['segment', 'user_id'], select(literal(key), desired.c.user_id))
+                    .on_conflict_do_nothing()
+                )
+                counts[key] = await session.scalar(
+                    select(func.count()).where(AudienceSegmentMember.segment == key)
+                ) or 0
+                await session.execute(
+                    update(AudienceSegment).where(AudienceSegment.key == key)
+                    .values(member_count=counts[key], refreshed_at=now)
+                )
+
+            # بخش پلن‌ها/دسته‌های حذف شده (اعضا با CASCADE حذف می‌شوند)
+            await session.execute(delete(AudienceSegment).where(AudienceSegment.key.not_in(list(labels))))
+            await session.commit()
+        return counts
+
+    async def get_audience_segments(self) -> List[Dict]:
+        """بخش‌های محاسبه‌شده با تعداد اعضا (برای منوی انتخاب مخاطب، بدون شمارش زنده)."""
+        async with self.get_session() as session:
+            rows = (await session.execute(select(AudienceSegment))).scalars().all()
+        return [
+            {'key': r.key, 'label': r.label, 'count': r.member_count, 'refreshed_at': r.refreshed_at}
+            for r in rows
+        ]
+
+    async def _is_materialized(self, key: str) -> bool:
+        async with self.get_session() as session:
+            return await session.scalar(
+                select(AudienceSegment.refreshed_at).where(AudienceSegment.key == key)
+            ) is not None
+
+    async def count_broadcast_audience(self, target: str) -> int:
+        async with self.get_session() as session:
+            count = await session.scalar(
+                select(AudienceSegment.member_count)
+                .where(AudienceSegment.key == target, AudienceSegment.refreshed_at.is_not(None))
+            )
+            if count is not None:
+                return count
+            stmt = select(func.count()).select_from(self._live_audience_stmt(target).subquery())
+            return await session.scalar(stmt) or 0
+
+    async def stream_broadcast_audience(self, target: str, after_user_id: Optional[int] = None,
+                                        batch_size: Optional[int] = None):
+        """
+        مخاطبان به ترتیب user_id و بعد از نقطه ادامه after_user_id، دسته به دسته با کوئری‌های keyset.
+        اگر بخش از قبل محاسبه شده باشد از اعضای آن خوانده می‌شود، وگرنه از کوئری زنده.
+        """
+        if await self._is_materialized(target):
+            stmt = (
+                select(AudienceSegmentMember.user_id)
+                .join(User, User.user_id == AudienceSegmentMember.user_id)
+                .where(AudienceSegmentMember.segment == target, User.bot_blocked_at.is_(None))
+            )
+            key_column = AudienceSegmentMember.user_id
+        else:
+            stmt = self._live_audience_stmt(target)
+            key_column = User.user_id
+        async for batch in self.keyset_scalars(stmt, key_column, batch_size, after=after_user_id):
+            yield batch
+
+    async def save_broadcast_progress(self, task_id: int, last_user_id: int, counts: Dict[str, int]) -> None:
+        """
+        ثبت نقطه ادامه و افزودن شمارنده‌های یک دسته (sent/failed/blocked/deactivated/flood) به تسک.
+        """
+        values = {
+            BroadcastTask.last_user_id: last_user_id,
+            BroadcastTask.updated_at: datetime.now(timezone.utc),
+        }
+        for key in ('sent', 'failed', 'blocked', 'deactivated', 'flood'):
+            if counts.get(key):
+                column = getattr(BroadcastTask, f"{key}_count")
+                values[column] = func.coalesce(column, 0) + counts[key]
+        async with self.get_session() as session:
+            await session.execute(update(BroadcastTask).where(BroadcastTask.id == task_id).values(values))
+            await session.commit()
+
+    async def set_broadcast_status(self, task_id: int, status: str, total_users: Optional[int] = None) -> None:
+        values = {'status': status, 'updated_at': datetime.now(timezone.utc)}
+        if total_users is not None:
+            values['total_users'] = total_users
+        async with self.get_session() as session:
+            await session.execute(update(BroadcastTask).where(BroadcastTask.id == task_id).values(**values))
+            await session.commit()
+
+    async def get_unfinished_broadcast_ids(self) -> List[int]:
+        """تسک‌هایی که با ری‌استارت ربات نیمه‌کاره مانده‌اند."""
+        async with self.get_session() as session:
+            stmt = select(BroadcastTask.id).where(BroadcastTask.status == 'in_progress').order_by(BroadcastTask.id)
+            return list((await session.execute(stmt)).scalars().all())
+
+    async def mark_users_bot_blocked(self, user_ids: Iterable[int]) -> int:
+        """کاربرانی که ربات را بلاک کرده یا حسابشان حذف شده از برادکست‌های بعدی کنار گذاشته می‌شوند."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        async with self.get_session() as session:
+            result = await session.execute(
+                update(User).where(User.user_id.in_(user_ids)).values(bot_blocked_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
+        for user_id in user_ids:
+            self.clear_user_cache(user_id)
+        return result.rowcount or 0
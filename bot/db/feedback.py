@@ -1,11 +1,12 @@
 # bot/db/feedback.py
 
 import logging
-from typing import Any, Dict, List
-from sqlalchemy import select, update, func, desc
+from typing import Any, Dict, Optional
+from sqlalchemy import select, update, func
 
 # وارد کردن مدل‌ها از فایل base
 from .base import UserFeedback, User
+from .pagination import keyset_fetch
 
 logger = logging.getLogger(__name__)
 
@@ -40,25 +41,24 @@ class FeedbackDB:
             await session.execute(stmt)
             await session.commit()
 
-    async def get_paginated_feedback(self, page: int, page_size: int = 10) -> List[Dict[str, Any]]:
+    async def get_paginated_feedback(self, cursor: Optional[str] = None, page_size: int = 10) -> Dict[str, Any]:
         """
-        بازخوردها را برای پنل ادمین به صورت صفحه‌بندی شده واکشی می‌کند.
+        بازخوردها را برای پنل ادمین با صفحه‌بندی کلیدی (جدیدترین اول) واکشی می‌کند.
+        خروجی: {'rows': [...], 'next': توکن صفحه بعد، 'prev': توکن صفحه قبل}
         """
-        offset = page * page_size
-        
         async with self.get_session() as session:
             # کوئری Join بین جدول بازخورد و کاربران
             stmt = (
                 select(UserFeedback, User)
                 .outerjoin(User, UserFeedback.user_id == User.user_id)
-                .order_by(desc(UserFeedback.created_at))
-                .limit(page_size)
-                .offset(offset)
             )
-            result = await session.execute(stmt)
+            page = await keyset_fetch(
+                session, stmt, [UserFeedback.created_at, UserFeedback.id], cursor, page_size,
+                key_of=lambda r: (r[0].created_at, r[0].id)
+            )
             
             feedback_list = []
-            for feedback, user in result:
+            for feedback, user in page['rows']:
                 # تبدیل نتیجه ORM به دیکشنری ساده برای استفاده در تمپلیت‌ها
                 feedback_data = {
                     "id": feedback.id,
@@ -71,7 +71,8 @@ class FeedbackDB:
                 }
                 feedback_list.append(feedback_data)
                 
-            return feedback_list
+            page['rows'] = feedback_list
+            return page
 
     async def get_feedback_count(self) -> int:
         """
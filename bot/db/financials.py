@@ -96,7 +96,7 @@ class FinancialsDB:
 
     async def get_revenue_by_month(self, months: int = 6) -> List[Dict[str, Any]]:
         """درآمد ماهانه (تعداد پرداخت‌ها) برای نمودار."""
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             # استفاده از to_char برای فرمت تاریخ در Postgres
             month_str = func.to_char(Payment.payment_date, 'YYYY-MM')
             
@@ -112,7 +112,7 @@ class FinancialsDB:
     async def get_daily_payment_stats(self, days: int = 30) -> List[Dict[str, Any]]:
         """آمار پرداخت‌های روزانه."""
         date_limit = datetime.now(timezone.utc) - timedelta(days=days)
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             date_cast = cast(Payment.payment_date, Date)
             stmt = (
                 select(date_cast.label("date"), func.count(Payment.payment_id).label("count"))
@@ -125,7 +125,7 @@ class FinancialsDB:
 
     async def get_payment_history(self) -> List[Dict[str, Any]]:
         """لیست آخرین پرداخت هر کاربر."""
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             # Subquery برای پیدا کردن آخرین تاریخ پرداخت
             subq = (
                 select(func.max(Payment.payment_date))
@@ -159,7 +159,7 @@ class FinancialsDB:
 
     async def get_all_payments_with_user_info(self) -> List[Dict[str, Any]]:
         """گزارش کامل پرداخت‌ها با جزئیات کاربر."""
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             stmt = (
                 select(
                     Payment.payment_id, Payment.payment_date,
@@ -213,7 +213,7 @@ class FinancialsDB:
         """
         محاسبه سود و زیان ماهانه بر اساس تراکنش‌های کیف پول و هزینه‌های ثبت شده.
         """
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             # 1. محاسبه درآمد (Revenue) از WalletTransaction
             # فرمت ماه: YYYY-MM
             revenue_month_str = func.to_char(WalletTransaction.transaction_date, 'YYYY-MM')
@@ -280,7 +280,7 @@ class FinancialsDB:
         else:
             end_date = datetime(year, month + 1, 1)
 
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             stmt = (
                 select(
                     WalletTransaction.id,
@@ -304,7 +304,7 @@ class FinancialsDB:
             return [dict(row._mapping) for row in result.all()]
 
     async def get_all_transactions_for_report(self) -> list:
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             stmt = select(WalletTransaction.amount, WalletTransaction.type, WalletTransaction.transaction_date).order_by(WalletTransaction.transaction_date)
             result = await session.execute(stmt)
             return [dict(row._mapping) for row in result.all()]
@@ -317,7 +317,7 @@ class FinancialsDB:
             return result.rowcount > 0
             
     async def get_total_payments_in_range(self, start_date: datetime, end_date: datetime) -> int:
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             stmt = select(func.count(Payment.payment_id)).where(
                 and_(Payment.payment_date >= start_date, Payment.payment_date < end_date)
             )
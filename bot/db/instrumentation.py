@@ -0,0 +1,166 @@
+# bot/db/instrumentation.py
+
+import functools
+import json
+import logging
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event
+
+from ..config import SQL_N_PLUS_ONE_THRESHOLD, SQL_SLOW_QUERY_MS
+
+logger = logging.getLogger("bot.sql")
+
+# حوزه فعلی (هندلر یا جاب) و شمارنده‌های کوئری همان اجرا
+_current_scope: ContextVar[Optional[dict]] = ContextVar("sql_scope", default=None)
+
+_PARAMS_RE = re.compile(r"(\$\d+|%\(\w+\)s|\?)(\s*,\s*(\$\d+|%\(\w+\)s|\?))*")
+_SPACES_RE = re.compile(r"\s+")
+
+MAX_TRACKED_SHAPES = 500
+MAX_RECENT_FLAGS = 50
+
+
+def statement_shape(statement: str) -> str:
+    """شکل کوئری بدون پارامترها (لیست‌های IN به یک ? خلاصه می‌شوند)."""
+    return _PARAMS_RE.sub("?", _SPACES_RE.sub(" ", statement)).strip()
+
+
+def _log_event(event_name: str, level: int = logging.INFO, **fields):
+    """لاگ ساختاریافته (یک خط JSON) برای جمع‌آوری در ابزارهای لاگ."""
+    logger.log(level, json.dumps({"event": event_name, **fields}, ensure_ascii=False, default=str))
+
+
+class QueryStats:
+    """
+    آمار تجمعی کوئری‌ها به تفکیک (حوزه، شکل کوئری) و فهرست آخرین موارد N+1 شناسایی شده.
+    """
+
+    def __init__(self):
+        self.shapes: Dict[tuple, dict] = {}
+        self.scopes: Dict[str, dict] = {}
+        self.flags: deque = deque(maxlen=MAX_RECENT_FLAGS)
+
+    def record_run(self, scope: str, run: dict, elapsed_ms: float):
+        s = self.scopes.setdefault(scope, {'runs': 0, 'queries': 0, 'sql_ms': 0.0, 'max_queries': 0})
+        s['runs'] += 1
+        s['queries'] += run['count']
+        s['sql_ms'] += run['sql_ms']
+        s['max_queries'] = max(s['max_queries'], run['count'])
+
+        for shape, st in run['shapes'].items():
+            key = (scope, shape)
+            agg = self.shapes.get(key)
+            if agg is None:
+                if len(self.shapes) >= MAX_TRACKED_SHAPES:
+                    continue
+                agg = self.shapes[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'max_per_run': 0}
+            agg['count'] += st['count']
+            agg['total_ms'] += st['total_ms']
+            agg['max_ms'] = max(agg['max_ms'], st['max_ms'])
+            agg['rows'] += st['rows']
+            agg['max_per_run'] = max(agg['max_per_run'], st['count'])
+
+            if st['count'] > SQL_N_PLUS_ONE_THRESHOLD:
+                flag = {'scope': scope, 'shape': shape[:300], 'count': st['count'],
+                        'total_ms': round(st['total_ms'], 1), 'at': time.time()}
+                self.flags.append(flag)
+                _log_event("sql_n_plus_one", logging.WARNING, **flag)
+
+        _log_event("sql_scope_summary", logging.DEBUG, scope=scope, queries=run['count'],
+                   sql_ms=round(run['sql_ms'], 1), elapsed_ms=round(elapsed_ms, 1))
+
+    def top_shapes(self, limit: int = 10, order_by: str = 'total_ms') -> list:
+        items = sorted(self.shapes.items(), key=lambda kv: kv[1][order_by], reverse=True)
+        return [{'scope': scope, 'shape': shape, **st} for (scope, shape), st in items[:limit]]
+
+    def top_scopes(self, limit: int = 10) -> list:
+        items = sorted(self.scopes.items(), key=lambda kv: kv[1]['sql_ms'], reverse=True)
+        return [{'scope': scope, **st} for scope, st in items[:limit]]
+
+    def reset(self):
+        self.shapes.clear()
+        self.scopes.clear()
+        self.flags.clear()
+
+
+query_stats = QueryStats()
+
+
+def begin_scope(name: str) -> Optional[tuple]:
+    """شروع ثبت کوئری‌ها برای یک حوزه؛ حوزه‌های تو در تو در حوزه بیرونی شمرده می‌شوند (خروجی None)."""
+    if _current_scope.get() is not None:
+        return None
+    run = {'name': name, 'count': 0, 'sql_ms': 0.0, 'shapes': {}}
+    return _current_scope.set(run), run, time.perf_counter()
+
+
+def end_scope(handle: Optional[tuple]):
+    """پایان حوزه و ثبت آمار آن؛ شکل‌های تکراری‌تر از SQL_N_PLUS_ONE_THRESHOLD گزارش می‌شوند."""
+    if handle is None:
+        return
+    token, run, started = handle
+    _current_scope.reset(token)
+    query_stats.record_run(run['name'], run, (time.perf_counter() - started) * 1000)
+
+
+@contextmanager
+def query_scope(name: str):
+    """همه کوئری‌های اجرا شده در این بلاک به نام `name` ثبت می‌شوند."""
+    handle = begin_scope(name)
+    try:
+        yield
+    finally:
+        end_scope(handle)
+
+
+def scoped_job(func: Callable) -> Callable:
+    """دکوریتور جاب‌های زمان‌بندی‌شده: کوئری‌های جاب با نام job:<name> ثبت می‌شوند."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with query_scope(f"job:{func.__name__}"):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+
+    run = _current_scope.get()
+    scope = run['name'] if run else None
+    shape = statement_shape(statement)
+
+    if run is not None:
+        run['count'] += 1
+        run['sql_ms'] += elapsed_ms
+        st = run['shapes'].get(shape)
+        if st is None:
+            st = run['shapes'][shape] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+        st['count'] += 1
+        st['total_ms'] += elapsed_ms
+        st['max_ms'] = max(st['max_ms'], elapsed_ms)
+        st['rows'] += rows
+
+    if elapsed_ms >= SQL_SLOW_QUERY_MS:
+        _log_event("sql_slow_query", logging.WARNING, scope=scope, ms=round(elapsed_ms, 1),
+                   rows=rows, shape=shape[:300])
+
+
+def attach_instrumentation(engine: Any):
+    """اتصال هوک‌های زمان‌سنجی به موتور (AsyncEngine یا Engine)."""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,30 @@
+# bot/db/loaders.py
+
+from typing import Tuple
+
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from .base import User, UserUUID, WalletTransaction
+
+# پروفایل‌های لود روابط؛ هر کوئری فقط روابطی را که واقعا استفاده می‌کند انتخاب می‌کند:
+#   stmt = select(UserUUID).options(*loader('uuid_panels'))
+#   uuid_obj = await session.get(UserUUID, uuid_id, options=loader('uuid_panels'))
+LOADER_PROFILES = {
+    # سرویس‌های کاربر (مثلا شمارش سرویس‌های فعال در لیست‌ها و خروجی CSV)
+    'user_uuids': (selectinload(User.uuids),),
+    # پنل‌های مجاز یک سرویس (اتصال به API پنل، مدیریت دسترسی)
+    'uuid_panels': (selectinload(UserUUID.allowed_panels),),
+    # مالک سرویس (یک JOIN) و پنل‌های مجاز آن؛ مثلا پیش‌خوانی دسته‌ای جاب هشدارها
+    'uuid_full': (joinedload(UserUUID.user), selectinload(UserUUID.allowed_panels)),
+    # کاربر هر تراکنش در گزارش‌های مالی
+    'transaction_user': (joinedload(WalletTransaction.user),),
+}
+
+
+def loader(profile: str) -> Tuple[LoaderOption, ...]:
+    """گزینه‌های لود یک پروفایل نام‌دار (برای .options(*...) یا session.get(..., options=...))."""
+    try:
+        return LOADER_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown loader profile: {profile}") from None
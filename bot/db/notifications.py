@@ -2,12 +2,13 @@
 
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import pytz
 
 from sqlalchemy import select, update, delete, and_, desc, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from .base import (
-    WarningLog, UserUUID, SentReport, User, Notification, ScheduledMessage
+    WarningLog, UserUUID, SentReport, Notification, ScheduledMessage
 )
 
 logger = logging.getLogger(__name__)
@@ -24,23 +25,42 @@ class NotificationsDB:
         """
         یک هشدار ارسال شده برای کاربر را ثبت یا به‌روزرسانی می‌کند.
         """
-        async with self.get_session() as session:
-            # ابتدا بررسی می‌کنیم آیا رکوردی وجود دارد یا خیر
-            stmt = select(WarningLog).where(
-                and_(WarningLog.uuid_id == uuid_id, WarningLog.warning_type == warning_type)
-            )
-            result = await session.execute(stmt)
-            existing_log = result.scalar_one_or_none()
+        await self.log_warnings_bulk([(uuid_id, warning_type)])
 
-            if existing_log:
-                # اگر وجود داشت، زمان آن را به‌روز می‌کنیم
-                existing_log.sent_at = datetime.now(timezone.utc)
-            else:
-                # اگر وجود نداشت، رکورد جدید می‌سازیم
-                new_log = WarningLog(uuid_id=uuid_id, warning_type=warning_type)
-                session.add(new_log)
-            
+    async def log_warnings_bulk(self, entries: Iterable[Tuple[int, str]]) -> int:
+        """
+        ثبت گروهی هشدارهای ارسال شده [(uuid_id, warning_type), ...] با Upsert روی
+        ایندکس یکتای (uuid_id, warning_type)؛ زمان ارسال رکوردهای موجود به‌روز می‌شود.
+        """
+        now = datetime.now(timezone.utc)
+        rows = [{'uuid_id': u, 'warning_type': w, 'sent_at': now} for u, w in dict.fromkeys(entries) if u is not None]
+        if not rows:
+            return 0
+
+        async with self.get_session() as session:
+            for i in range(0, len(rows), 1000):
+                stmt = pg_insert(WarningLog).values(rows[i:i + 1000])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[WarningLog.uuid_id, WarningLog.warning_type],
+                    set_={'sent_at': stmt.excluded.sent_at}
+                )
+                await session.execute(stmt)
             await session.commit()
+        return len(rows)
+
+    async def get_recent_warnings(self, hours: int, uuid_ids: Optional[List[int]] = None) -> Dict[Tuple[int, str], datetime]:
+        """
+        تمام هشدارهای ارسال شده در چند ساعت گذشته در یک کوئری: {(uuid_id, warning_type): sent_at}
+        جاب هشدارها این را یک بار با بزرگ‌ترین بازه لازم می‌خواند و بقیه بررسی‌ها را در حافظه انجام می‌دهد.
+        """
+        time_ago = datetime.now(timezone.utc) - timedelta(hours=hours)
+        stmt = select(WarningLog.uuid_id, WarningLog.warning_type, WarningLog.sent_at).where(WarningLog.sent_at >= time_ago)
+        if uuid_ids is not None:
+            stmt = stmt.where(WarningLog.uuid_id.in_(uuid_ids))
+
+        async with self.get_session() as session:
+            rows = (await session.execute(stmt)).all()
+        return {(r.uuid_id, r.warning_type): r.sent_at for r in rows}
 
     async def has_recent_warning(self, uuid_id: int, warning_type: str, hours: int = 24) -> bool:
         """
@@ -102,23 +122,12 @@ class NotificationsDB:
                 for r in result.scalars().all()
             ]
 
-    async def get_old_reports_to_delete(self, hours: int = 12) -> List[Dict[str, Any]]:
-        """پیام‌های گزارشی قدیمی که باید حذف شوند."""
-        time_limit = datetime.now(timezone.utc) - timedelta(hours=hours)
-        
+    async def delete_sent_report_by_message(self, user_id: int, message_id: int) -> None:
+        """حذف رکورد گزارشی که پیام آن پاک شده است."""
         async with self.get_session() as session:
-            stmt = (
-                select(SentReport.id, SentReport.user_id, SentReport.message_id)
-                .join(User, SentReport.user_id == User.user_id)
-                .where(
-                    and_(
-                        SentReport.sent_at < time_limit,
-                        User.auto_delete_reports == True
-                    )
-                )
-            )
-            result = await session.execute(stmt)
-            return [dict(row._mapping) for row in result.all()]
+            stmt = delete(SentReport).where(SentReport.user_id == user_id, SentReport.message_id == message_id)
+            await session.execute(stmt)
+            await session.commit()
 
     async def delete_sent_report_record(self, record_id: int) -> None:
         """یک رکورد را از جدول sent_reports حذف می‌کند."""
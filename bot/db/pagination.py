@@ -0,0 +1,157 @@
+# bot/db/pagination.py
+
+import base64
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Optional, Sequence
+
+from sqlalchemy import literal, tuple_
+
+# جهت حرکت در توکن: صفحه بعد (بعد از آخرین کلید) یا صفحه قبل (پیش از اولین کلید)
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+_SEP = '~'
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICRO = datetime.resolution
+_B36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _b36(n: int) -> str:
+    if n < 0:
+        return '-' + _b36(-n)
+    out = ''
+    while True:
+        n, r = divmod(n, 36)
+        out = _B36[r] + out
+        if n == 0:
+            return out
+
+
+def _encode_value(v: Any) -> str:
+    if v is None:
+        return 'z'
+    if isinstance(v, bool):
+        return 'b' + ('1' if v else '0')
+    if isinstance(v, int):
+        return 'i' + _b36(v)
+    if isinstance(v, float):
+        return 'f' + repr(v)
+    if isinstance(v, datetime):
+        if v.tzinfo is None:
+            micros = (v - _EPOCH.replace(tzinfo=None)) // _ONE_MICRO
+            return 't' + _b36(micros)
+        return 'd' + _b36((v - _EPOCH) // _ONE_MICRO)
+    if isinstance(v, date):
+        return 'D' + _b36(v.toordinal())
+    if isinstance(v, uuid.UUID):
+        return 'u' + _b36(v.int)
+    if isinstance(v, str):
+        return 's' + base64.urlsafe_b64encode(v.encode()).decode().rstrip('=')
+    raise TypeError(f"Unsupported cursor value: {type(v).__name__}")
+
+
+def _decode_value(token: str) -> Any:
+    kind, raw = token[0], token[1:]
+    if kind == 'z':
+        return None
+    if kind == 'b':
+        return raw == '1'
+    if kind == 'i':
+        return int(raw, 36)
+    if kind == 'f':
+        return float(raw)
+    if kind == 'd':
+        return _EPOCH + int(raw, 36) * _ONE_MICRO
+    if kind == 't':
+        return _EPOCH.replace(tzinfo=None) + int(raw, 36) * _ONE_MICRO
+    if kind == 'D':
+        return date.fromordinal(int(raw, 36))
+    if kind == 'u':
+        return uuid.UUID(int=int(raw, 36))
+    if kind == 's':
+        return base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)).decode()
+    raise ValueError(f"Bad cursor value: {token!r}")
+
+
+def encode_cursor(direction: str, values: Sequence[Any]) -> str:
+    """
+    توکن فشرده و امن برای callback_data (بدون ':')؛ مثلا 'nd1ab2c3~i9x'.
+    """
+    return direction + _SEP.join(_encode_value(v) for v in values)
+
+
+def decode_cursor(token: str) -> tuple[str, tuple]:
+    """توکن را به (جهت، مقادیر کلید) برمی‌گرداند؛ توکن نامعتبر ValueError می‌دهد."""
+    if not token or token[0] not in (CURSOR_NEXT, CURSOR_PREV) or len(token) < 2:
+        raise ValueError(f"Bad cursor: {token!r}")
+    try:
+        return token[0], tuple(_decode_value(part) for part in token[1:].split(_SEP))
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"Bad cursor: {token!r}") from e
+
+
+def is_cursor(value: str) -> bool:
+    try:
+        decode_cursor(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _page_result(rows: list, first_key, last_key, has_next: bool, has_prev: bool) -> dict:
+    return {
+        'rows': rows,
+        'next': encode_cursor(CURSOR_NEXT, last_key) if rows and has_next else None,
+        'prev': encode_cursor(CURSOR_PREV, first_key) if rows and has_prev else None,
+    }
+
+
+async def keyset_fetch(session, stmt, keys: Sequence, cursor: Optional[str], limit: int,
+                       key_of: Callable[[Any], tuple], descending: bool = True,
+                       scalars: bool = False) -> dict:
+    """
+    صفحه‌بندی کلیدی (Keyset): به جای OFFSET، ردیف‌های بعد/قبل از کلید توکن با WHERE روی
+    tuple(keys) خوانده می‌شوند؛ هزینه صفحه N با صفحه اول برابر است.
+    keys باید یکتا باشند (مثلا تاریخ + id) و همه در یک جهت مرتب شوند.
+    خروجی: {'rows': [...], 'next': توکن یا None, 'prev': توکن یا None}
+    """
+    direction, values = decode_cursor(cursor) if cursor else (None, None)
+    backward = direction == CURSOR_PREV
+
+    if values is not None:
+        key_tuple = tuple_(*keys)
+        bound = tuple_(*[literal(v, type_=k.type) for k, v in zip(keys, values)])
+        # در جهت نزولی «بعدی» یعنی کلیدهای کوچکتر؛ برای صفحه قبل برعکس
+        stmt = stmt.where(key_tuple < bound if descending != backward else key_tuple > bound)
+
+    order_desc = descending != backward
+    stmt = stmt.order_by(None).order_by(*[k.desc() if order_desc else k.asc() for k in keys]).limit(limit + 1)
+
+    result = await session.execute(stmt)
+    rows = list(result.scalars().all() if scalars else result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    if not rows:
+        return {'rows': [], 'next': None, 'prev': None}
+    has_next = True if backward else has_more
+    has_prev = has_more if backward else values is not None
+    return _page_result(rows, key_of(rows[0]), key_of(rows[-1]), has_next, has_prev)
+
+
+def paginate_list(items: Sequence, cursor: Optional[str], limit: int) -> dict:
+    """
+    همان قرارداد keyset_fetch برای لیست‌های آماده در حافظه (مثلا کاربران کش‌شده یک پنل)؛
+    کلید توکن، موقعیت در لیست است.
+    """
+    direction, values = decode_cursor(cursor) if cursor else (None, (0,))
+    pos = max(0, min(int(values[0]), len(items)))
+    if direction == CURSOR_PREV:
+        start, end = max(0, pos - limit), pos
+    else:
+        start, end = pos, pos + limit
+    rows = list(items[start:end])
+    return _page_result(rows, (start,), (start + len(rows),), start + len(rows) < len(items), start > 0)
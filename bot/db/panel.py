@@ -4,7 +4,6 @@ import logging
 import uuid
 from typing import Any, Dict, List, Optional
 from sqlalchemy import select, update, delete, not_, and_
-from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 
 # وارد کردن مدل‌ها
@@ -12,6 +11,8 @@ from .base import (
     Panel, PanelNode, MarzbanMapping, ConfigTemplate, UserUUID, 
     UserGeneratedConfig, UUIDPanelAccess
 )
+from .loaders import loader
+from .pagination import keyset_fetch
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,7 @@ class PanelDB:
                 )
                 session.add(new_panel)
                 await session.commit()
+                self.invalidate_panel_map()
                 return True
             except IntegrityError:
                 logger.warning(f"Attempted to add a panel with a duplicate name: {name}")
@@ -67,6 +69,7 @@ class PanelDB:
             stmt = delete(Panel).where(Panel.id == panel_id)
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_panel_map()
             return result.rowcount > 0
 
     async def toggle_panel_status(self, panel_id: int) -> bool:
@@ -74,6 +77,7 @@ class PanelDB:
             stmt = update(Panel).where(Panel.id == panel_id).values(is_active=not_(Panel.is_active))
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_panel_map()
             return result.rowcount > 0
 
     async def get_panel_by_id(self, panel_id: int) -> Optional[Dict[str, Any]]:
@@ -108,6 +112,7 @@ class PanelDB:
                 stmt = update(Panel).where(Panel.id == panel_id).values(name=new_name)
                 result = await session.execute(stmt)
                 await session.commit()
+                self.invalidate_panel_map()
                 return result.rowcount > 0
             except IntegrityError:
                 return False
@@ -180,7 +185,7 @@ class PanelDB:
         """
         async with self.get_session() as session:
             # 1. UUID را به همراه پنل‌های فعلی لود می‌کنیم
-            stmt_uuid = select(UserUUID).where(UserUUID.id == uuid_id).options(selectinload(UserUUID.allowed_panels))
+            stmt_uuid = select(UserUUID).where(UserUUID.id == uuid_id).options(*loader('uuid_panels'))
             result_uuid = await session.execute(stmt_uuid)
             uuid_obj = result_uuid.scalar_one_or_none()
             
@@ -206,11 +211,8 @@ class PanelDB:
     async def revoke_access_by_category(self, uuid_id: int, category: str):
         """دسترسی به یک دسته‌بندی خاص را از UUID می‌گیرد."""
         async with self.get_session() as session:
-            uuid_obj = await session.get(UserUUID, uuid_id) # بهتر است با option لود شود اما اینجا lazy هم کار می‌کند
+            uuid_obj = await session.get(UserUUID, uuid_id, options=loader('uuid_panels'))
             if uuid_obj:
-                # باید پنل‌ها را لود کنیم
-                await session.refresh(uuid_obj, ['allowed_panels'])
-                
                 # فیلتر کردن لیست: آن‌هایی که کتگوری‌شان مساوی نیست بمانند
                 uuid_obj.allowed_panels = [
                     p for p in uuid_obj.allowed_panels if p.category != category
@@ -220,7 +222,7 @@ class PanelDB:
     async def get_user_allowed_panels(self, uuid_id: int) -> List[Dict[str, Any]]:
         """لیست پنل‌هایی که کاربر به آن‌ها دسترسی دارد."""
         async with self.get_session() as session:
-            stmt = select(UserUUID).where(UserUUID.id == uuid_id).options(selectinload(UserUUID.allowed_panels))
+            stmt = select(UserUUID).where(UserUUID.id == uuid_id).options(*loader('uuid_panels'))
             result = await session.execute(stmt)
             uuid_obj = result.scalar_one_or_none()
             
@@ -265,6 +267,16 @@ class PanelDB:
             result = await session.execute(stmt)
             return [{"hiddify_uuid": r.hiddify_uuid, "marzban_username": r.marzban_username} for r in result.scalars().all()]
 
+    async def get_marzban_mappings_page(self, cursor: Optional[str] = None, page_size: int = 20) -> Dict[str, Any]:
+        """اتصال‌های مرزبان با صفحه‌بندی کلیدی روی UUID؛ خروجی مانند keyset_fetch."""
+        async with self.get_session() as session:
+            page = await keyset_fetch(
+                session, select(MarzbanMapping), [MarzbanMapping.hiddify_uuid], cursor, page_size,
+                key_of=lambda r: (r.hiddify_uuid,), descending=False, scalars=True
+            )
+            page['rows'] = [{"hiddify_uuid": r.hiddify_uuid, "marzban_username": r.marzban_username} for r in page['rows']]
+            return page
+
     async def delete_marzban_mapping(self, hiddify_uuid: str | uuid.UUID) -> bool:
         async with self.get_session() as session:
             try:
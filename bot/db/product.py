@@ -66,6 +66,7 @@ class ProductDB:
             )
             session.add(new_plan)
             await session.commit()
+            self.invalidate_menu_cache()
             return True
 
     async def update_plan(self, plan_id: int, **kwargs) -> bool:
@@ -77,6 +78,7 @@ class ProductDB:
             stmt = update(Plan).where(Plan.id == plan_id).values(**kwargs)
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_menu_cache()
             return result.rowcount > 0
 
     async def delete_plan(self, plan_id: int) -> bool:
@@ -85,6 +87,7 @@ class ProductDB:
             stmt = delete(Plan).where(Plan.id == plan_id)
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_menu_cache()
             return result.rowcount > 0
 
     async def get_plan_by_id(self, plan_id: int) -> Optional[Dict[str, Any]]:
@@ -169,22 +172,37 @@ class ProductDB:
 
     # --- مدیریت دسته‌بندی سرورها (Server Categories) ---
 
+    async def get_category_codes(self) -> List[str]:
+        """کد تمام دسته‌بندی‌ها؛ یک بار خوانده و تا تغییر دسته‌بندی‌ها در حافظه نگه داشته می‌شود."""
+        if self._category_codes is None:
+            async with self.get_session() as session:
+                self._category_codes = list((await session.execute(select(ServerCategory.code))).scalars().all())
+        return self._category_codes
+
+    def invalidate_category_codes(self):
+        self._category_codes = None
+        self._server_categories = None
+        self.invalidate_menu_cache()
+
     async def get_server_categories(self) -> List[Dict[str, Any]]:
         """
         لیست تمام دسته‌بندی‌های سرور (برای ساخت منوهای داینامیک).
+        یک بار خوانده و تا تغییر دسته‌بندی‌ها در حافظه نگه داشته می‌شود.
         """
-        async with self.get_session() as session:
-            stmt = select(ServerCategory).where(ServerCategory.is_active == True).order_by(ServerCategory.display_order)
-            result = await session.execute(stmt)
-            return [
-                {
-                    "code": c.code, 
-                    "name": c.name, 
-                    "emoji": c.emoji, 
-                    "description": c.description
-                }
-                for c in result.scalars().all()
-            ]
+        if self._server_categories is None:
+            async with self.get_session() as session:
+                stmt = select(ServerCategory).where(ServerCategory.is_active == True).order_by(ServerCategory.display_order)
+                result = await session.execute(stmt)
+                self._server_categories = [
+                    {
+                        "code": c.code, 
+                        "name": c.name, 
+                        "emoji": c.emoji, 
+                        "description": c.description
+                    }
+                    for c in result.scalars().all()
+                ]
+        return [dict(c) for c in self._server_categories]
 
     async def add_server_category(self, code: str, name: str, emoji: str, description: str = None, display_order: int = 0) -> bool:
         """
@@ -199,6 +217,7 @@ class ProductDB:
                 )
                 session.add(new_cat)
                 await session.commit()
+                self.invalidate_category_codes()
                 return True
             except IntegrityError:
                 return False
@@ -209,6 +228,7 @@ class ProductDB:
             stmt = update(ServerCategory).where(ServerCategory.code == code).values(name=new_name)
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_category_codes()
             return result.rowcount > 0
 
     async def delete_server_category(self, code: str) -> bool:
@@ -217,4 +237,5 @@ class ProductDB:
             stmt = delete(ServerCategory).where(ServerCategory.code == code)
             result = await session.execute(stmt)
             await session.commit()
+            self.invalidate_category_codes()
             return result.rowcount > 0
\ No newline at end of file
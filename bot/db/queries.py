@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from async_lru import alru_cache
 
 # ایمپورت مدل‌ها
-from bot.db.base import User, UserUUID, UsageSnapshot, Plan, ServerCategory, SystemConfig
+from bot.db.base import User, UserUUID, Plan, ServerCategory
 # ایمپورت نمونه دیتابیس برای اجرای کوئری‌ها
 from bot.database import db
 
@@ -88,17 +88,12 @@ def get_users_by_plan_query(plan_id: int = None):
 # استفاده از async-lru برای کاهش فشار روی دیتابیس
 # ---------------------------------------------------------
 
-@alru_cache(maxsize=1000, ttl=300)  # کش تا ۵ دقیقه، حداکثر ۱۰۰۰ رکورد
 async def get_user_cached(user_id: int):
     """
-    دریافت اطلاعات کاربر به صورت کش شده.
-    مناسب برای چک کردن وضعیت کاربر در میدل‌ورها یا هندلرها.
+    دریافت اطلاعات کاربر به صورت کش شده (دیکشنری).
+    کش مشترک db.user است که با هر تغییر در رکورد کاربر باطل می‌شود.
     """
-    async with db.get_session() as session:
-        # نکته: چون سشن بسته می‌شود، باید مطمئن باشید که ریلیشن‌های مورد نیاز
-        # در مدل User به صورت lazy='selectin' تعریف شده باشند (که در کد شما هستند).
-        user = await session.get(User, user_id)
-        return user
+    return await db.user(user_id)
 
 @alru_cache(maxsize=50, ttl=3600)  # کش تا ۱ ساعت
 async def get_plan_cached(plan_id: int):
@@ -106,22 +101,13 @@ async def get_plan_cached(plan_id: int):
     async with db.get_session() as session:
         return await session.get(Plan, plan_id)
 
-@alru_cache(maxsize=1, ttl=600)  # کش تا ۱۰ دقیقه
 async def get_system_config_cached(key: str):
-    """دریافت یک تنظیم سیستم با کش."""
-    async with db.get_session() as session:
-        config = await session.get(SystemConfig, key)
-        return config.value if config else None
+    """دریافت یک تنظیم سیستم (کش در خود db.get_config است و با set_config باطل می‌شود)."""
+    return await db.get_config(key)
 
 # تابع کمکی برای پاک کردن کش یک کاربر خاص (مثلاً وقتی خرید می‌کند)
 def invalidate_user_cache(user_id: int):
     """
-    این تابع را باید در جاهایی که کاربر تغییر می‌کند (مثل تمدید سرویس) صدا بزنید.
+    این تابع را باید در جاهایی که کاربر خارج از UserDB/WalletDB تغییر می‌کند صدا بزنید.
     """
-    # در نسخه‌های جدید async-lru امکان پاک کردن یک کلید خاص وجود دارد
-    # اگر ارور داد، می‌توانید کل کش را با get_user_cached.cache_clear() پاک کنید
-    try:
-        get_user_cached.cache_invalidate(user_id)
-    except AttributeError:
-        # Fallback برای نسخه‌های قدیمی
-        get_user_cached.cache_clear()
\ No newline at end of file
+    db.clear_user_cache(user_id)
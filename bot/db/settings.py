@@ -1,11 +1,16 @@
 # bot/db/settings.py
 
+import asyncio
 import logging
-from sqlalchemy import select, delete, update
+import asyncpg
+from sqlalchemy import select, delete, update, func
 from .base import SystemConfig, PaymentMethod
 
 logger = logging.getLogger(__name__)
 
+# کانال NOTIFY پستگرس برای باطل کردن کش تنظیمات در سایر پروسه‌ها
+CONFIG_NOTIFY_CHANNEL = 'system_config_changed'
+
 class SettingsDB:
     """
     توابع مدیریت تنظیمات و روش‌های پرداخت.
@@ -15,20 +20,84 @@ class SettingsDB:
     # --- تنظیمات عمومی (مثل آیدی کانال‌ها) ---
 
     async def set_config(self, key: str, value: str):
-        """ذخیره یا بروزرسانی یک تنظیم سیستم"""
+        """ذخیره یا بروزرسانی یک تنظیم سیستم (کش حافظه به‌روز و سایر پروسه‌ها با NOTIFY باخبر می‌شوند)"""
         async with self.get_session() as session:
             config = await session.get(SystemConfig, key)
             if config:
                 config.value = str(value)
             else:
                 session.add(SystemConfig(key=key, value=str(value)))
+            # NOTIFY همراه تراکنش و فقط بعد از commit ارسال می‌شود
+            await session.execute(select(func.pg_notify(CONFIG_NOTIFY_CHANNEL, key)))
             await session.commit()
 
+        if self._config_cache is not None:
+            self._config_cache[key] = str(value)
+        self.invalidate_menu_cache()
+
     async def get_config(self, key: str, default=None):
-        """دریافت مقدار یک تنظیم"""
+        """دریافت مقدار یک تنظیم (از کش حافظه؛ جدول system_config فقط یک بار خوانده می‌شود)"""
+        if self._config_cache is None:
+            await self.load_config_cache()
+        return self._config_cache.get(key, default)
+
+    async def load_config_cache(self) -> dict:
+        """خواندن کل جدول system_config در حافظه."""
         async with self.get_session() as session:
-            config = await session.get(SystemConfig, key)
-            return config.value if config else default
+            rows = (await session.execute(select(SystemConfig.key, SystemConfig.value))).all()
+        self._config_cache = {r.key: r.value for r in rows}
+        return self._config_cache
+
+    def invalidate_config_cache(self):
+        self._config_cache = None
+        self.invalidate_menu_cache()
+
+    @property
+    def menu_version(self) -> int:
+        """نسخه داده‌هایی که منوها از آن ساخته می‌شوند (جزئی از کلید کش کیبوردها)."""
+        return self._menu_version
+
+    def invalidate_menu_cache(self):
+        """با تغییر دسته‌بندی‌ها، پلن‌ها، پنل‌ها یا تنظیمات همه کیبوردهای کش‌شده باطل می‌شوند."""
+        self._menu_version += 1
+
+    async def listen_config_changes(self, retry_delay: int = 10):
+        """
+        تسک پس‌زمینه: گوش دادن به NOTIFY تغییر تنظیمات (LISTEN) و باطل کردن کش، تا تغییرات
+        پروسه‌های دیگر (پنل وب، اسکریپت‌ها) هم دیده شوند. اتصال LISTEN یک اتصال asyncpg جداگانه
+        بیرون از Pool اصلی است (جایی از Pool را اشغال نمی‌کند) و با قطع شدن دوباره برقرار می‌شود.
+        """
+        dsn = self.db_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+        lost = asyncio.Event()
+
+        def _on_notify(connection, pid, channel, payload):
+            logger.info(f"CONFIG: '{payload}' changed by another session, reloading cache.")
+            self.invalidate_config_cache()
+
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost.clear()
+                conn.add_termination_listener(lambda connection: lost.set())
+                await conn.add_listener(CONFIG_NOTIFY_CHANNEL, _on_notify)
+                # تغییرات زمان قطع بودن اتصال از دست رفته‌اند
+                self.invalidate_config_cache()
+                while not conn.is_closed():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=retry_delay * 6)
+                    except asyncio.TimeoutError:
+                        # قطعی بی‌صدای شبکه با یک کوئری سبک تشخیص داده می‌شود
+                        await conn.execute("SELECT 1")
+                logger.warning("CONFIG: Listener connection lost, reconnecting.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"CONFIG: Listener connection error: {e}")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            await asyncio.sleep(retry_delay)
 
     # --- مدیریت روش‌های پرداخت ---
 
@@ -0,0 +1,85 @@
+# bot/db/timers.py
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, delete, func, insert
+
+from .base import DelayedAction
+
+logger = logging.getLogger(__name__)
+
+
+class TimerDB:
+    """
+    صف پایدار کارهای زمان‌دار (DelayedAction).
+    این کلاس به عنوان Mixin روی DatabaseManager سوار می‌شود.
+    """
+
+    async def schedule_actions(self, actions: Iterable[Dict[str, Any]]) -> int:
+        """
+        ثبت گروهی تایمرها با یک INSERT.
+        هر آیتم: {'action', 'chat_id', 'message_id', 'delay' (ثانیه), 'payload' (اختیاری)}
+        """
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                'due_at': now + timedelta(seconds=max(0, a.get('delay', 0))),
+                'action': a['action'],
+                'chat_id': a['chat_id'],
+                'message_id': a.get('message_id'),
+                'payload': a.get('payload'),
+            }
+            for a in actions
+        ]
+        if not rows:
+            return 0
+        async with self.get_session() as session:
+            await session.execute(insert(DelayedAction), rows)
+            await session.commit()
+        return len(rows)
+
+    async def claim_due_actions(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """
+        برداشتن حداکثر `limit` تایمر سررسید شده.
+        به جای حذف، due_at به اندازه lease_seconds جلو می‌رود؛ اگر پروسه قبل از complete_actions متوقف شود
+        تایمر بعد از پایان مهلت دوباره برداشته می‌شود. SKIP LOCKED اجازه چند ورکر هم‌زمان را می‌دهد.
+        """
+        now = datetime.now(timezone.utc)
+        due = (
+            select(DelayedAction.id)
+            .where(DelayedAction.due_at <= now)
+            .order_by(DelayedAction.due_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(DelayedAction)
+            .where(DelayedAction.id.in_(due))
+            .values(due_at=now + timedelta(seconds=lease_seconds), attempts=DelayedAction.attempts + 1)
+            .returning(
+                DelayedAction.id, DelayedAction.action, DelayedAction.chat_id,
+                DelayedAction.message_id, DelayedAction.payload, DelayedAction.attempts,
+            )
+        )
+        async with self.get_session() as session:
+            rows = (await session.execute(stmt)).all()
+            await session.commit()
+        return [dict(row._mapping) for row in rows]
+
+    async def complete_actions(self, action_ids: List[int]) -> None:
+        if not action_ids:
+            return
+        async with self.get_session() as session:
+            await session.execute(delete(DelayedAction).where(DelayedAction.id.in_(action_ids)))
+            await session.commit()
+
+    async def next_action_due_at(self) -> Optional[datetime]:
+        async with self.get_session() as session:
+            return await session.scalar(select(func.min(DelayedAction.due_at)))
+
+    async def count_pending_actions(self) -> int:
+        async with self.get_session() as session:
+            return await session.scalar(select(func.count()).select_from(DelayedAction)) or 0
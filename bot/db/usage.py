@@ -1,21 +1,38 @@
 # bot/db/usage.py
 
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import pytz
 import jdatetime
 
-from sqlalchemy import select, delete, func, desc, and_, case, cast, Date, extract, distinct
+from sqlalchemy import (
+    select, delete, func, desc, and_, case, cast, Date, DateTime, Float, Integer,
+    extract, distinct, values, column, true, tuple_
+)
 from sqlalchemy.orm import aliased
-from .base import UsageSnapshot, UserUUID, User
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .base import PanelUsageSnapshot, UsageDayBaseline, UserUUID, User, Panel
+from ..config import SNAPSHOT_HEARTBEAT_HOURS
 
 logger = logging.getLogger(__name__)
 
+# انواع پنل‌های شناخته شده؛ خروجی‌های تفکیکی همیشه این کلیدها را دارند (انواع جدید هم اضافه می‌شوند)
+SNAPSHOT_PANELS = ('hiddify', 'marzban', 'remnawave', 'pasarguard')
+
+BYTES_PER_GB = 1024 ** 3
+
+# در حالت ثبت تغییرات، قبل از هر بازه حداقل یک ردیف در این فاصله وجود دارد (Heartbeat + حاشیه اجرای جاب)
+SNAPSHOT_LOOKBACK = timedelta(hours=SNAPSHOT_HEARTBEAT_HOURS + 2)
+
+# بازه‌های زمانی روز (به وقت تهران)؛ اندیس هر بازه = ساعت // 6
+TIME_OF_DAY_SLOTS = ('night', 'morning', 'afternoon', 'evening')
+
 
 class UsageDB:
     """
     مدیریت اسنپ‌شات‌های مصرف برای محاسبه دقیق مصرف روزانه.
+    شمارنده‌ها به تفکیک پنل و به بایت ذخیره می‌شوند: {uuid_id: {panel_id: used_bytes}}
     """
 
     def _calculate_diff(self, start_val: float, end_val: float) -> float:
@@ -30,82 +47,301 @@ class UsageDB:
         else:
             return end_val
 
-    async def add_usage_snapshot(self, uuid_id: int, 
-                                 hiddify_usage: float, 
-                                 marzban_usage: float, 
-                                 remnawave_usage: float, 
-                                 pasarguard_usage: float):
-        """ثبت یک اسنپ‌شات جدید در دیتابیس."""
+    def _panel_diffs(self, start: Optional[dict], end: Optional[dict]) -> Dict[int, int]:
+        """اختلاف مصرف (بایت) هر پنل بین دو وضعیت {panel_id: used_bytes}."""
+        if not end:
+            return {}
+        start = start or {}
+        return {pid: self._calculate_diff(start.get(pid, 0), val) for pid, val in end.items()}
+
+    def _snapshot_diff(self, start: Optional[dict], end: Optional[dict]) -> float:
+        """اختلاف کل مصرف (GB، مجموع همه پنل‌ها) بین دو وضعیت برگشتی از get_snapshot_baselines."""
+        return sum(self._panel_diffs(start, end).values()) / BYTES_PER_GB
+
+    # --- نگاشت پنل‌ها ---
+
+    async def get_panel_map(self) -> Dict[int, Dict[str, Any]]:
+        """{panel_id: {'name', 'type', 'category'}}؛ یک بار خوانده و تا تغییر پنل‌ها در حافظه نگه داشته می‌شود."""
+        if self._panel_map is None:
+            async with self.get_session() as session:
+                rows = (await session.execute(select(Panel.id, Panel.name, Panel.panel_type, Panel.category))).all()
+            self._panel_map = {r.id: {'name': r.name, 'type': r.panel_type, 'category': r.category} for r in rows}
+        return self._panel_map
+
+    def invalidate_panel_map(self):
+        self._panel_map = None
+        self.invalidate_menu_cache()
+
+    async def get_panel_ids_by_name(self) -> Dict[str, int]:
+        return {p['name']: pid for pid, p in (await self.get_panel_map()).items()}
+
+    async def usage_by_type(self, panel_bytes: Dict[int, int]) -> Dict[str, float]:
+        """تجمیع مصرف (بایت) پنل‌ها به تفکیک نوع پنل، به گیگابایت."""
+        panel_map = await self.get_panel_map()
+        result = dict.fromkeys(SNAPSHOT_PANELS, 0.0)
+        for pid, val in panel_bytes.items():
+            p_type = panel_map.get(pid, {}).get('type')
+            if p_type:
+                result[p_type] = result.get(p_type, 0.0) + val / BYTES_PER_GB
+        return result
+
+    @staticmethod
+    def panel_counters(user_data: dict, panel_ids: Dict[str, int]) -> Dict[int, int]:
+        """شمارنده‌های مصرف (بایت) هر پنل از دیتای تجمیع شده یک کاربر؛ panel_ids: {نام پنل: panel_id}"""
+        counters = {}
+        for p_name, p_info in (user_data.get('breakdown') or {}).items():
+            pid = panel_ids.get(p_name)
+            if pid is not None:
+                usage_gb = p_info.get('data', {}).get('current_usage_GB', 0.0) or 0.0
+                counters[pid] = int(round(usage_gb * BYTES_PER_GB))
+        return counters
+
+    # --- اسنپ‌شات‌ها ---
+
+    async def _latest_panel_rows(self, uuid_ids, boundaries) -> list:
+        """
+        آخرین ردیف هر (سرویس، پنل) قبل از هر مرز زمانی، در یک کوئری LATERAL روی کلید اصلی.
+        خروجی: ردیف‌های (uuid_id, idx, panel_id, used_bytes, taken_at) که idx اندیس مرز در boundaries است.
+        """
+        panel_ids = list(await self.get_panel_map())
+        if not uuid_ids or not boundaries or not panel_ids:
+            return []
+
+        def _as_utc(b):
+            if b is None:
+                return datetime.max.replace(tzinfo=timezone.utc)
+            return b.replace(tzinfo=timezone.utc) if b.tzinfo is None else b.astimezone(timezone.utc)
+
+        ids = values(column('uuid_id', Integer), name='ids').data([(i,) for i in uuid_ids])
+        panels = values(column('panel_id', Integer), name='panels').data([(p,) for p in panel_ids])
+        bounds = values(
+            column('idx', Integer), column('boundary', DateTime(timezone=True)), name='bounds'
+        ).data([(i, _as_utc(b)) for i, b in enumerate(boundaries)])
+
+        S = PanelUsageSnapshot
+        last_snap = (
+            select(S.used_bytes, S.taken_at)
+            .where(and_(
+                S.uuid_id == ids.c.uuid_id, S.panel_id == panels.c.panel_id, S.taken_at < bounds.c.boundary
+            ))
+            .order_by(desc(S.taken_at))
+            .limit(1)
+            .lateral('last_snap')
+        )
+        stmt = (
+            select(ids.c.uuid_id, bounds.c.idx, panels.c.panel_id, last_snap)
+            .select_from(ids.join(panels, true()).join(bounds, true()).join(last_snap, true()))
+        )
+
         async with self.get_session() as session:
-            snapshot = UsageSnapshot(
-                uuid_id=uuid_id,
-                hiddify_usage_gb=hiddify_usage,
-                marzban_usage_gb=marzban_usage,
-                remnawave_usage_gb=remnawave_usage,
-                pasarguard_usage_gb=pasarguard_usage,
-                # taken_at به صورت خودکار توسط مدل پر می‌شود (func.now)
+            return (await session.execute(stmt)).all()
+
+    async def get_snapshot_baselines(self, uuid_ids, boundaries) -> Dict[tuple, Dict[int, int]]:
+        """
+        وضعیت شمارنده‌ها (آخرین اسنپ‌شات هر پنل) قبل از هر مرز زمانی، برای مجموعه‌ای از UUIDها.
+        مرز None یعنی آخرین اسنپ‌شات ثبت شده (وضعیت فعلی).
+        خروجی: {(uuid_id, boundary): {panel_id: used_bytes}}؛ ترکیب‌هایی که اسنپ‌شاتی ندارند در خروجی نیستند.
+        """
+        uuid_ids = list(dict.fromkeys(uuid_ids))
+        boundaries = list(dict.fromkeys(boundaries))
+
+        result = {}
+        for r in await self._latest_panel_rows(uuid_ids, boundaries):
+            result.setdefault((r.uuid_id, boundaries[r.idx]), {})[r.panel_id] = r.used_bytes or 0
+        return result
+
+    async def get_latest_usage_by_type(self, uuid_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """آخرین شمارنده هر سرویس به تفکیک نوع پنل (GB) به همراه زمان آخرین اسنپ‌شات ('taken_at')."""
+        uuid_ids = list(dict.fromkeys(uuid_ids))
+        latest, taken = {}, {}
+        for r in await self._latest_panel_rows(uuid_ids, [None]):
+            latest.setdefault(r.uuid_id, {})[r.panel_id] = r.used_bytes or 0
+            taken[r.uuid_id] = max(taken.get(r.uuid_id, r.taken_at), r.taken_at)
+        return {uid: {**(await self.usage_by_type(p)), 'taken_at': taken[uid]} for uid, p in latest.items()}
+
+    async def add_usage_snapshot(self, uuid_id: int, panel_bytes: Dict[int, int]):
+        """ثبت اسنپ‌شات جدید یک سرویس ({panel_id: used_bytes}) در دیتابیس."""
+        if not panel_bytes:
+            return
+        now = datetime.now(timezone.utc)
+        async with self.get_session() as session:
+            await session.execute(pg_insert(PanelUsageSnapshot).values([
+                {'uuid_id': uuid_id, 'panel_id': pid, 'used_bytes': val, 'taken_at': now}
+                for pid, val in panel_bytes.items()
+            ]).on_conflict_do_nothing())
+            await session.commit()
+
+        if self._last_snapshots is not None:
+            for pid, val in panel_bytes.items():
+                self._last_snapshots[(uuid_id, pid)] = (val, now)
+
+    async def record_usage_snapshots(self, counters: Dict[int, Dict[int, int]],
+                                     change_only: bool = True, heartbeat_hours: int = SNAPSHOT_HEARTBEAT_HOURS) -> int:
+        """
+        ثبت گروهی اسنپ‌شات‌ها ({uuid_id: {panel_id: used_bytes}}) در یک INSERT.
+        در حالت change_only، پنلی که شمارنده‌اش با آخرین اسنپ‌شات همان پنل برابر است ثبت نمی‌شود،
+        مگر اینکه از آخرین ردیفش heartbeat_hours گذشته باشد. چون مقدار بین دو ردیف ثابت است،
+        «آخرین اسنپ‌شات قبل از T» همچنان مقدار درست را برمی‌گرداند.
+        خروجی: تعداد ردیف‌های (سرویس، پنل) ثبت شده.
+        """
+        if not counters:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        if change_only and self._last_snapshots is None:
+            # بعد از ری‌استارت: آخرین وضعیت ثبت شده را یک بار از دیتابیس می‌خوانیم
+            rows = await self._latest_panel_rows(list(counters.keys()), [None])
+            self._last_snapshots = {(r.uuid_id, r.panel_id): (r.used_bytes or 0, r.taken_at) for r in rows}
+
+        # حاشیه برای اختلاف زمان اجرای جاب ساعتی
+        heartbeat = timedelta(hours=heartbeat_hours) - timedelta(minutes=30)
+        rows = []
+        for uid, panel_bytes in counters.items():
+            for pid, val in panel_bytes.items():
+                if change_only:
+                    last = self._last_snapshots.get((uid, pid))
+                    if last and last[0] == val and now - last[1] < heartbeat:
+                        continue
+                rows.append({'uuid_id': uid, 'panel_id': pid, 'used_bytes': val, 'taken_at': now})
+                if self._last_snapshots is not None:
+                    self._last_snapshots[(uid, pid)] = (val, now)
+
+        async with self.get_session() as session:
+            for i in range(0, len(rows), 1000):
+                await session.execute(pg_insert(PanelUsageSnapshot).values(rows[i:i + 1000]).on_conflict_do_nothing())
+            await session.commit()
+        return len(rows)
+
+    async def get_start_snapshots(self, uuid_ids: List[int], start: datetime,
+                                  panel_id: Optional[int] = None) -> Dict[int, Dict[int, int]]:
+        """
+        وضعیت شمارنده‌ها ({panel_id: used_bytes}) در لحظه start: آخرین اسنپ‌شات قبل از آن،
+        یا برای سرویس‌های جدید، اولین اسنپ‌شات بعد از آن. با panel_id فقط همان پنل بررسی می‌شود.
+        """
+        if not uuid_ids:
+            return {}
+        snaps = await self.get_snapshot_baselines(uuid_ids, [start])
+        result = {uid: snap for (uid, _), snap in snaps.items()}
+        if panel_id is not None:
+            result = {uid: {panel_id: snap[panel_id]} for uid, snap in result.items() if panel_id in snap}
+
+        missing = [uid for uid in uuid_ids if uid not in result]
+        if missing:
+            S = PanelUsageSnapshot
+            cond = and_(S.uuid_id.in_(missing), S.taken_at >= start)
+            if panel_id is not None:
+                cond = and_(cond, S.panel_id == panel_id)
+            stmt_first = (
+                select(S.uuid_id, S.panel_id, S.used_bytes)
+                .distinct(S.uuid_id, S.panel_id)
+                .where(cond)
+                .order_by(S.uuid_id, S.panel_id, S.taken_at.asc())
             )
-            session.add(snapshot)
+            async with self.get_session() as session:
+                for r in (await session.execute(stmt_first)).all():
+                    result.setdefault(r.uuid_id, {})[r.panel_id] = r.used_bytes or 0
+        return result
+
+    # --- مصرف امروز (Baseline نیمه‌شب) ---
+
+    def _tehran_today(self) -> date:
+        return datetime.now(pytz.timezone("Asia/Tehran")).date()
+
+    async def capture_day_baselines(self, counters: Dict[int, Dict[int, int]], day: date = None) -> int:
+        """
+        ثبت شمارنده‌های لحظه نیمه‌شب ({uuid_id: {panel_id: used_bytes}}) در جدول usage_day_baseline (Upsert گروهی).
+        رکوردهای قدیمی‌تر از دیروز حذف می‌شوند تا جدول کوچک بماند.
+        """
+        day = day or self._tehran_today()
+        rows = [
+            {'uuid_id': uid, 'day': day, 'panel_id': pid, 'used_bytes': val}
+            for uid, panel_bytes in counters.items() for pid, val in panel_bytes.items()
+        ]
+
+        async with self.get_session() as session:
+            for i in range(0, len(rows), 1000):
+                stmt = pg_insert(UsageDayBaseline).values(rows[i:i + 1000])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[UsageDayBaseline.uuid_id, UsageDayBaseline.day, UsageDayBaseline.panel_id],
+                    set_={'used_bytes': stmt.excluded.used_bytes, 'captured_at': func.now()}
+                )
+                await session.execute(stmt)
+            await session.execute(delete(UsageDayBaseline).where(UsageDayBaseline.day < day - timedelta(days=1)))
             await session.commit()
 
-    async def get_usage_since_midnight(self, uuid_id: int) -> dict:
+        self._day_baselines = {'day': day, 'rows': {uid: dict(p) for uid, p in counters.items()}}
+        return len(counters)
+
+    async def get_day_baselines(self, day: date = None) -> Dict[int, Dict[int, int]]:
+        """بیس‌لاین‌های یک روز؛ از حافظه، و فقط در صورت نبود (مثلاً بعد از ری‌استارت) از جدول."""
+        day = day or self._tehran_today()
+        if self._day_baselines['day'] == day:
+            return self._day_baselines['rows']
+
+        B = UsageDayBaseline
+        rows = {}
+        async with self.get_session() as session:
+            res = await session.execute(select(B.uuid_id, B.panel_id, B.used_bytes).where(B.day == day))
+            for r in res.all():
+                rows.setdefault(r.uuid_id, {})[r.panel_id] = r.used_bytes or 0
+
+        # فقط بیس‌لاین کامل را در حافظه نگه می‌داریم؛ روزی که هنوز ثبت نشده دوباره چک می‌شود
+        if rows:
+            self._day_baselines = {'day': day, 'rows': rows}
+        return rows
+
+    async def _snapshot_usage_since_midnight(self, uuid_ids: List[int]) -> Dict[int, Dict[int, int]]:
         """
-        محاسبه مصرف دقیق امروز (از ۰۰:۰۰ بامداد) برای تمام پنل‌ها.
+        مسیر پشتیبان بر اساس جدول اسنپ‌شات‌ها، برای سرویس‌هایی که بیس‌لاین نیمه‌شب یا دیتای کش ندارند.
+        شروع = آخرین اسنپ‌شات قبل از نیمه‌شب، یا اولین اسنپ‌شات امروز برای سرویس‌های جدید.
         """
-        # محاسبه زمان نیمه‌شب به وقت تهران و تبدیل به UTC
-        import pytz
+        if not uuid_ids:
+            return {}
+
         tehran_tz = pytz.timezone("Asia/Tehran")
-        now_tehran = datetime.now(tehran_tz)
-        midnight_tehran = now_tehran.replace(hour=0, minute=0, second=0, microsecond=0)
-        midnight_utc = midnight_tehran.astimezone(timezone.utc)
+        today_midnight = datetime.now(tehran_tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        today_midnight_utc = today_midnight.astimezone(pytz.utc).replace(tzinfo=None)
 
-        async with self.get_session() as session:
-            # ۱. دریافت آخرین اسنپ‌شات قبل از نیمه‌شب (Baseline)
-            stmt_base = select(UsageSnapshot).where(
-                UsageSnapshot.uuid_id == uuid_id,
-                UsageSnapshot.taken_at < midnight_utc
-            ).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            
-            baseline = (await session.execute(stmt_base)).scalar_one_or_none()
+        starts = await self.get_start_snapshots(uuid_ids, today_midnight_utc)
+        currents = await self.get_snapshot_baselines(uuid_ids, [None])
+        return {uid: self._panel_diffs(starts.get(uid), currents.get((uid, None))) for uid in uuid_ids}
 
-            # ۲. دریافت آخرین اسنپ‌شات ثبت شده (Current)
-            stmt_curr = select(UsageSnapshot).where(
-                UsageSnapshot.uuid_id == uuid_id
-            ).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            
-            current = (await session.execute(stmt_curr)).scalar_one_or_none()
-
-            # اگر اسنپ‌شات جدیدی نباشد، مصرف صفر است
-            if not current:
-                return {'total': 0.0, 'hiddify': 0.0, 'marzban': 0.0, 'remnawave': 0.0, 'pasarguard': 0.0}
-
-            # مقادیر شروع (اگر بیس‌لاین نباشد، یعنی کاربر امروز ساخته شده -> شروع از صفر)
-            base_h = baseline.hiddify_usage_gb if baseline else 0.0
-            base_m = baseline.marzban_usage_gb if baseline else 0.0
-            base_r = baseline.remnawave_usage_gb if baseline else 0.0
-            base_p = baseline.pasarguard_usage_gb if baseline else 0.0
-
-            # مقادیر پایان
-            curr_h = current.hiddify_usage_gb
-            curr_m = current.marzban_usage_gb
-            curr_r = current.remnawave_usage_gb
-            curr_p = current.pasarguard_usage_gb
-
-            # محاسبه اختلاف با تابع کمکی
-            usage_h = self._calculate_diff(base_h, curr_h)
-            usage_m = self._calculate_diff(base_m, curr_m)
-            usage_r = self._calculate_diff(base_r, curr_r)
-            usage_p = self._calculate_diff(base_p, curr_p)
-            
-            total = usage_h + usage_m + usage_r + usage_p
+    async def _usage_today_by_id(self, id_to_uuid: Dict[int, str]) -> Dict[int, Dict[str, float]]:
+        """
+        مصرف امروز (GB به تفکیک نوع پنل) = شمارنده فعلی (کش پنل‌ها در حافظه) منهای بیس‌لاین نیمه‌شب.
+        سرویس‌هایی که بیس‌لاین یا دیتای کش ندارند از مسیر اسنپ‌شات محاسبه می‌شوند.
+        """
+        from bot.services import cache_manager
+
+        baselines = await self.get_day_baselines()
+        live = await cache_manager.get_by_uuid() if baselines else {}
+        panel_ids = await self.get_panel_ids_by_name() if live else {}
+
+        usage, missing = {}, []
+        for uid, uuid_str in id_to_uuid.items():
+            base = baselines.get(uid)
+            user_data = live.get(uuid_str.lower())
+            if base is None or user_data is None:
+                missing.append(uid)
+                continue
+            usage[uid] = self._panel_diffs(base, self.panel_counters(user_data, panel_ids))
+
+        if missing:
+            usage.update(await self._snapshot_usage_since_midnight(missing))
+        return {uid: await self.usage_by_type(panel_bytes) for uid, panel_bytes in usage.items()}
 
-            return {
-                'total': round(total, 3),
-                'hiddify': round(usage_h, 3),
-                'marzban': round(usage_m, 3),
-                'remnawave': round(usage_r, 3),
-                'pasarguard': round(usage_p, 3)
-            }
+    async def get_usage_since_midnight(self, uuid_id: int) -> dict:
+        """
+        محاسبه مصرف دقیق امروز (از ۰۰:۰۰ بامداد) برای تمام پنل‌ها.
+        """
+        async with self.get_session() as session:
+            uuid_str = (await session.execute(select(UserUUID.uuid).where(UserUUID.id == uuid_id))).scalar_one_or_none()
+        if not uuid_str:
+            return {'total': 0.0, **dict.fromkeys(SNAPSHOT_PANELS, 0.0)}
+
+        usage = (await self._usage_today_by_id({uuid_id: str(uuid_str)}))[uuid_id]
+        total = sum(usage.values())
+        return {'total': round(total, 3), **{k: round(v, 3) for k, v in usage.items()}}
 
     async def get_usage_since_midnight_by_uuid(self, uuid_str: str) -> Dict[str, float]:
         async with self.get_session() as session:
@@ -119,73 +355,21 @@ class UsageDB:
         return {'hiddify': 0.0, 'marzban': 0.0}
 
     async def get_bulk_usage_since_midnight(self, active_uuid_ids: List[int]) -> Dict[str, Dict[str, float]]:
-        """محاسبه بهینه مصرف روزانه برای لیست کاربران (Optimized for Postgres)."""
+        """محاسبه بهینه مصرف روزانه برای لیست کاربران (بیس‌لاین نیمه‌شب + کش پنل‌ها)."""
         if not active_uuid_ids:
             return {}
 
-        tehran_tz = pytz.timezone("Asia/Tehran")
-        now_tehran = datetime.now(tehran_tz)
-        today_midnight = now_tehran.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_midnight_utc = today_midnight.astimezone(pytz.utc).replace(tzinfo=None)
-
         async with self.get_session() as session:
             # مپینگ ID به UUID String
             stmt_ids = select(UserUUID.id, UserUUID.uuid).where(UserUUID.id.in_(active_uuid_ids))
             res_ids = await session.execute(stmt_ids)
             id_to_uuid_map = {r.id: str(r.uuid) for r in res_ids.all()}
 
-            # 1. Baseline (قبل از نیمه‌شب)
-            stmt_base = (
-                select(UsageSnapshot)
-                .distinct(UsageSnapshot.uuid_id)
-                .where(and_(UsageSnapshot.uuid_id.in_(active_uuid_ids), UsageSnapshot.taken_at < today_midnight_utc))
-                .order_by(UsageSnapshot.uuid_id, desc(UsageSnapshot.taken_at))
-            )
-            res_base = await session.execute(stmt_base)
-            baselines = {r.uuid_id: r for r in res_base.scalars().all()}
-
-            # 2. First Today (اولین بعد از نیمه‌شب - برای کاربران جدید امروز)
-            stmt_first = (
-                select(UsageSnapshot)
-                .distinct(UsageSnapshot.uuid_id)
-                .where(and_(UsageSnapshot.uuid_id.in_(active_uuid_ids), UsageSnapshot.taken_at >= today_midnight_utc))
-                .order_by(UsageSnapshot.uuid_id, UsageSnapshot.taken_at.asc())
-            )
-            res_first = await session.execute(stmt_first)
-            firsts_today = {r.uuid_id: r for r in res_first.scalars().all()}
-
-            # 3. Current (آخرین وضعیت)
-            stmt_curr = (
-                select(UsageSnapshot)
-                .distinct(UsageSnapshot.uuid_id)
-                .where(UsageSnapshot.uuid_id.in_(active_uuid_ids))
-                .order_by(UsageSnapshot.uuid_id, desc(UsageSnapshot.taken_at))
-            )
-            res_curr = await session.execute(stmt_curr)
-            currents = {r.uuid_id: r for r in res_curr.scalars().all()}
-
-        final_usage_map = {}
-        for uid in active_uuid_ids:
-            uuid_str = id_to_uuid_map.get(uid)
-            if not uuid_str: continue
-
-            last_snap = currents.get(uid)
-            if not last_snap:
-                final_usage_map[uuid_str] = {'hiddify': 0.0, 'marzban': 0.0}
-                continue
-
-            start_snap = baselines.get(uid) or firsts_today.get(uid)
-            
-            h_start = start_snap.hiddify_usage_gb if start_snap else 0.0
-            m_start = start_snap.marzban_usage_gb if start_snap else 0.0
-            h_end = last_snap.hiddify_usage_gb or 0.0
-            m_end = last_snap.marzban_usage_gb or 0.0
-
-            final_usage_map[uuid_str] = {
-                'hiddify': round(self._calculate_diff(h_start, h_end), 3),
-                'marzban': round(self._calculate_diff(m_start, m_end), 3)
-            }
-        return final_usage_map
+        usage = await self._usage_today_by_id(id_to_uuid_map)
+        return {
+            id_to_uuid_map[uid]: {p_type: round(val, 3) for p_type, val in u.items()}
+            for uid, u in usage.items()
+        }
 
     async def get_all_daily_usage_since_midnight(self) -> Dict[str, Dict[str, float]]:
         async with self.get_session() as session:
@@ -199,40 +383,32 @@ class UsageDB:
         now_tehran = datetime.now(tehran_tz)
         history = []
 
-        async with self.get_session() as session:
-            for i in range(days - 1, -1, -1):
-                target_date = (now_tehran - timedelta(days=i)).date()
-                day_start_utc = tehran_tz.localize(datetime(target_date.year, target_date.month, target_date.day)).astimezone(pytz.utc).replace(tzinfo=None)
-                day_end_utc = day_start_utc + timedelta(days=1)
+        # مرزهای شروع هر روز + پایان روز آخر؛ پایان هر روز همان شروع روز بعد است
+        dates = [(now_tehran - timedelta(days=i)).date() for i in range(days - 1, -1, -1)]
+        starts = [tehran_tz.localize(datetime(d.year, d.month, d.day)).astimezone(pytz.utc).replace(tzinfo=None) for d in dates]
+        bounds = starts + [starts[-1] + timedelta(days=1)]
 
-                try:
-                    stmt_base = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < day_start_utc)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-                    base = (await session.execute(stmt_base)).scalar_one_or_none()
+        try:
+            snaps = await self.get_snapshot_baselines([uuid_id], bounds)
+        except Exception as e:
+            logger.error(f"Error loading usage history for uuid_id {uuid_id}: {e}")
+            snaps = {}
 
-                    stmt_end = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < day_end_utc)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-                    end_snap = (await session.execute(stmt_end)).scalar_one_or_none()
+        for i, target_date in enumerate(dates):
+            end_snap = snaps.get((uuid_id, bounds[i + 1]))
 
-                    if not end_snap:
-                        history.append({"date": target_date, "hiddify_usage": 0.0, "marzban_usage": 0.0, "total_usage": 0.0})
-                        continue
+            if not end_snap:
+                history.append({"date": target_date, "hiddify_usage": 0.0, "marzban_usage": 0.0, "total_usage": 0.0})
+                continue
+
+            by_type = await self.usage_by_type(self._panel_diffs(snaps.get((uuid_id, bounds[i])), end_snap))
 
-                    h_start = base.hiddify_usage_gb if base else 0.0
-                    m_start = base.marzban_usage_gb if base else 0.0
-                    h_end = end_snap.hiddify_usage_gb or 0.0
-                    m_end = end_snap.marzban_usage_gb or 0.0
-
-                    d_h = self._calculate_diff(h_start, h_end)
-                    d_m = self._calculate_diff(m_start, m_end)
-
-                    history.append({
-                        "date": target_date,
-                        "hiddify_usage": round(max(0.0, d_h), 2),
-                        "marzban_usage": round(max(0.0, d_m), 2),
-                        "total_usage": round(max(0.0, d_h + d_m), 2)
-                    })
-                except Exception as e:
-                    logger.error(f"Error history date {target_date}: {e}")
-                    history.append({"date": target_date, "hiddify_usage": 0.0, "marzban_usage": 0.0, "total_usage": 0.0})
+            history.append({
+                "date": target_date,
+                "hiddify_usage": round(max(0.0, by_type['hiddify']), 2),
+                "marzban_usage": round(max(0.0, by_type['marzban']), 2),
+                "total_usage": round(max(0.0, sum(by_type.values())), 2)
+            })
         return history
 
     async def get_user_daily_usage_history(self, uuid_id: int, days: int = 7) -> List[Dict[str, Any]]:
@@ -241,18 +417,59 @@ class UsageDB:
     async def delete_all_daily_snapshots(self) -> int:
         today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
         async with self.get_session() as session:
-            stmt = delete(UsageSnapshot).where(UsageSnapshot.taken_at >= today_start)
+            stmt = delete(PanelUsageSnapshot).where(PanelUsageSnapshot.taken_at >= today_start)
             res = await session.execute(stmt)
             await session.commit()
-            return res.rowcount
+        # وضعیت «آخرین اسنپ‌شات» در حافظه دیگر معتبر نیست
+        self._last_snapshots = None
+        return res.rowcount
 
     async def delete_old_snapshots(self, days_to_keep: int = 3) -> int:
         time_limit = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
         async with self.get_session() as session:
-            stmt = delete(UsageSnapshot).where(UsageSnapshot.taken_at < time_limit)
+            stmt = delete(PanelUsageSnapshot).where(PanelUsageSnapshot.taken_at < time_limit)
             res = await session.execute(stmt)
             await session.commit()
-            return res.rowcount
+        self._last_snapshots = None
+        return res.rowcount
+
+    async def compact_snapshot_batch(self, uuid_ids: List[int], hourly_cutoff: datetime, daily_cutoff: datetime) -> Dict[str, int]:
+        """
+        فشرده‌سازی اسنپ‌شات‌های یک دسته از سرویس‌ها در یک تراکنش کوتاه:
+        - بین daily_cutoff و hourly_cutoff فقط آخرین اسنپ‌شات هر پنل در هر روز (به وقت تهران) باقی می‌ماند؛
+          بنابراین «آخرین اسنپ‌شات قبل از مرز روز» و جمع تفاضل‌ها همچنان درست است.
+        - قدیمی‌تر از daily_cutoff حذف می‌شود.
+        """
+        if not uuid_ids:
+            return {'compacted': 0, 'dropped': 0}
+
+        S = PanelUsageSnapshot
+        day = func.date(func.timezone('Asia/Tehran', S.taken_at))
+        ranked = (
+            select(
+                S.uuid_id, S.panel_id, S.taken_at,
+                func.row_number().over(
+                    partition_by=(S.uuid_id, S.panel_id, day), order_by=desc(S.taken_at)
+                ).label('rn')
+            )
+            .where(and_(
+                S.uuid_id.in_(uuid_ids),
+                S.taken_at >= daily_cutoff,
+                S.taken_at < hourly_cutoff
+            ))
+            .subquery()
+        )
+        extra = select(ranked.c.uuid_id, ranked.c.panel_id, ranked.c.taken_at).where(ranked.c.rn > 1)
+
+        async with self.get_session() as session:
+            compacted = await session.execute(
+                delete(S).where(tuple_(S.uuid_id, S.panel_id, S.taken_at).in_(extra))
+            )
+            dropped = await session.execute(
+                delete(S).where(and_(S.uuid_id.in_(uuid_ids), S.taken_at < daily_cutoff))
+            )
+            await session.commit()
+        return {'compacted': compacted.rowcount, 'dropped': dropped.rowcount}
 
     def get_week_start_utc(self) -> datetime:
         tehran_tz = pytz.timezone("Asia/Tehran")
@@ -271,52 +488,41 @@ class UsageDB:
             return {'hiddify': 0.0, 'marzban': 0.0}
 
         week_start = self.get_week_start_utc()
-        async with self.get_session() as session:
-            stmt_base = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < week_start)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            base = (await session.execute(stmt_base)).scalar_one_or_none()
-            
-            stmt_end = select(UsageSnapshot).where(UsageSnapshot.uuid_id == uuid_id).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            end_s = (await session.execute(stmt_end)).scalar_one_or_none()
-
-            h_s = base.hiddify_usage_gb if base else 0.0
-            m_s = base.marzban_usage_gb if base else 0.0
-            h_e = end_s.hiddify_usage_gb if end_s else 0.0
-            m_e = end_s.marzban_usage_gb if end_s else 0.0
-
-            return {
-                'hiddify': max(0.0, self._calculate_diff(h_s, h_e)),
-                'marzban': max(0.0, self._calculate_diff(m_s, m_e))
-            }
+        snaps = await self.get_snapshot_baselines([uuid_id], [week_start, None])
+        by_type = await self.usage_by_type(
+            self._panel_diffs(snaps.get((uuid_id, week_start)), snaps.get((uuid_id, None)))
+        )
+        return {p_type: max(0.0, val) for p_type, val in by_type.items()}
 
     async def get_panel_usage_in_intervals(self, uuid_id: int, panel_name: str) -> Dict[int, float]:
-        column = UsageSnapshot.hiddify_usage_gb if panel_name == 'hiddify_usage_gb' else UsageSnapshot.marzban_usage_gb
+        """مصرف یک نوع پنل ('hiddify' یا نام ستون قدیمی 'hiddify_usage_gb') در بازه‌های ۳ تا ۲۴ ساعت اخیر."""
         now = datetime.now(timezone.utc)
         intervals = {3: 0.0, 6: 0.0, 12: 0.0, 24: 0.0}
+        p_type = panel_name.removesuffix('_usage_gb')
+
+        # همه بازه‌ها با FILTER روی تفاضل‌های متوالی در یک کوئری
+        deltas = self._usage_deltas_subquery(now - timedelta(hours=max(intervals)), uuid_id)
+        cols = [
+            func.sum(deltas.c.delta).filter(deltas.c.taken_at >= now - timedelta(hours=hours)).label(f"h{hours}")
+            for hours in intervals.keys()
+        ]
+        stmt = select(*cols).join(Panel, Panel.id == deltas.c.panel_id).where(Panel.panel_type == p_type)
 
         async with self.get_session() as session:
-            for hours in intervals.keys():
-                time_ago = now - timedelta(hours=hours)
-                stmt = select(func.max(column) - func.min(column)).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at >= time_ago))
-                res = await session.execute(stmt)
-                val = res.scalar_one_or_none()
-                if val: intervals[hours] = max(0.0, val)
+            row = (await session.execute(stmt)).one()
+
+        for hours in intervals.keys():
+            val = row._mapping[f"h{hours}"]
+            if val: intervals[hours] = max(0.0, val)
         return intervals
 
     async def get_daily_usage_summary(self) -> List[Dict[str, Any]]:
         days_to_check = 7
         start_date = datetime.now(timezone.utc) - timedelta(days=days_to_check)
-        async with self.get_session() as session:
-            snap_date = cast(UsageSnapshot.taken_at, Date).label('snap_date')
-            subq = (
-                select(
-                    snap_date,
-                    UsageSnapshot.uuid_id,
-                    (func.max(UsageSnapshot.hiddify_usage_gb) - func.min(UsageSnapshot.hiddify_usage_gb)).label('h'),
-                    (func.max(UsageSnapshot.marzban_usage_gb) - func.min(UsageSnapshot.marzban_usage_gb)).label('m')
-                ).where(UsageSnapshot.taken_at >= start_date)
-                .group_by(snap_date, UsageSnapshot.uuid_id).subquery()
-            )
-            stmt = select(subq.c.snap_date, func.sum(subq.c.h + subq.c.m)).group_by(subq.c.snap_date)
+        deltas = self._usage_deltas_subquery(start_date)
+        snap_date = cast(deltas.c.taken_at, Date).label('snap_date')
+        async with self.read_session() as session:
+            stmt = select(snap_date, func.sum(deltas.c.delta)).group_by(snap_date)
             rows = (await session.execute(stmt)).all()
 
         summary_dict = {row[0]: row[1] for row in rows}
@@ -327,7 +533,7 @@ class UsageDB:
         return sorted(final_summary, key=lambda x: x['date'])
 
     async def get_new_users_per_month_stats(self) -> Dict[str, int]:
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             month_col = func.to_char(UserUUID.created_at, 'YYYY-MM')
             stmt = select(month_col, func.count(distinct(UserUUID.user_id))).group_by(month_col).order_by(desc(month_col)).limit(12)
             rows = (await session.execute(stmt)).all()
@@ -335,23 +541,21 @@ class UsageDB:
 
     async def get_daily_active_users_count(self) -> int:
         yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-        async with self.get_session() as session:
-            stmt = select(func.count(distinct(UsageSnapshot.uuid_id))).where(UsageSnapshot.taken_at >= yesterday)
+        deltas = self._usage_deltas_subquery(yesterday)
+        async with self.read_session() as session:
+            stmt = select(func.count(distinct(deltas.c.uuid_id))).where(deltas.c.delta > 0)
             return (await session.execute(stmt)).scalar_one() or 0
 
     async def get_top_consumers_by_usage(self, limit: int = 10) -> List[Dict[str, Any]]:
         thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-        async with self.get_session() as session:
+        deltas = self._usage_deltas_subquery(thirty_days_ago)
+        async with self.read_session() as session:
             subq = (
-                select(
-                    UsageSnapshot.uuid_id,
-                    (func.max(UsageSnapshot.hiddify_usage_gb) - func.min(UsageSnapshot.hiddify_usage_gb)).label('h'),
-                    (func.max(UsageSnapshot.marzban_usage_gb) - func.min(UsageSnapshot.marzban_usage_gb)).label('m')
-                ).where(UsageSnapshot.taken_at >= thirty_days_ago)
-                .group_by(UsageSnapshot.uuid_id).subquery()
+                select(deltas.c.uuid_id, func.sum(deltas.c.delta).label('usage'))
+                .group_by(deltas.c.uuid_id).subquery()
             )
             stmt = (
-                select(User.user_id.label('telegram_id'), UserUUID.name, func.sum(subq.c.h + subq.c.m).label('total_usage'))
+                select(User.user_id.label('telegram_id'), UserUUID.name, func.sum(subq.c.usage).label('total_usage'))
                 .join(UserUUID, subq.c.uuid_id == UserUUID.id)
                 .join(User, UserUUID.user_id == User.user_id)
                 .group_by(User.user_id, UserUUID.name)
@@ -361,69 +565,119 @@ class UsageDB:
             res = await session.execute(stmt)
             return [dict(row._mapping) for row in res.all()]
 
+    async def get_usage_by_category(self, days: int = 1) -> Dict[str, float]:
+        """مصرف کل (GB) هر دسته‌بندی سرور در n روز اخیر."""
+        limit = datetime.now(timezone.utc) - timedelta(days=days)
+        deltas = self._usage_deltas_subquery(limit)
+        stmt = (
+            select(Panel.category, func.sum(deltas.c.delta))
+            .join(Panel, Panel.id == deltas.c.panel_id)
+            .group_by(Panel.category)
+        )
+        async with self.read_session() as session:
+            return {cat: total or 0.0 for cat, total in (await session.execute(stmt)).all()}
+
     async def get_new_users_in_range(self, start_date: datetime, end_date: datetime) -> int:
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             stmt = select(func.count(distinct(UserUUID.user_id))).where(and_(UserUUID.created_at >= start_date, UserUUID.created_at <= end_date))
             return (await session.execute(stmt)).scalar_one() or 0
 
     async def get_activity_heatmap_data(self) -> List[Dict[str, Any]]:
         time_limit = datetime.now(timezone.utc) - timedelta(days=7)
-        async with self.get_session() as session:
-            dow = extract('dow', UsageSnapshot.taken_at).label('day_of_week')
-            hour = extract('hour', UsageSnapshot.taken_at).label('hour_of_day')
-            total = func.sum(UsageSnapshot.hiddify_usage_gb + UsageSnapshot.marzban_usage_gb).label('total_usage')
-            stmt = select(dow, hour, total).where(UsageSnapshot.taken_at >= time_limit).group_by(dow, hour)
+        deltas = self._usage_deltas_subquery(time_limit)
+        async with self.read_session() as session:
+            dow = extract('dow', deltas.c.taken_at).label('day_of_week')
+            hour = extract('hour', deltas.c.taken_at).label('hour_of_day')
+            total = func.sum(deltas.c.delta).label('total_usage')
+            stmt = select(dow, hour, total).group_by(dow, hour)
             res = await session.execute(stmt)
             return [dict(row._mapping) for row in res.all()]
 
     async def get_daily_active_users_by_panel(self, days: int = 30) -> List[Dict[str, Any]]:
         limit = datetime.now(timezone.utc) - timedelta(days=days)
-        async with self.get_session() as session:
-            t_date = cast(UsageSnapshot.taken_at, Date).label('date')
-            h_c = func.count(distinct(case((UsageSnapshot.hiddify_usage_gb > 0, UsageSnapshot.uuid_id), else_=None)))
-            m_c = func.count(distinct(case((UsageSnapshot.marzban_usage_gb > 0, UsageSnapshot.uuid_id), else_=None)))
-            stmt = select(t_date, h_c.label('hiddify_users'), m_c.label('marzban_users')).where(UsageSnapshot.taken_at >= limit).group_by(t_date).order_by(t_date)
+        deltas = self._usage_deltas_subquery(limit)
+        async with self.read_session() as session:
+            t_date = cast(deltas.c.taken_at, Date).label('date')
+            is_type = lambda p_type: and_(Panel.panel_type == p_type, deltas.c.delta > 0)
+            h_c = func.count(distinct(case((is_type('hiddify'), deltas.c.uuid_id), else_=None)))
+            m_c = func.count(distinct(case((is_type('marzban'), deltas.c.uuid_id), else_=None)))
+            stmt = (
+                select(t_date, h_c.label('hiddify_users'), m_c.label('marzban_users'))
+                .join(Panel, Panel.id == deltas.c.panel_id)
+                .group_by(t_date).order_by(t_date)
+            )
             res = await session.execute(stmt)
             return [dict(row._mapping) for row in res.all()]
 
     async def get_total_usage_in_last_n_days(self, days: int) -> float:
         limit = datetime.now(timezone.utc) - timedelta(days=days)
-        async with self.get_session() as session:
-            subq = select(
-                (func.max(UsageSnapshot.hiddify_usage_gb) - func.min(UsageSnapshot.hiddify_usage_gb)).label('h'),
-                (func.max(UsageSnapshot.marzban_usage_gb) - func.min(UsageSnapshot.marzban_usage_gb)).label('m')
-            ).where(UsageSnapshot.taken_at >= limit).group_by(UsageSnapshot.uuid_id).subquery()
-            stmt = select(func.sum(subq.c.h + subq.c.m))
+        deltas = self._usage_deltas_subquery(limit)
+        async with self.read_session() as session:
+            stmt = select(func.sum(deltas.c.delta))
             return (await session.execute(stmt)).scalar_one() or 0.0
 
+    def _usage_deltas_subquery(self, since: datetime, uuid_id: Optional[int] = None):
+        """
+        مصرف (GB) هر پنل بین هر دو اسنپ‌شات متوالی (با LAG) به همراه ساعت محلی تهران.
+        ستون‌ها: uuid_id, panel_id, taken_at, hour, delta
+
+        - با uuid_id: اسنپ‌شات قبل از since (برای هر پنل) به عنوان مقدار اولیه LAG استفاده می‌شود و
+          اگر وجود نداشته باشد شروع از صفر است.
+        - بدون uuid_id (همه سرویس‌ها): ردیف‌های بازه SNAPSHOT_LOOKBACK قبل از since مقدار اولیه هستند
+          (Heartbeat تضمین می‌کند حداقل یک ردیف در این بازه باشد) و اولین ردیف هر پنل مصرفی ندارد.
+        چون فقط تفاضل ردیف‌های متوالی جمع می‌شود، نبود ردیف در ساعات بدون تغییر نتیجه را عوض نمی‌کند.
+        جمع delta روی همه پنل‌ها، مصرف کل است؛ برای تفکیک نوع/دسته‌بندی، panel_id را به panels وصل کنید.
+        """
+        S = PanelUsageSnapshot
+        prev = func.lag(S.used_bytes).over(partition_by=(S.uuid_id, S.panel_id), order_by=S.taken_at)
+
+        if uuid_id is not None:
+            S_prev = aliased(PanelUsageSnapshot)
+            baseline_at = (
+                select(func.max(S_prev.taken_at))
+                .where(and_(S_prev.uuid_id == uuid_id, S_prev.panel_id == S.panel_id, S_prev.taken_at < since))
+                .scalar_subquery()
+            )
+            cond = and_(S.uuid_id == uuid_id, S.taken_at >= func.coalesce(baseline_at, since))
+            prev = func.coalesce(prev, 0)
+        else:
+            cond = S.taken_at >= since - SNAPSHOT_LOOKBACK
+
+        windowed = (
+            select(S.uuid_id, S.panel_id, S.taken_at, S.used_bytes.label('u'), prev.label('prev'))
+            .where(cond)
+            .subquery()
+        )
+        # منطق ریست شدن پنل همانند _calculate_diff
+        w = windowed.c
+        d_bytes = case((w.prev.is_(None), 0), (w.u >= w.prev, w.u - w.prev), else_=w.u)
+        hour = func.date_part('hour', func.timezone('Asia/Tehran', w.taken_at))
+        return (
+            select(
+                w.uuid_id, w.panel_id, w.taken_at, hour.label('hour'),
+                (cast(d_bytes, Float) / float(BYTES_PER_GB)).label('delta')
+            )
+            .where(w.taken_at >= since)
+            .subquery()
+        )
+
     async def get_night_usage_stats_in_last_n_days(self, uuid_id: int, days: int) -> dict:
         limit = datetime.now(timezone.utc) - timedelta(days=days)
-        tehran_tz = pytz.timezone("Asia/Tehran")
+        deltas = self._usage_deltas_subquery(limit, uuid_id)
+        stmt = select(
+            func.coalesce(func.sum(deltas.c.delta), 0.0).label('total'),
+            func.coalesce(func.sum(deltas.c.delta).filter(deltas.c.hour < 6), 0.0).label('night')
+        )
         async with self.get_session() as session:
-            stmt = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at >= limit)).order_by(UsageSnapshot.taken_at)
-            snaps = (await session.execute(stmt)).scalars().all()
-            
-            stmt_prev = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < limit)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            prev = (await session.execute(stmt_prev)).scalar_one_or_none()
-            
-            last_h = prev.hiddify_usage_gb if prev else 0.0
-            last_m = prev.marzban_usage_gb if prev else 0.0
-            total, night = 0.0, 0.0
-
-            for s in snaps:
-                diff = self._calculate_diff(last_h, s.hiddify_usage_gb or 0) + self._calculate_diff(last_m, s.marzban_usage_gb or 0)
-                total += diff
-                loc_time = pytz.utc.localize(s.taken_at).astimezone(tehran_tz) if s.taken_at.tzinfo is None else s.taken_at.astimezone(tehran_tz)
-                if 0 <= loc_time.hour < 6: night += diff
-                last_h, last_m = s.hiddify_usage_gb or 0, s.marzban_usage_gb or 0
-            return {'total': total, 'night': night}
+            row = (await session.execute(stmt)).one()
+        return {'total': row.total, 'night': row.night}
 
     async def get_weekly_top_consumers_report(self) -> Dict[str, Any]:
         """گزارش هفتگی پرمصرف‌ترین‌ها."""
         tehran_tz = pytz.timezone("Asia/Tehran")
-        async with self.get_session() as session:
+        async with self.read_session() as session:
             # 1. آخرین تاریخ اسنپ‌شات
-            last_date_res = await session.execute(select(func.max(UsageSnapshot.taken_at)))
+            last_date_res = await session.execute(select(func.max(PanelUsageSnapshot.taken_at)))
             last_taken = last_date_res.scalar_one_or_none()
             if not last_taken: return {'top_10_overall': [], 'top_daily': {}}
             
@@ -433,50 +687,41 @@ class UsageDB:
             active_uuids = (await session.execute(select(UserUUID).where(UserUUID.is_active == True))).scalars().all()
             uuid_ids = [u.id for u in active_uuids]
             
-            if not uuid_ids: return {'top_10_overall': [], 'top_daily': {}}
-
-            weekly_data = {}
-            daily_winners = []
-
-            # 3. محاسبه ۷ روزه
-            for i in range(7):
-                t_date = report_base_date - timedelta(days=i)
-                d_start = tehran_tz.localize(datetime(t_date.year, t_date.month, t_date.day)).astimezone(pytz.utc).replace(tzinfo=None)
-                d_end = d_start + timedelta(days=1)
-
-                # Bulk Fetch برای این روز
-                base_q = select(UsageSnapshot).distinct(UsageSnapshot.uuid_id).where(and_(UsageSnapshot.uuid_id.in_(uuid_ids), UsageSnapshot.taken_at < d_start)).order_by(UsageSnapshot.uuid_id, desc(UsageSnapshot.taken_at))
-                base_map = {r.uuid_id: r for r in (await session.execute(base_q)).scalars().all()}
-                
-                end_q = select(UsageSnapshot).distinct(UsageSnapshot.uuid_id).where(and_(UsageSnapshot.uuid_id.in_(uuid_ids), UsageSnapshot.taken_at < d_end)).order_by(UsageSnapshot.uuid_id, desc(UsageSnapshot.taken_at))
-                end_map = {r.uuid_id: r for r in (await session.execute(end_q)).scalars().all()}
-
-                top_day = {'name': None, 'usage': 0.0}
-
-                for u in active_uuids:
-                    b, e = base_map.get(u.id), end_map.get(u.id)
-                    if not e: continue
-                    
-                    h_s, m_s = (b.hiddify_usage_gb, b.marzban_usage_gb) if b else (0.0, 0.0)
-                    h_e, m_e = (e.hiddify_usage_gb or 0.0, e.marzban_usage_gb or 0.0)
-                    
-                    usage = self._calculate_diff(h_s, h_e) + self._calculate_diff(m_s, m_e)
-                    
-                    if usage > 0.001:
-                        k = u.user_id
-                        if k not in weekly_data: weekly_data[k] = {'name': u.name or f"User {u.user_id}", 'total_usage': 0.0}
-                        weekly_data[k]['total_usage'] += usage
-                        
-                        if usage > top_day['usage']:
-                            top_day = {'name': u.name or f"User {u.user_id}", 'usage': usage}
-                
-                if top_day['name']:
-                    daily_winners.append({'date': t_date, 'name': top_day['name'], 'usage': top_day['usage']})
-
-            sorted_users = sorted(weekly_data.values(), key=lambda x: x['total_usage'], reverse=True)[:20]
-            daily_dict = {(w['date'].weekday() + 2) % 7: w for w in daily_winners}
-            
-            return {'top_20_overall': sorted_users, 'top_daily': daily_dict}
+        if not uuid_ids: return {'top_10_overall': [], 'top_daily': {}}
+
+        weekly_data = {}
+        daily_winners = []
+
+        # 3. محاسبه ۷ روزه: همه مرزهای روزانه در یک کوئری LATERAL
+        t_dates = [report_base_date - timedelta(days=i) for i in range(7)]
+        d_starts = [tehran_tz.localize(datetime(d.year, d.month, d.day)).astimezone(pytz.utc).replace(tzinfo=None) for d in t_dates]
+        d_ends = [d + timedelta(days=1) for d in d_starts]
+        snaps = await self.get_snapshot_baselines(uuid_ids, d_starts + d_ends)
+
+        for t_date, d_start, d_end in zip(t_dates, d_starts, d_ends):
+            top_day = {'name': None, 'usage': 0.0}
+
+            for u in active_uuids:
+                e = snaps.get((u.id, d_end))
+                if not e: continue
+
+                usage = self._snapshot_diff(snaps.get((u.id, d_start)), e)
+
+                if usage > 0.001:
+                    k = u.user_id
+                    if k not in weekly_data: weekly_data[k] = {'name': u.name or f"User {u.user_id}", 'total_usage': 0.0}
+                    weekly_data[k]['total_usage'] += usage
+
+                    if usage > top_day['usage']:
+                        top_day = {'name': u.name or f"User {u.user_id}", 'usage': usage}
+
+            if top_day['name']:
+                daily_winners.append({'date': t_date, 'name': top_day['name'], 'usage': top_day['usage']})
+
+        sorted_users = sorted(weekly_data.values(), key=lambda x: x['total_usage'], reverse=True)[:20]
+        daily_dict = {(w['date'].weekday() + 2) % 7: w for w in daily_winners}
+
+        return {'top_20_overall': sorted_users, 'top_daily': daily_dict}
 
     async def get_previous_week_usage(self, uuid_id: int) -> float:
         tehran_tz = pytz.timezone("Asia/Tehran")
@@ -485,52 +730,30 @@ class UsageDB:
         curr_week_start = (datetime.now(tehran_tz) - timedelta(days=now_jalali.weekday())).replace(hour=0, minute=0, second=0, microsecond=0).astimezone(pytz.utc).replace(tzinfo=None)
         prev_week_start = curr_week_start - timedelta(days=7)
         
-        async with self.get_session() as session:
-            # Baseline شروع هفته قبل
-            q_start = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < prev_week_start)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            b = (await session.execute(q_start)).scalar_one_or_none()
-            
-            # End پایان هفته قبل (یا شروع هفته جاری)
-            q_end = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < curr_week_start)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            e = (await session.execute(q_end)).scalar_one_or_none()
-            
-            if not e: return 0.0
-            
-            h_s, m_s = (b.hiddify_usage_gb, b.marzban_usage_gb) if b else (0.0, 0.0)
-            return self._calculate_diff(h_s, e.hiddify_usage_gb or 0) + self._calculate_diff(m_s, e.marzban_usage_gb or 0)
+        # Baseline شروع هفته قبل و End پایان هفته قبل (یا شروع هفته جاری)
+        snaps = await self.get_snapshot_baselines([uuid_id], [prev_week_start, curr_week_start])
+        return self._snapshot_diff(snaps.get((uuid_id, prev_week_start)), snaps.get((uuid_id, curr_week_start)))
 
     async def get_user_weekly_total_usage(self, user_id: int) -> float:
         week_start = self.get_week_start_utc()
         async with self.get_session() as session:
             # گرفتن همه UUIDهای کاربر
             uuids = (await session.execute(select(UserUUID.id).where(UserUUID.user_id == user_id))).scalars().all()
-            if not uuids: return 0.0
-            
-            total = 0.0
-            for uid in uuids:
-                q_b = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uid, UsageSnapshot.taken_at < week_start)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-                b = (await session.execute(q_b)).scalar_one_or_none()
-                
-                q_e = select(UsageSnapshot).where(UsageSnapshot.uuid_id == uid).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-                e = (await session.execute(q_e)).scalar_one_or_none()
-                
-                if e:
-                    h_s, m_s = (b.hiddify_usage_gb, b.marzban_usage_gb) if b else (0.0, 0.0)
-                    total += self._calculate_diff(h_s, e.hiddify_usage_gb or 0) + self._calculate_diff(m_s, e.marzban_usage_gb or 0)
-            return total
+        if not uuids: return 0.0
+
+        snaps = await self.get_snapshot_baselines(uuids, [week_start, None])
+        return sum(self._snapshot_diff(snaps.get((uid, week_start)), snaps.get((uid, None))) for uid in uuids)
 
     async def get_all_users_weekly_usage(self) -> list[float]:
         """لیست مصرف هفتگی تمام کاربران (برای نمودارهای توزیع)."""
-        # برای سادگی و پرفورمنس، از get_total_usage_in_last_n_days استفاده می‌کنیم که مشابه است
         week_start = self.get_week_start_utc()
-        async with self.get_session() as session:
-            subq = select(
-                UsageSnapshot.uuid_id,
-                (func.max(UsageSnapshot.hiddify_usage_gb) - func.min(UsageSnapshot.hiddify_usage_gb)).label('h'),
-                (func.max(UsageSnapshot.marzban_usage_gb) - func.min(UsageSnapshot.marzban_usage_gb)).label('m')
-            ).where(UsageSnapshot.taken_at >= week_start).group_by(UsageSnapshot.uuid_id).subquery()
-            
-            stmt = select(func.sum(subq.c.h + subq.c.m)).join(UserUUID, subq.c.uuid_id == UserUUID.id).group_by(UserUUID.user_id)
+        deltas = self._usage_deltas_subquery(week_start)
+        async with self.read_session() as session:
+            stmt = (
+                select(func.sum(deltas.c.delta))
+                .join(UserUUID, deltas.c.uuid_id == UserUUID.id)
+                .group_by(UserUUID.user_id)
+            )
             res = await session.execute(stmt)
             return [r for r in res.scalars().all()]
 
@@ -541,30 +764,16 @@ class UsageDB:
         return await self._get_usage_by_time_of_day(uuid_id, days=30)
 
     async def _get_usage_by_time_of_day(self, uuid_id: int, days: int) -> Dict[str, float]:
-        """متد کمکی داخلی برای محاسبه مصرف بر اساس زمان روز."""
+        """متد کمکی داخلی برای محاسبه مصرف بر اساس زمان روز (تجمیع کامل در Postgres)."""
         limit = datetime.now(timezone.utc) - timedelta(days=days)
-        tehran_tz = pytz.timezone("Asia/Tehran")
-        slots = {'morning': (6, 12), 'afternoon': (12, 18), 'evening': (18, 24), 'night': (0, 6)}
-        stats = {k: 0.0 for k in slots}
+        deltas = self._usage_deltas_subquery(limit, uuid_id)
+        slot = func.floor(deltas.c.hour / 6).label('slot')
+        stmt = select(slot, func.sum(deltas.c.delta)).group_by(slot)
 
+        stats = {k: 0.0 for k in TIME_OF_DAY_SLOTS}
         async with self.get_session() as session:
-            snaps = (await session.execute(select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at >= limit)).order_by(UsageSnapshot.taken_at))).scalars().all()
-            
-            prev_q = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < limit)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            prev = (await session.execute(prev_q)).scalar_one_or_none()
-            
-            l_h, l_m = (prev.hiddify_usage_gb, prev.marzban_usage_gb) if prev else (0.0, 0.0)
-
-            for s in snaps:
-                diff = self._calculate_diff(l_h, s.hiddify_usage_gb or 0) + self._calculate_diff(l_m, s.marzban_usage_gb or 0)
-                if diff > 0:
-                    t = pytz.utc.localize(s.taken_at).astimezone(tehran_tz) if s.taken_at.tzinfo is None else s.taken_at.astimezone(tehran_tz)
-                    h = t.hour
-                    for k, v in slots.items():
-                        if v[0] <= h < v[1]:
-                            stats[k] += diff
-                            break
-                l_h, l_m = s.hiddify_usage_gb or 0, s.marzban_usage_gb or 0
+            for idx, total in (await session.execute(stmt)).all():
+                stats[TIME_OF_DAY_SLOTS[int(idx)]] = total or 0.0
         return stats
 
     async def get_user_total_usage_in_last_n_days(self, uuid_id: int, days: int) -> float:
@@ -593,16 +802,8 @@ class UsageDB:
         last_month_start_shamsi = last_month_date.replace(day=1, hour=0, minute=0, second=0)
         start_utc = last_month_start_shamsi.togregorian().astimezone(pytz.utc).replace(tzinfo=None)
         
-        async with self.get_session() as session:
-            q_b = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < start_utc)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            b = (await session.execute(q_b)).scalar_one_or_none()
-            
-            q_e = select(UsageSnapshot).where(and_(UsageSnapshot.uuid_id == uuid_id, UsageSnapshot.taken_at < this_month_start)).order_by(desc(UsageSnapshot.taken_at)).limit(1)
-            e = (await session.execute(q_e)).scalar_one_or_none()
-            
-            if not e: return 0.0
-            h_s, m_s = (b.hiddify_usage_gb, b.marzban_usage_gb) if b else (0.0, 0.0)
-            return self._calculate_diff(h_s, e.hiddify_usage_gb or 0) + self._calculate_diff(m_s, e.marzban_usage_gb or 0)
+        snaps = await self.get_snapshot_baselines([uuid_id], [start_utc, this_month_start])
+        return self._snapshot_diff(snaps.get((uuid_id, start_utc)), snaps.get((uuid_id, this_month_start)))
 
     async def count_recently_active_users(self, all_users_data: list, minutes: int = 15) -> dict:
         """شمارش کاربران آنلاین بر اساس دیتای زنده پنل."""
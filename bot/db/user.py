@@ -2,12 +2,14 @@
 
 import logging
 import secrets
+import uuid as uuid_lib
 from datetime import datetime, date, timedelta, timezone
 from typing import Any, Dict, List, Optional
 import pytz
 
-from sqlalchemy import select, update, delete, func, and_, or_, case, desc
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (
+    select, update, delete, func, and_, or_, case, desc, event, values, column, Integer, Float, DateTime
+)
 from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
@@ -15,8 +17,9 @@ from sqlalchemy.exc import IntegrityError
 # وارد کردن مدل‌ها
 from .base import (
     User, UserUUID, ClientUserAgent, LoginToken, MarzbanMapping, 
-    UsageSnapshot, Panel, DatabaseManager
+    Panel, DatabaseManager
 )
+from .loaders import loader
 
 # تلاش برای ایمپورت تابع کمکی
 try:
@@ -37,8 +40,9 @@ class UserDB:
         """
         اطلاعات کامل یک کاربر را با استفاده از کش واکشی می‌کند.
         """
-        if user_id in self._user_cache:
-            return self._user_cache[user_id]
+        cached = self._user_cache.get(user_id)
+        if cached is not None:
+            return cached
         
         async with self.get_session() as session:
             user = await session.get(User, user_id)
@@ -48,10 +52,21 @@ class UserDB:
                 # اطمینان از اینکه settings یک دیکشنری است
                 if user_data.get('settings') is None:
                     user_data['settings'] = {}
-                self._user_cache[user_id] = user_data
+                self._user_cache.set(user_id, user_data)
                 return user_data
             return None
 
+    def clear_user_cache(self, user_id: Optional[int] = None):
+        """باطل کردن کش یک کاربر (یا بدون user_id کل کش)؛ بعد از هر تغییر در رکورد کاربر صدا زده می‌شود."""
+        self._user_cache.invalidate(user_id)
+
+    def clear_user_cache_on_commit(self, session, user_id: Optional[int] = None):
+        """برای تغییراتی که در سشن فراخواننده انجام می‌شوند: کش بعد از commit همان سشن باطل می‌شود."""
+        event.listen(session.sync_session, 'after_commit', lambda _s: self.clear_user_cache(user_id), once=True)
+
+    def get_user_cache_stats(self) -> dict:
+        return self._user_cache.stats()
+
     async def add_or_update_user(self, user_id: int, username: str = None, 
                                  first: str = None, last: str = None) -> bool:
         async with self.get_session() as session:
@@ -61,6 +76,8 @@ class UserDB:
                 if username is not None: user.username = username
                 if first is not None: user.first_name = first
                 if last is not None: user.last_name = last
+                # کاربری که دوباره با ربات تعامل کرده، بلاک را برداشته است
+                user.bot_blocked_at = None
             else:
                 new_user = User(
                     user_id=user_id, 
@@ -71,60 +88,79 @@ class UserDB:
                 session.add(new_user)
             
             await session.commit()
-            if hasattr(self, 'clear_user_cache'):
-                self.clear_user_cache(user_id)
+            self.clear_user_cache(user_id)
             return True
 
     # --- تنظیمات داینامیک (Dynamic Settings) ---
 
+    # پیش‌فرض تنظیماتی که به دسته‌بندی سرورها وابسته نیستند
+    DEFAULT_USER_SETTINGS = {
+        'daily_reports': True, 'weekly_reports': True, 'monthly_reports': True,
+        'expiry_warnings': True, 'show_info_config': True, 'auto_delete_reports': False,
+    }
+
+    @classmethod
+    def _build_user_settings(cls, all_cats: List[str], saved: Optional[dict], access_lists) -> Dict[str, bool]:
+        """
+        ✅ هوشمند: فقط کلید هشدار کشورهایی را اضافه می‌کند که کاربر حداقل در یک اکانت فعالش به آن‌ها دسترسی دارد.
+        اگر کاربر هیچ دسترسی ثبت شده‌ای ندارد (کاربر جدید)، همه کشورها نمایش داده می‌شوند.
+        """
+        # اجتماع دسترسی‌های همه اکانت‌های فعال کاربر
+        user_allowed_cats = set()
+        for cats in access_lists or []:
+            if cats:
+                user_allowed_cats.update(cats)
+
+        defaults = dict(cls.DEFAULT_USER_SETTINGS)
+        for code in all_cats:
+            if not user_allowed_cats or code in user_allowed_cats:
+                defaults[f'data_warning_{code}'] = True
+
+        # ترکیب تنظیمات ذخیره شده با پیش‌فرض‌های هوشمند
+        return {**defaults, **(saved or {})}
+
+    def _user_settings_query(self, user_ids: List[int]):
+        """تنظیمات ذخیره شده و دسترسی اکانت‌های فعال کاربران در یک کوئری."""
+        access = func.jsonb_agg(UserUUID.allowed_categories).filter(UserUUID.is_active == True)
+        return (
+            select(User.user_id, User.settings, access.label('access'))
+            .outerjoin(UserUUID, UserUUID.user_id == User.user_id)
+            .where(User.user_id.in_(user_ids))
+            .group_by(User.user_id)
+        )
+
     async def get_user_settings(self, user_id: int) -> Dict[str, bool]:
         """
-        تنظیمات کاربر را می‌خواند.
-        ✅ هوشمند: فقط دکمه‌های کشورهایی را اضافه می‌کند که کاربر حداقل در یک اکانتش به آن‌ها دسترسی داشته باشد.
+        تنظیمات کاربر را می‌خواند: ستون settings از کش کاربر (self.user) و لیست دسته‌بندی‌ها از کش؛
+        فقط دسترسی اکانت‌های فعال با یک کوئری سبک خوانده می‌شود.
         """
         user_data = await self.user(user_id)
-        
-        defaults = {
-            'daily_reports': True, 'weekly_reports': True, 'monthly_reports': True,
-            'expiry_warnings': True, 'show_info_config': True, 'auto_delete_reports': False,
-        }
+        all_cats = await self.get_category_codes()
+        async with self.get_session() as session:
+            access = await session.scalar(
+                select(func.jsonb_agg(UserUUID.allowed_categories))
+                .where(UserUUID.user_id == user_id, UserUUID.is_active == True)
+            )
+        return self._build_user_settings(all_cats, user_data['settings'] if user_data else None, access)
 
+    async def get_settings_for_users(self, user_ids: List[int]) -> Dict[int, Dict[str, bool]]:
+        """نسخه گروهی get_user_settings برای جاب‌های زمان‌بندی شده: {user_id: settings}"""
+        user_ids = list(dict.fromkeys(user_ids))
+        all_cats = await self.get_category_codes()
+
+        rows = {}
         async with self.get_session() as session:
-            # 1. دریافت تمام دسته‌بندی‌های موجود در سیستم
-            from .base import ServerCategory 
-            all_cats_stmt = select(ServerCategory.code)
-            all_cats_result = await session.execute(all_cats_stmt)
-            all_cats = [c for c in all_cats_result.scalars()]
+            for i in range(0, len(user_ids), 5000):
+                res = await session.execute(self._user_settings_query(user_ids[i:i + 5000]))
+                rows.update({r.user_id: r for r in res.all()})
 
-            # 2. دریافت دسترسی‌های واقعی کاربر از جدول UserUUID
-            # (اگر کاربر چند اکانت داشت، اجتماع دسترسی‌ها را می‌گیریم)
-            user_access_stmt = select(UserUUID.allowed_categories).where(
-                and_(UserUUID.user_id == user_id, UserUUID.is_active == True)
+        result = {}
+        for uid in user_ids:
+            row = rows.get(uid)
+            result[uid] = self._build_user_settings(
+                all_cats, row.settings if row else None, row.access if row else None
             )
-            access_result = await session.execute(user_access_stmt)
-            
-            user_allowed_cats = set()
-            for row in access_result.scalars():
-                if row: # اگر لیست پر بود
-                    user_allowed_cats.update(row)
-            
-            # اگر کاربر هیچ سرویسی ندارد یا لیست خالی است، شاید بخواهید همه را نشان دهید یا هیچکدام
-            # اینجا فرض می‌کنیم اگر خالی بود، پیش‌فرض همه را نشان بده (برای کاربران جدید)
-            # اما اگر سرویس دارد، فقط همان‌ها را نشان بده.
-            final_cats_to_show = user_allowed_cats if user_allowed_cats else all_cats
-
-            # اضافه کردن کلیدهای تنظیمات فقط برای کشورهای مجاز
-            for code in all_cats:
-                if code in final_cats_to_show or not user_allowed_cats:
-                    defaults[f'data_warning_{code}'] = True
-        
-        if not user_data:
-            return defaults
-            
-        saved_settings = user_data.get('settings', {}) or {}
-        
-        # ترکیب تنظیمات ذخیره شده با پیش‌فرض‌های هوشمند
-        return {**defaults, **saved_settings}
+        return result
 
     async def update_user_setting(self, user_id: int, setting: str, value: bool) -> None:
         """
@@ -144,8 +180,7 @@ class UserDB:
                 flag_modified(user, "settings")
                 await session.commit()
                 
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
 
     # --- سایر متدهای کاربر ---
 
@@ -155,8 +190,7 @@ class UserDB:
             await session.execute(update(User).where(User.user_id == user_id).values(birthday=birthday_date))
             await session.commit()
         
-        if user_id in self._user_cache:
-            self._user_cache[user_id]['birthday'] = birthday_date
+        self.clear_user_cache(user_id)
 
     async def get_users_with_birthdays(self):
         """تمام کاربرانی که تاریخ تولد ثبت کرده‌اند را برمی‌گرداند."""
@@ -174,31 +208,26 @@ class UserDB:
         async with self.get_session() as session:
             await session.execute(update(User).where(User.user_id == user_id).values(birthday=None))
             await session.commit()
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
 
     async def set_user_language(self, user_id: int, lang_code: str):
         """زبان انتخابی کاربر را ذخیره می‌کند."""
         async with self.get_session() as session:
             await session.execute(update(User).where(User.user_id == user_id).values(lang_code=lang_code))
             await session.commit()
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
 
     async def get_user_language(self, user_id: int) -> str:
-        """زبان کاربر را از دیتابیس می‌خواند."""
-        async with self.get_session() as session:
-            result = await session.execute(select(User.lang_code).where(User.user_id == user_id))
-            lang = result.scalar_one_or_none()
-            return lang if lang else 'fa'
+        """زبان کاربر را (از کش کاربر) برمی‌گرداند."""
+        user_data = await self.user(user_id)
+        return (user_data or {}).get('lang_code') or 'fa'
 
     async def update_user_note(self, user_id: int, note: Optional[str]) -> None:
         """یادداشت ادمین برای یک کاربر را به‌روزرسانی می‌کند."""
         async with self.get_session() as session:
             await session.execute(update(User).where(User.user_id == user_id).values(admin_note=note))
             await session.commit()
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
 
     async def get_all_bot_users(self) -> List[Dict[str, Any]]:
         """لیست تمام کاربران ربات را برمی‌گرداند."""
@@ -212,11 +241,15 @@ class UserDB:
         return await self.user(user_id)
 
     async def get_all_user_ids(self):
-        """تمام شناسه‌های کاربری تلگرام را برمی‌گرداند."""
-        async with self.get_session() as session:
-            result = await session.execute(select(User.user_id))
-            for row in result.scalars().all():
-                yield row
+        """تمام شناسه‌های کاربری تلگرام را به صورت جریانی برمی‌گرداند."""
+        async for batch in self.iter_user_id_batches():
+            for user_id in batch:
+                yield user_id
+
+    async def iter_user_id_batches(self, batch_size: Optional[int] = None):
+        """شناسه‌های کاربران به ترتیب user_id، دسته به دسته با کوئری‌های keyset."""
+        async for batch in self.keyset_scalars(select(User.user_id), User.user_id, batch_size):
+            yield batch
 
     async def purge_user_by_telegram_id(self, user_id: int) -> bool:
         """یک کاربر را به طور کامل از جدول users و تمام جداول وابسته حذف می‌کند."""
@@ -225,8 +258,7 @@ class UserDB:
             result = await session.execute(stmt)
             await session.commit()
             
-            if hasattr(self, 'clear_user_cache'):
-                self.clear_user_cache(user_id)
+            self.clear_user_cache(user_id)
                 
             return result.rowcount > 0
 
@@ -424,6 +456,28 @@ class UserDB:
                 return {c.name: getattr(row, c.name) for c in row.__table__.columns}
             return None
             
+    async def get_uuid_records_map(self, uuid_strs: List[str]) -> Dict[str, UserUUID]:
+        """
+        رکورد UUIDها به همراه مالک و پنل‌های مجاز (پروفایل uuid_full) برای یک دسته، با یک کوئری.
+        اگر یک UUID چند رکورد داشته باشد، رکورد فعال برگردانده می‌شود.
+        کلید خروجی رشته UUID با حروف کوچک است (ستون uuid از نوع uuid.UUID است)؛ UUIDهای نامعتبر نادیده گرفته می‌شوند.
+        """
+        uuids = set()
+        for u in uuid_strs:
+            try:
+                uuids.add(uuid_lib.UUID(str(u)))
+            except (ValueError, TypeError):
+                continue
+        if not uuids:
+            return {}
+        async with self.get_session() as session:
+            stmt = (
+                select(UserUUID).where(UserUUID.uuid.in_(uuids))
+                .options(*loader('uuid_full'))
+                .order_by(UserUUID.is_active)
+            )
+            return {str(row.uuid).lower(): row for row in (await session.execute(stmt)).scalars().unique().all()}
+
     async def get_all_user_uuids(self) -> List[Dict[str, Any]]:
         """تمام رکوردهای UUID برای پنل ادمین."""
         async with self.get_session() as session:
@@ -454,7 +508,7 @@ class UserDB:
         حالا که ستون‌های دسترسی حذف شده‌اند، باید لیست دسترسی‌ها را از رابطه بخوانیم.
         """
         async with self.get_session() as session:
-            # از selectinload برای لود کردن پنل‌های مجاز استفاده می‌کنیم
+            # پنل‌های مجاز با پروفایل uuid_panels لود می‌شوند
             stmt = (
                 select(
                     User.user_id, User.first_name, User.username,
@@ -464,7 +518,7 @@ class UserDB:
                 )
                 .join(UserUUID, User.user_id == UserUUID.user_id)
                 .outerjoin(MarzbanMapping, UserUUID.uuid == MarzbanMapping.hiddify_uuid)
-                .options(selectinload(UserUUID.allowed_panels)) # لود پنل‌ها
+                .options(*loader('uuid_panels')) # لود پنل‌ها
                 .where(UserUUID.is_active == True)
                 .order_by(User.user_id, UserUUID.created_at)
             )
@@ -522,7 +576,7 @@ class UserDB:
                 await session.commit()
 
             # پاکسازی کش
-            if uid_to_clear and hasattr(self, 'clear_user_cache'):
+            if uid_to_clear:
                 self.clear_user_cache(uid_to_clear)
                 
             return True
@@ -678,8 +732,7 @@ class UserDB:
             )
             await session.commit()
             
-            if hasattr(self, 'clear_user_cache'):
-                self.clear_user_cache(user_id)
+            self.clear_user_cache(user_id)
                 
             return referral_code
 
@@ -691,8 +744,7 @@ class UserDB:
             if referrer_id:
                 await session.execute(update(User).where(User.user_id == user_id).values(referred_by_user_id=referrer_id))
                 await session.commit()
-                if hasattr(self, 'clear_user_cache'):
-                    self.clear_user_cache(user_id)
+                self.clear_user_cache(user_id)
 
     async def get_referrer_info(self, user_id: int) -> Optional[dict]:
         async with self.get_session() as session:
@@ -715,8 +767,7 @@ class UserDB:
         async with self.get_session() as session:
             await session.execute(update(User).where(User.user_id == user_id).values(referral_reward_applied=True))
             await session.commit()
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
         
     async def get_referred_users(self, referrer_user_id: int) -> list[dict]:
         async with self.get_session() as session:
@@ -760,8 +811,7 @@ class UserDB:
         async with self.get_session() as session:
             await session.execute(update(User).where(User.user_id == user_id).values(auto_renew=status))
             await session.commit()
-        if hasattr(self, 'clear_user_cache'):
-            self.clear_user_cache(user_id)
+        self.clear_user_cache(user_id)
 
     async def get_all_active_uuids_with_user_id(self) -> List[Dict[str, Any]]:
         async with self.get_session() as session:
@@ -769,26 +819,71 @@ class UserDB:
             result = await session.execute(stmt)
             return [dict(row._mapping) for row in result.all()]
 
+    async def bulk_sync_uuids_from_panels(self, panel_rows: Dict[str, Dict[str, Any]], chunk_size: int = 1000) -> Dict[str, int]:
+        """
+        همگام‌سازی گروهی مصرف، حجم و انقضای سرویس‌ها با دیتای پنل‌ها.
+        panel_rows: {uuid (رشته کوچک): {'traffic_used', 'traffic_limit', 'expire_date'}}
+        (expire_date برابر None یعنی انقضا از پنل نامشخص است و مقدار فعلی حفظ می‌شود)
+
+        فقط ستون‌های لازم خوانده می‌شوند، تغییرات در پایتون تشخیص داده می‌شوند و فقط ردیف‌های تغییر کرده
+        با UPDATE ... FROM (VALUES ...) به‌روز می‌شوند. last_synced_at زمان آخرین تغییر اعمال شده از پنل است.
+        """
+        async with self.get_session() as session:
+            stmt = select(UserUUID.id, UserUUID.uuid, UserUUID.traffic_used, UserUUID.traffic_limit, UserUUID.expire_date)
+            current = (await session.execute(stmt)).all()
+
+        def _differs(a, b):
+            return abs((a or 0.0) - (b or 0.0)) > 1e-6
+
+        changed, matched = [], 0
+        for row in current:
+            api = panel_rows.get(str(row.uuid).lower())
+            if not api:
+                continue
+            matched += 1
+            expire = api.get('expire_date') or row.expire_date
+            if (_differs(row.traffic_used, api['traffic_used']) or _differs(row.traffic_limit, api['traffic_limit'])
+                    or expire != row.expire_date):
+                changed.append((row.id, api['traffic_used'], api['traffic_limit'], expire))
+
+        if changed:
+            now = datetime.now(timezone.utc)
+            async with self.get_session() as session:
+                for i in range(0, len(changed), chunk_size):
+                    v = values(
+                        column('id', Integer), column('traffic_used', Float), column('traffic_limit', Float),
+                        column('expire_date', DateTime(timezone=True)), name='v'
+                    ).data(changed[i:i + chunk_size])
+                    await session.execute(
+                        update(UserUUID)
+                        .where(UserUUID.id == v.c.id)
+                        .values(
+                            traffic_used=v.c.traffic_used, traffic_limit=v.c.traffic_limit,
+                            expire_date=v.c.expire_date, last_synced_at=now
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+
+        return {'matched': matched, 'changed': len(changed)}
+
     async def get_all_user_uuids_and_panel_data(self) -> List[Dict[str, Any]]:
         async with self.get_session() as session:
-            subq = (
-                select(UsageSnapshot.uuid_id, func.max(UsageSnapshot.taken_at).label('last_taken'))
-                .group_by(UsageSnapshot.uuid_id)
-                .subquery()
-            )
-            stmt = (
-                select(
-                    UserUUID.uuid, UserUUID.user_id, UserUUID.name,
-                    func.coalesce(UsageSnapshot.hiddify_usage_gb, 0).label('used_traffic_hiddify'),
-                    func.coalesce(UsageSnapshot.marzban_usage_gb, 0).label('used_traffic_marzban'),
-                    UsageSnapshot.taken_at.label('last_online_jalali')
-                )
-                .join(subq, UserUUID.id == subq.c.uuid_id, isouter=True)
-                .join(UsageSnapshot, and_(subq.c.uuid_id == UsageSnapshot.uuid_id, subq.c.last_taken == UsageSnapshot.taken_at), isouter=True)
-                .where(UserUUID.is_active == True)
-            )
-            result = await session.execute(stmt)
-            return [dict(row._mapping) for row in result.all()]
+            stmt = select(UserUUID.id, UserUUID.uuid, UserUUID.user_id, UserUUID.name).where(UserUUID.is_active == True)
+            rows = (await session.execute(stmt)).all()
+
+        # آخرین شمارنده هر پنل از panel_usage_snapshots، تجمیع شده به تفکیک نوع پنل
+        latest = await self.get_latest_usage_by_type([r.id for r in rows])
+        result = []
+        for r in rows:
+            usage = latest.get(r.id, {})
+            result.append({
+                'uuid': r.uuid, 'user_id': r.user_id, 'name': r.name,
+                'used_traffic_hiddify': usage.get('hiddify', 0),
+                'used_traffic_marzban': usage.get('marzban', 0),
+                'last_online_jalali': usage.get('taken_at')
+            })
+        return result
 
     async def add_or_update_user_from_panel(self, uuid: str, name: str, telegram_id: Optional[int], 
                                             expire_days_hiddify: Optional[int], expire_days_marzban: Optional[int], 
@@ -861,7 +956,7 @@ class UserDB:
                 await session.commit()
             
             # پاکسازی کش
-            if uid_to_clear and hasattr(self, 'clear_user_cache'):
+            if uid_to_clear:
                 self.clear_user_cache(uid_to_clear)
                 
             return True
@@ -885,7 +980,7 @@ class UserDB:
                     await session.commit()
             
             # پاکسازی کش
-            if uid_to_clear and hasattr(self, 'clear_user_cache'):
+            if uid_to_clear:
                 self.clear_user_cache(uid_to_clear)
                 
             return True if uid_to_clear else False
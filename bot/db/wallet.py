@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from .base import (
     User, WalletTransaction, ChargeRequest, DatabaseManager
 )
+from .pagination import keyset_fetch
 
 logger = logging.getLogger(__name__)
 
@@ -46,13 +47,17 @@ class WalletDB:
             return True
 
         if session:
-            # استفاده از سشن موجود (بدون کامیت)
-            return await _do_update(session)
+            # استفاده از سشن موجود (بدون کامیت)؛ کش کاربر بعد از کامیت فراخواننده باطل می‌شود
+            if await _do_update(session):
+                self.clear_user_cache_on_commit(session, user_id)
+                return True
+            return False
         else:
             # ساخت سشن جدید (با کامیت)
             async with self.get_session() as new_sess:
                 if await _do_update(new_sess):
                     await new_sess.commit()
+                    self.clear_user_cache(user_id)
                     return True
                 return False
 
@@ -84,8 +89,7 @@ class WalletDB:
                 
                 await session.commit()
                 
-                if hasattr(self, 'clear_user_cache'):
-                    self.clear_user_cache(user_id)
+                self.clear_user_cache(user_id)
                 return True
             except Exception as e:
                 await session.rollback()
@@ -192,30 +196,29 @@ class WalletDB:
             
             await session.commit()
             
-            if hasattr(self, '_user_cache'):
-                self._user_cache.clear()
+            self.clear_user_cache()
                 
             return result.rowcount
             
-    async def get_wallet_transactions_paginated(self, user_id: int, page: int = 1, per_page: int = 10) -> List[Dict[str, Any]]:
-        """لیست تراکنش‌های کیف پول یک کاربر به صورت صفحه‌بندی شده."""
-        offset = (page - 1) * per_page
+    async def get_wallet_transactions_paginated(self, user_id: int, cursor: Optional[str] = None, per_page: int = 10) -> Dict[str, Any]:
+        """
+        لیست تراکنش‌های کیف پول یک کاربر به صورت صفحه‌بندی کلیدی (جدیدترین اول).
+        خروجی: {'rows': [...], 'next': توکن صفحه بعد، 'prev': توکن صفحه قبل}
+        """
         async with self.get_session() as session:
-            stmt = (
-                select(WalletTransaction)
-                .where(WalletTransaction.user_id == user_id)
-                .order_by(desc(WalletTransaction.transaction_date))
-                .limit(per_page)
-                .offset(offset)
+            stmt = select(WalletTransaction).where(WalletTransaction.user_id == user_id)
+            page = await keyset_fetch(
+                session, stmt, [WalletTransaction.transaction_date, WalletTransaction.id], cursor, per_page,
+                key_of=lambda r: (r.transaction_date, r.id), scalars=True
             )
-            result = await session.execute(stmt)
-            return [
+            page['rows'] = [
                 {
                     "amount": r.amount, "type": r.type, 
                     "description": r.description, "transaction_date": r.transaction_date
                 }
-                for r in result.scalars().all()
+                for r in page['rows']
             ]
+            return page
 
     async def get_wallet_transactions_count(self, user_id: int) -> int:
         """تعداد کل تراکنش‌های کیف پول یک کاربر."""
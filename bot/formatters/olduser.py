@@ -6,11 +6,11 @@ import asyncio
 import time
 from datetime import datetime, timedelta
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from bot.config import EMOJIS
 from bot.database import db
 from bot.db.base import UserUUID, User, Panel, ServerCategory, PanelNode
+from bot.db.loaders import loader
 from bot import combined_handler
 from bot.language import get_string
 from bot.utils.formatters import create_progress_bar, format_daily_usage, escape_markdown
@@ -78,7 +78,7 @@ async def _get_panel_map_data():
 async def _get_user_context(uuid_str: str):
     """اطلاعات زمینه‌ای کاربر شامل ID و نقشه‌برداری پنل‌ها به دسته‌بندی."""
     async with db.get_session() as session:
-        stmt = select(UserUUID).where(UserUUID.uuid == uuid_str).options(selectinload(UserUUID.allowed_panels))
+        stmt = select(UserUUID).where(UserUUID.uuid == uuid_str).options(*loader('uuid_panels'))
         result = await session.execute(stmt)
         user_uuid_obj = result.scalar_one_or_none()
 
@@ -1,31 +1,40 @@
-from bot.utils.formatters import escape_markdown, format_gb_ltr, format_daily_usage
+from bot.utils.formatters import format_gb_ltr, format_daily_usage
+from bot.language import get_template
+from bot.templates import MarkdownTemplate, escape_md
 from datetime import datetime
 
+# قالب‌های ثابت گزارش شبانه (یک بار کامپایل می‌شوند)
+_SEPARATOR = "──────────────────"
+_ACCOUNT_LINE = MarkdownTemplate("👤 اکانت : *{name}*", markup=True)
+_NO_SERVICE = escape_md("❌ هیچ سرویس فعالی یافت نشد.")
+_SERVER_LINE = MarkdownTemplate("سرور {flag}")
+_DAILY_LINE = MarkdownTemplate("⚡️ حجم مصرف شده امروز : {usage}")
+
 class NotificationFormatter:
     
     @staticmethod
-    def nightly_report(user_data: dict, daily_usage: dict, type_flags_map: dict = None) -> str:
+    def nightly_report(user_data: dict, daily_usage: dict, type_flags_map: dict = None, lang_code: str = 'fa') -> str:
         """
         تولید گزارش شبانه به صورت تفکیک شده (هر سرویس یک بخش مجزا)
+        متن‌ها از قالب‌های کامپایل‌شده ساخته می‌شوند و فقط مقادیر اسکیپ می‌شوند.
         """
         if type_flags_map is None: type_flags_map = {}
         
-        name = escape_markdown(user_data.get('name', 'User'))
         breakdown = user_data.get('breakdown', {})
-        
-        # تابع کمکی برای اسکیپ کردن اعداد در MarkdownV2
-        def esc(val):
-            return str(val).replace('.', '\\.').replace('-', '\\-')
+        total_tpl = get_template('fmt_report_total_volume', lang_code)
+        used_tpl = get_template('fmt_report_used_volume', lang_code)
+        remain_tpl = get_template('fmt_report_remaining_volume', lang_code)
+        expiry_tpl = get_template('fmt_report_expiry', lang_code)
 
         # شروع ساخت متن گزارش
         lines = []
         
         # 1. نام اکانت و سپس خط جداکننده (طبق درخواست شما)
-        lines.append(f"👤 اکانت : *{name}*")
-        lines.append("──────────────────")
+        lines.append(_ACCOUNT_LINE.render(name=user_data.get('name', 'User')))
+        lines.append(_SEPARATOR)
         
         if not breakdown:
-            lines.append("❌ هیچ سرویس فعالی یافت نشد\\.")
+            lines.append(_NO_SERVICE)
             return "\n".join(lines)
 
         # مرتب‌سازی سرویس‌ها
@@ -76,20 +85,17 @@ class NotificationFormatter:
                     expire_str = f"{int(pkg_days)} روز"
 
             # --- 4. ساخت بلوک نمایشی ---
-            lines.append(f"سرور {flag}")
+            lines.append(_SERVER_LINE.render(flag=flag))
             
-            lines.append(f"📊 حجم‌کل : {esc(format_gb_ltr(limit))}")
-            lines.append(f"🔥 حجم‌مصرف شده : {esc(format_gb_ltr(used))}")
-            lines.append(f"📥 حجم‌باقی‌مانده : {esc(format_gb_ltr(remain))}")
+            lines.append(total_tpl.render(volume=format_gb_ltr(limit)))
+            lines.append(used_tpl.render(usage=format_gb_ltr(used)))
+            lines.append(remain_tpl.render(remaining=format_gb_ltr(remain)))
             
             # === اصلاح نمایش در موبایل ===
-            raw_daily = format_daily_usage(today_usage)
-            daily_fmt = f"\u200e{raw_daily}".replace('.', '\\.')
-            
-            lines.append(f"⚡️ حجم مصرف شده امروز : {daily_fmt}")
+            lines.append(_DAILY_LINE.render(usage=f"\u200e{format_daily_usage(today_usage)}"))
             
-            lines.append(f"📅 انقضا : {esc(expire_str)}")
+            lines.append(expiry_tpl.render(expiry=expire_str))
             
-            lines.append("──────────────────")
+            lines.append(_SEPARATOR)
 
         return "\n".join(lines)
\ No newline at end of file
@@ -9,7 +9,13 @@ class AdminServersMenu(BaseMenu):
     """مدیریت سرورها و اتصالات"""
 
     async def panel_list_menu(self, panels: List[Dict[str, Any]]) -> types.InlineKeyboardMarkup:
-        """لیست پنل‌های متصل"""
+        """لیست پنل‌های متصل (از کش منوها)"""
+        key = ('admin_panel_list', tuple(
+            (p['id'], p['name'], p['panel_type'], p.get('category'), p['is_active']) for p in panels
+        ))
+        return await self.cached_markup(key, lambda: self._build_panel_list_menu(panels))
+
+    async def _build_panel_list_menu(self, panels: List[Dict[str, Any]]) -> types.InlineKeyboardMarkup:
         kb = self.create_markup(row_width=2)
         categories = await db.get_server_categories()
         cat_map = {c['code']: c['emoji'] for c in categories}
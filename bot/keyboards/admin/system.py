@@ -81,7 +81,8 @@ class AdminSystemMenu(BaseMenu):
         kb.add(self.btn("🔙 بازگشت", "admin:group_actions_menu"))
         return kb
 
-    async def broadcast_target_menu(self, counts=None):
+    async def broadcast_target_menu(self, counts=None, extra_segments=None):
+        """extra_segments: بخش‌های پلن و دسته‌بندی [{'key', 'label', 'count'}, ...]"""
         if counts is None: counts = {}
         
         kb = types.InlineKeyboardMarkup(row_width=2)
@@ -101,6 +102,12 @@ class AdminSystemMenu(BaseMenu):
             types.InlineKeyboardButton(f"🚫 هرگز متصل نشده ({c_inactive0})", callback_data="admin:broadcast_target:inactive_0")
         )
         kb.add(types.InlineKeyboardButton(f"📣 همه کاربران ربات ({c_all})", callback_data="admin:broadcast_target:all"))
+        segment_buttons = [
+            types.InlineKeyboardButton(f"🎯 {seg['label']} ({seg['count']})", callback_data=f"admin:broadcast_target:{seg['key']}")
+            for seg in extra_segments or []
+        ]
+        if segment_buttons:
+            kb.add(*segment_buttons)
         kb.add(types.InlineKeyboardButton("🔙 بازگشت به پنل مدیریت", callback_data="admin:panel"))
         
         return kb
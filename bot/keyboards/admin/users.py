@@ -9,7 +9,11 @@ class AdminUsersMenu(BaseMenu):
     """مدیریت کاربران، جستجو و ویرایش"""
 
     async def management_menu(self, panels: List[Dict[str, Any]]) -> types.InlineKeyboardMarkup:
-        """منوی انتخاب پنل برای مدیریت کاربران"""
+        """منوی انتخاب پنل برای مدیریت کاربران (از کش منوها)"""
+        key = ('admin_management', tuple((p['id'], p['name'], p['panel_type'], p.get('category')) for p in panels))
+        return await self.cached_markup(key, lambda: self._build_management_menu(panels))
+
+    async def _build_management_menu(self, panels: List[Dict[str, Any]]) -> types.InlineKeyboardMarkup:
         kb = self.create_markup(row_width=2)
         categories = await db.get_server_categories()
         cat_map = {c['code']: c['emoji'] for c in categories}
@@ -1,11 +1,46 @@
 # bot/keyboards/base.py
+from typing import Awaitable, Callable, Hashable
 from telebot import types
 from ..language import get_string
-from ..config import EMOJIS, PAGE_SIZE
+from ..config import EMOJIS, PAGE_SIZE, MENU_CACHE_SIZE, MENU_CACHE_TTL
+from ..database import db
+from ..db.cache import LRUCache
+
+
+class PrerenderedMarkup(types.JsonSerializable):
+    """
+    کیبورد از پیش سریال‌شده؛ کتابخانه تلگرام برای ارسال فقط to_json را صدا می‌زند،
+    پس منوی کش‌شده بدون ساخت دوباره دکمه‌ها و بدون json.dumps ارسال می‌شود.
+    """
+    __slots__ = ('_json',)
+
+    def __init__(self, json_str: str):
+        self._json = json_str
+
+    def to_json(self) -> str:
+        return self._json
+
+
+# کش مشترک منوها؛ کلید: (نام منو، زبان، نقش، ...، نسخه داده‌های منو)
+menu_cache = LRUCache(maxsize=MENU_CACHE_SIZE, ttl=MENU_CACHE_TTL)
+
 
 class BaseMenu:
     """کلاس والد برای متدهای مشترک ساخت کیبورد"""
 
+    async def cached_markup(self, key: tuple, build: Callable[[], Awaitable[types.InlineKeyboardMarkup]]) -> PrerenderedMarkup:
+        """
+        منوی ثابت/نیمه‌ثابت را یک بار می‌سازد و نسخه سریال‌شده آن را برمی‌گرداند.
+        key باید همه ورودی‌های منو (زبان، نقش، وضعیت‌ها) را داشته باشد؛ نسخه داده‌ها
+        (db.menu_version) خودکار اضافه می‌شود تا با تغییر دسته‌بندی‌ها، پلن‌ها یا پنل‌ها کش باطل شود.
+        """
+        full_key: Hashable = key + (db.menu_version,)
+        markup = menu_cache.get(full_key)
+        if markup is None:
+            markup = PrerenderedMarkup((await build()).to_json())
+            menu_cache.set(full_key, markup)
+        return markup
+
     def create_markup(self, row_width=2) -> types.InlineKeyboardMarkup:
         return types.InlineKeyboardMarkup(row_width=row_width)
 
@@ -10,7 +10,10 @@ class UserMainMenu(BaseMenu):
     """منوهای اصلی، تنظیمات و عمومی کاربر"""
 
     async def main(self, is_admin: bool, lang_code: str) -> types.InlineKeyboardMarkup:
-        """منوی اصلی ربات برای کاربران"""
+        """منوی اصلی ربات برای کاربران (از کش منوها، به تفکیک زبان و نقش)"""
+        return await self.cached_markup(('user_main', lang_code, is_admin), lambda: self._build_main(is_admin, lang_code))
+
+    async def _build_main(self, is_admin: bool, lang_code: str) -> types.InlineKeyboardMarkup:
         kb = self.create_markup(row_width=2)
         
         buttons = [
@@ -41,7 +44,20 @@ class UserMainMenu(BaseMenu):
         return kb
 
     async def settings(self, settings_dict: dict, lang_code: str, access: dict) -> types.InlineKeyboardMarkup:
-        """منوی تنظیمات (گزارش‌ها و هشدارها)"""
+        """
+        منوی تنظیمات (گزارش‌ها و هشدارها).
+        کلید کش فقط وضعیت تنظیم‌های نمایش داده‌شده است، پس کاربران با وضعیت یکسان منوی مشترک دارند.
+        """
+        categories_list = await db.get_server_categories()
+        alert_keys = tuple(
+            f"data_warning_{cat['code']}" for cat in categories_list
+            if access and access.get(f"has_access_{cat['code']}")
+        )
+        shown = ('monthly_reports', 'weekly_reports', 'daily_reports') + alert_keys
+        key = ('user_settings', lang_code, alert_keys, tuple(bool(settings_dict.get(k, True)) for k in shown))
+        return await self.cached_markup(key, lambda: self._build_settings(settings_dict, lang_code, access, categories_list))
+
+    async def _build_settings(self, settings_dict: dict, lang_code: str, access: dict, categories_list: list) -> types.InlineKeyboardMarkup:
         kb = self.create_markup()
         
         def status(key):
@@ -56,7 +72,6 @@ class UserMainMenu(BaseMenu):
 
         kb.add(self.btn(f"🪫 {get_string('alerts_category', lang_code)}", "noop"))
         
-        categories_list = await db.get_server_categories()
         alert_btns = []
         for cat in categories_list:
             cat_code = cat['code']
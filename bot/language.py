@@ -2,20 +2,26 @@
 
 import json
 import os
-from typing import Dict
+from typing import Dict, Tuple
 import logging
 
+from .templates import MarkdownTemplate
+
 # لاگر را برای این فایل تعریف می‌کنیم
 logger = logging.getLogger(__name__)
 
 # دیکشنری برای نگهداری تمام ترجمه‌ها در حافظه
 _translations: Dict[str, Dict[str, str]] = {}
 
+# قالب‌های کامپایل‌شده MarkdownV2؛ کلید: (کلید متن، زبان، markup)
+_templates: Dict[Tuple[str, str, bool], MarkdownTemplate] = {}
+
 def load_translations():
     """
     فایل‌های زبان (JSON) را از پوشه locales بارگذاری می‌کند و لاگ دقیق ثبت می‌کند.
     """
     global _translations
+    _templates.clear()
     locales_dir = os.path.join(os.path.dirname(__file__), 'locales')
     if not os.path.exists(locales_dir):
         logger.error(f"FATAL: Locales directory not found at '{locales_dir}'")
@@ -53,5 +59,17 @@ def get_string(key: str, lang_code: str = 'fa') -> str:
 
     return translation
 
+
+def get_template(key: str, lang_code: str = 'fa', markup: bool = False) -> MarkdownTemplate:
+    """
+    نسخه کامپایل‌شده یک متن برای MarkdownV2 (متن ثابت از قبل اسکیپ شده، فقط مقادیر در render اسکیپ می‌شوند).
+    markup=True برای متن‌هایی که خودشان قالب‌بندی MarkdownV2 دارند (مثل *پررنگ*).
+    """
+    cache_key = (key, lang_code, markup)
+    template = _templates.get(cache_key)
+    if template is None:
+        template = _templates[cache_key] = MarkdownTemplate(get_string(key, lang_code), markup=markup)
+    return template
+
 # در ابتدای اجرای ربات، تمام فایل‌های زبان را بارگذاری می‌کنیم
 load_translations()
\ No newline at end of file
@@ -20,6 +20,9 @@ try:
 except ImportError:
     rewards = maintenance = financials = None
 
+from bot.db.instrumentation import scoped_job
+from bot.services.send_scheduler import Priority, with_send_priority
+
 logger = logging.getLogger(__name__)
 
 class SchedulerManager:
@@ -44,7 +47,7 @@ class SchedulerManager:
         # -----------------------------------------------------------
         # چک کردن هشدارها هر 10 دقیقه
         self.scheduler.add_job(
-            warnings.check_and_send_warnings,
+            scoped_job(with_send_priority(Priority.WARNING, warnings.check_and_send_warnings)),
             trigger=IntervalTrigger(minutes=10),
             args=[self.bot],
             id="job_warnings",
@@ -58,7 +61,7 @@ class SchedulerManager:
             # الف) گزارش شبانه (Nightly Report)
             # زمان اجرا: هر شب ساعت 23:59
             self.scheduler.add_job(
-                reports.nightly_report,
+                scoped_job(with_send_priority(Priority.REPORT, reports.nightly_report)),
                 trigger=CronTrigger(hour=20, minute=2),
                 args=[self.bot],
                 id="job_nightly_report",
@@ -68,7 +71,7 @@ class SchedulerManager:
             # ب) گزارش هفتگی کاربران (Weekly Report)
             # زمان اجرا: جمعه‌ها ساعت 12:00 ظهر
             self.scheduler.add_job(
-                reports.weekly_report,
+                scoped_job(with_send_priority(Priority.REPORT, reports.weekly_report)),
                 trigger=CronTrigger(day_of_week='fri', hour=12, minute=0),
                 args=[self.bot],
                 id="job_weekly_report",
@@ -78,7 +81,7 @@ class SchedulerManager:
             # ج) خلاصه هفتگی ادمین (Weekly Admin Summary)
             # زمان اجرا: جمعه‌ها ساعت 23:30 شب
             self.scheduler.add_job(
-                reports.send_weekly_admin_summary,
+                scoped_job(with_send_priority(Priority.REPORT, reports.send_weekly_admin_summary)),
                 trigger=CronTrigger(day_of_week='fri', hour=23, minute=30),
                 args=[self.bot],
                 id="job_weekly_admin_summary",
@@ -88,7 +91,7 @@ class SchedulerManager:
             # د) نظرسنجی ماهانه (Monthly Survey)
             # زمان اجرا: جمعه‌ها ساعت 18:00 (تابع خودش چک می‌کند که جمعه آخر ماه باشد)
             self.scheduler.add_job(
-                reports.send_monthly_satisfaction_survey,
+                scoped_job(with_send_priority(Priority.REPORT, reports.send_monthly_satisfaction_survey)),
                 trigger=CronTrigger(day_of_week='fri', hour=18, minute=0),
                 args=[self.bot],
                 id="job_monthly_survey",
@@ -100,7 +103,7 @@ class SchedulerManager:
         # -----------------------------------------------------------
         if maintenance:
             self.scheduler.add_job(
-            maintenance.hourly_snapshots,
+            scoped_job(with_send_priority(Priority.REPORT, maintenance.hourly_snapshots)),
             trigger=CronTrigger(minute=55),
             args=[self.bot],
             id="job_hourly_snapshots",
@@ -108,14 +111,31 @@ class SchedulerManager:
             )
 
             self.scheduler.add_job(
-                maintenance.sync_users_with_panels,
+                scoped_job(with_send_priority(Priority.REPORT, maintenance.sync_users_with_panels)),
                 trigger=IntervalTrigger(hours=1),
                 args=[self.bot],
                 id="job_sync_panels"
             )
             
+            # بیس‌لاین مصرف روزانه در نیمه‌شب تهران
+            self.scheduler.add_job(
+                scoped_job(maintenance.capture_midnight_baselines),
+                trigger=CronTrigger(hour=0, minute=0),
+                args=[self.bot],
+                id="job_midnight_baselines",
+                replace_existing=True
+            )
+
+            # فشرده‌سازی اسنپ‌شات‌های قدیمی (ساعت کم‌ترافیک)
+            self.scheduler.add_job(
+                scoped_job(maintenance.compact_usage_snapshots),
+                trigger=CronTrigger(hour=4, minute=30),
+                id="job_compact_snapshots",
+                replace_existing=True
+            )
+
             self.scheduler.add_job(
-                maintenance.cleanup_old_logs,
+                scoped_job(maintenance.cleanup_old_logs),
                 trigger=IntervalTrigger(hours=24),
                 args=[],
                 id="job_cleanup"
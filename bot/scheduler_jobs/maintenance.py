@@ -11,25 +11,53 @@ from sqlalchemy import select, delete
 # ایمپورت‌های پروژه
 from bot import combined_handler
 from bot.database import db
-from bot.db.base import UserUUID, AdminLog, SentReport, UsageSnapshot
+from bot.services import cache_manager
+from bot.db.base import UserUUID, AdminLog, SentReport
 from bot.formatters import admin_formatter
+from bot.config import (
+    SNAPSHOT_CHANGE_ONLY, SNAPSHOT_HEARTBEAT_HOURS, SNAPSHOT_HOURLY_RETENTION_DAYS,
+    SNAPSHOT_DAILY_RETENTION_MONTHS, SNAPSHOT_COMPACTION_BATCH
+)
 
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------
 # 1. همگام‌سازی کاربران (SYNC USERS)
 # ---------------------------------------------------------
+def _parse_panel_expire(value):
+    """تبدیل انقضای دیتای تجمیع شده (timestamp یا رشته ISO) به datetime با منطقه زمانی UTC."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else pytz.utc.localize(value)
+    if isinstance(value, (int, float)) and value > 0:
+        return datetime.fromtimestamp(value, tz=pytz.utc)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return parsed if parsed.tzinfo else pytz.utc.localize(parsed)
+        except ValueError:
+            return None
+    return None
+
+
+async def _refresh_audience_segments(source: str):
+    """به‌روزرسانی بخش‌های از پیش محاسبه‌شده مخاطبان برادکست (خطا جاب اصلی را متوقف نمی‌کند)."""
+    try:
+        counts = await db.refresh_audience_segments()
+        logger.info(f"{source}: Refreshed {len(counts)} audience segments.")
+    except Exception as e:
+        logger.error(f"{source}: Failed to refresh audience segments: {e}", exc_info=True)
+
+
 async def sync_users_with_panels(bot):
     """
-    اطلاعات ترافیک و انقضای کاربران را از پنل‌ها گرفته و در دیتابیس لوکال ذخیره می‌کند.
+    اطلاعات ترافیک، حجم و انقضای کاربران را از پنل‌ها گرفته و در دیتابیس لوکال ذخیره می‌کند.
+    فقط ردیف‌های تغییر کرده با یک UPDATE گروهی نوشته می‌شوند.
     """
     start_time = time.time()
     logger.info("SYNCER: Starting panel data synchronization cycle.")
-    loop = asyncio.get_running_loop()
 
     try:
-        # 1. دریافت اطلاعات از API پنل‌ها (عملیات سنگین شبکه -> اجرا در Executor)
-        # این کار باعث می‌شود هسته اصلی ربات بلاک نشود
+        # 1. دریافت اطلاعات از API پنل‌ها
         all_users_from_api = await combined_handler.get_all_users_combined()
 
         if not all_users_from_api:
@@ -37,40 +65,30 @@ async def sync_users_with_panels(bot):
             return
 
         # تبدیل لیست به دیکشنری برای جستجوی سریع
-        api_users_map = {u.get('uuid'): u for u in all_users_from_api if u.get('uuid')}
+        panel_rows = {
+            str(u['uuid']).lower(): {
+                'traffic_used': float(u.get('current_usage_GB', 0) or 0),
+                'traffic_limit': float(u.get('usage_limit_GB', 0) or 0),
+                'expire_date': _parse_panel_expire(u.get('expire')),
+            }
+            for u in all_users_from_api if u.get('uuid')
+        }
+
+        # 2. آپدیت گروهی دیتابیس
+        db_start = time.time()
+        stats = await db.bulk_sync_uuids_from_panels(panel_rows)
+        db_duration = max(time.time() - db_start, 1e-6)
+
+        if stats['changed']:
+            logger.info(
+                f"SYNCER: Updated {stats['changed']}/{stats['matched']} users in database "
+                f"({stats['changed'] / db_duration:,.0f} rows/s)."
+            )
+        else:
+            logger.info(f"SYNCER: No changes detected ({stats['matched']} users matched).")
 
-        # 2. آپدیت دیتابیس
-        async with db.get_session() as session:
-            # دریافت تمام UUID های موجود در دیتابیس
-            stmt = select(UserUUID)
-            result = await session.execute(stmt)
-            db_uuids = result.scalars().all()
-            
-            updates_count = 0
-            
-            for uuid_obj in db_uuids:
-                api_data = api_users_map.get(str(uuid_obj.uuid))
-                
-                if api_data:
-                    # بررسی تغییرات (برای کاهش تعداد رایدهای دیتابیس)
-                    usage = api_data.get('current_usage_GB', 0)
-                    limit = api_data.get('usage_limit_GB', 0)
-                    
-                    # آپدیت فیلدها
-                    uuid_obj.traffic_used = usage
-                    # اگر بخواهیم لیمیت را هم از پنل سینک کنیم:
-                    # uuid_obj.traffic_limit = limit 
-                    
-                    # آپدیت وضعیت انقضا
-                    # نکته: بسته به منطق شما ممکن است بخواهید expire_date را هم آپدیت کنید
-                    
-                    updates_count += 1
-            
-            if updates_count > 0:
-                await session.commit()
-                logger.info(f"SYNCER: Updated {updates_count} users in database.")
-            else:
-                logger.info("SYNCER: No changes detected.")
+        if stats['changed']:
+            await _refresh_audience_segments("SYNCER")
 
     except Exception as e:
         logger.error(f"SYNCER: Critical error during sync: {e}", exc_info=True)
@@ -125,54 +143,39 @@ async def hourly_snapshots(bot):
             logger.warning("SNAPSHOT: No user data fetched.")
             return
 
-        # ۲. آماده‌سازی دیتابیس
+        # ۲. آماده‌سازی دیتابیس (فقط ستون‌های لازم، کلید رشته‌ای برای تطبیق با دیتای پنل)
         async with db.get_session() as session:
-            stmt = select(UserUUID)
-            user_uuids_db = (await session.execute(stmt)).scalars().all()
-            db_uuid_map = {u.uuid: u for u in user_uuids_db}
-
-        # متغیرهای جمع کل
-        total_hiddify = 0.0
-        total_marzban = 0.0
-        total_remnawave = 0.0
-        total_pasarguard = 0.0
-        snapshot_count = 0
-
-        # ۳. پردازش و ذخیره اسنپ‌شات‌ها
+            rows = (await session.execute(select(UserUUID.id, UserUUID.uuid))).all()
+            db_uuid_map = {str(r.uuid).lower(): r.id for r in rows}
+
+        panel_ids = await db.get_panel_ids_by_name()
+        counters = {}
+
+        # ۳. محاسبه شمارنده‌ها (بایت، به تفکیک پنل) و ذخیره گروهی اسنپ‌شات‌ها
         for user_data in all_users:
-            uuid_str = user_data.get('uuid')
+            uuid_str = str(user_data.get('uuid') or '').lower()
             if not uuid_str or uuid_str not in db_uuid_map:
                 continue
+            counters[db_uuid_map[uuid_str]] = db.panel_counters(user_data, panel_ids)
 
-            user_db_id = db_uuid_map[uuid_str].id
-            breakdown = user_data.get('breakdown', {})
+        snapshot_count = len(counters)
+        written = await db.record_usage_snapshots(
+            counters, change_only=SNAPSHOT_CHANGE_ONLY, heartbeat_hours=SNAPSHOT_HEARTBEAT_HOURS
+        )
 
-            h_usage, m_usage, r_usage, p_usage = 0.0, 0.0, 0.0, 0.0
+        # متغیرهای جمع کل (GB به تفکیک نوع پنل)
+        panel_totals = {}
+        for user_counters in counters.values():
+            for pid, val in user_counters.items():
+                panel_totals[pid] = panel_totals.get(pid, 0) + val
+        totals = await db.usage_by_type(panel_totals)
+        total_hiddify, total_marzban = totals['hiddify'], totals['marzban']
+        total_remnawave, total_pasarguard = totals['remnawave'], totals['pasarguard']
 
-            for p_info in breakdown.values():
-                p_type = p_info.get('type')
-                val = p_info.get('data', {}).get('current_usage_GB', 0.0)
-                
-                if p_type == 'hiddify': h_usage += val
-                elif p_type == 'marzban': m_usage += val
-                elif p_type == 'remnawave': r_usage += val
-                elif p_type == 'pasarguard': p_usage += val
-
-            total_hiddify += h_usage
-            total_marzban += m_usage
-            total_remnawave += r_usage
-            total_pasarguard += p_usage
-
-            await db.add_usage_snapshot(
-                uuid_id=user_db_id,
-                hiddify_usage=h_usage,
-                marzban_usage=m_usage,
-                remnawave_usage=r_usage,
-                pasarguard_usage=p_usage
-            )
-            snapshot_count += 1
+        logger.info(f"SNAPSHOT: Saved {written} panel snapshots for {snapshot_count} services (unchanged panels skipped).")
 
-        logger.info(f"SNAPSHOT: Saved {snapshot_count} snapshots.")
+        # بخش‌های مخاطبان (آنلاین/غیرفعال) به اسنپ‌شات‌ها وابسته‌اند
+        await _refresh_audience_segments("SNAPSHOT")
 
         # ---------------------------------------------------------
         # ۴. ارسال گزارش به تاپیک اختصاصی (topic_id_snapshots)
@@ -216,7 +219,80 @@ async def hourly_snapshots(bot):
     except Exception as e:
         logger.error(f"SNAPSHOT: Critical error: {e}", exc_info=True)
 # ---------------------------------------------------------
-# 4. آپدیت پیام آنلاین‌ها (LIVE ONLINE LIST)
+# 4. بیس‌لاین نیمه‌شب (MIDNIGHT BASELINE)
+# ---------------------------------------------------------
+async def capture_midnight_baselines(bot):
+    """
+    جاب زمان‌بندی شده (۰۰:۰۰ تهران): شمارنده‌های فعلی مصرف را به عنوان بیس‌لاین امروز ذخیره می‌کند.
+    از این پس «مصرف امروز» = شمارنده فعلی کش - بیس‌لاین، بدون مراجعه به جدول اسنپ‌شات‌ها.
+    """
+    logger.info("BASELINE: Capturing midnight usage baselines...")
+    try:
+        # کش باید دقیقاً وضعیت لحظه نیمه‌شب را داشته باشد، نه آخرین سینک ۱۰ دقیقه‌ای
+        await cache_manager.fetch_and_update_cache()
+        live = await cache_manager.get_by_uuid()
+        if not live:
+            logger.warning("BASELINE: No user data in cache. Skipping.")
+            return
+
+        async with db.get_session() as session:
+            rows = (await session.execute(select(UserUUID.id, UserUUID.uuid))).all()
+
+        panel_ids = await db.get_panel_ids_by_name()
+        counters = {}
+        for row in rows:
+            user_data = live.get(str(row.uuid).lower())
+            if user_data:
+                counters[row.id] = db.panel_counters(user_data, panel_ids)
+
+        count = await db.capture_day_baselines(counters)
+        logger.info(f"BASELINE: Captured {count} baselines.")
+    except Exception as e:
+        logger.error(f"BASELINE: Critical error: {e}", exc_info=True)
+
+# ---------------------------------------------------------
+# 5. فشرده‌سازی اسنپ‌شات‌ها (SNAPSHOT COMPACTION)
+# ---------------------------------------------------------
+async def compact_usage_snapshots(hourly_days: int = SNAPSHOT_HOURLY_RETENTION_DAYS,
+                                  daily_months: int = SNAPSHOT_DAILY_RETENTION_MONTHS,
+                                  batch_size: int = SNAPSHOT_COMPACTION_BATCH):
+    """
+    اسنپ‌شات‌های قدیمی‌تر از hourly_days روز به یک ردیف در روز کاهش می‌یابند
+    و قدیمی‌تر از daily_months ماه حذف می‌شوند.
+    کار به دسته‌های batch_size سرویسی تقسیم می‌شود و هر دسته تراکنش جداگانه دارد
+    تا قفل طولانی روی usage_snapshots نگه داشته نشود.
+    """
+    start_time = time.time()
+    logger.info("COMPACTION: Starting usage snapshot compaction...")
+
+    tehran_tz = pytz.timezone("Asia/Tehran")
+    today_midnight = datetime.now(tehran_tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    # مرزها روی نیمه‌شب تهران تنظیم می‌شوند تا روزها نصفه فشرده نشوند
+    hourly_cutoff = today_midnight - timedelta(days=hourly_days)
+    daily_cutoff = today_midnight - timedelta(days=30 * daily_months)
+
+    try:
+        async with db.get_session() as session:
+            uuid_ids = (await session.execute(select(UserUUID.id).order_by(UserUUID.id))).scalars().all()
+
+        compacted, dropped = 0, 0
+        for i in range(0, len(uuid_ids), batch_size):
+            res = await db.compact_snapshot_batch(uuid_ids[i:i + batch_size], hourly_cutoff, daily_cutoff)
+            compacted += res['compacted']
+            dropped += res['dropped']
+            # فرصت به بقیه کوئری‌ها بین دسته‌ها
+            await asyncio.sleep(0.1)
+
+        duration = time.time() - start_time
+        logger.info(
+            f"COMPACTION: Removed {compacted} hourly rows and {dropped} expired rows "
+            f"for {len(uuid_ids)} services in {duration:.2f} seconds."
+        )
+    except Exception as e:
+        logger.error(f"COMPACTION: Critical error: {e}", exc_info=True)
+
+# ---------------------------------------------------------
+# 6. آپدیت پیام آنلاین‌ها (LIVE ONLINE LIST)
 # ---------------------------------------------------------
 async def update_online_reports(bot):
     """
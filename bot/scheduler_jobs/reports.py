@@ -1,7 +1,6 @@
 # bot/scheduler_jobs/reports.py
 
 import logging
-import asyncio
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 import pytz
@@ -17,11 +16,18 @@ from bot.utils.formatters import escape_markdown
 # ایمپورت‌های ضروری
 from bot.formatters import admin_formatter, user_formatter
 from bot.keyboards.user.main import UserMainMenu
-from bot.config import ADMIN_IDS
-from bot.language import get_string
+from bot.config import ADMIN_IDS, REPORT_AUTO_DELETE_HOURS
+from bot.language import get_template
+from bot.templates import MarkdownTemplate
+from bot.services.timer_wheel import timer_wheel
 
 logger = logging.getLogger(__name__)
 
+# قالب‌های کامپایل‌شده گزارش‌ها؛ فقط مقادیر جایگذاری‌شده در هر رندر اسکیپ می‌شوند
+_NIGHTLY_HEADER = MarkdownTemplate("🌙 *گزارش شبانه* - {date}\n", markup=True)
+_WEEKLY_HEADER = MarkdownTemplate("📊 *گزارش هفتگی* - {date}", markup=True)
+_WEEKLY_LINE = MarkdownTemplate("👤 *{name}* : `{usage:.2f} GB` \\(کل\\)", markup=True)
+
 # ---------------------------------------------------------
 # توابع کمکی
 # ---------------------------------------------------------
@@ -58,15 +64,29 @@ async def get_dynamic_type_flags() -> dict:
     
     return type_flags
 
+async def _track_sent_report(user_id: int, message_id: int, user_settings: dict, auto_deletes: list):
+    """ثبت گزارش ارسالی؛ برای کاربران با auto_delete_reports حذف خودکار آن در صف تایمرها گذاشته می‌شود."""
+    await db.add_sent_report(user_id, message_id)
+    if user_settings.get('auto_delete_reports'):
+        auto_deletes.append({
+            'action': 'delete_report', 'chat_id': user_id, 'message_id': message_id,
+            'delay': REPORT_AUTO_DELETE_HOURS * 3600,
+        })
+
+async def _user_id_batches(target_user_id: int = None):
+    """شناسه کاربران دسته به دسته و جریانی؛ با target_user_id فقط همان کاربر."""
+    if target_user_id:
+        yield [target_user_id]
+        return
+    async for batch in db.iter_user_id_batches():
+        yield batch
+
 def _fmt_user_weekly_report(user_infos: list, lang_code: str) -> str:
     """تولید متن گزارش هفتگی (تابع کمکی)"""
-    lines = []
-    for info in user_infos:
-        name = escape_markdown(info.get('name', 'Unknown'))
-        usage = info.get('current_usage_GB', 0)
-        lines.append(f"👤 *{name}* : `{usage:.2f} GB` (کل)")
-    
-    return "\n\n".join(lines)
+    return "\n\n".join(
+        _WEEKLY_LINE.render(name=info.get('name', 'Unknown'), usage=info.get('current_usage_GB', 0) or 0)
+        for info in user_infos
+    )
 
 # ---------------------------------------------------------
 # 1. NIGHTLY REPORT (گزارش شبانه)
@@ -159,7 +179,6 @@ async def nightly_report(bot, target_user_id: int = None) -> None:
                         for i, chunk in enumerate(chunks):
                             if i > 0: chunk = f"*{escape_markdown('(ادامه...)')}*\n" + chunk
                             await bot.send_message(chat_id=main_group_id, text=chunk, parse_mode="MarkdownV2", message_thread_id=thread_id)
-                            await asyncio.sleep(0.5)
                     else:
                         await bot.send_message(chat_id=main_group_id, text=admin_report_text, parse_mode="MarkdownV2", message_thread_id=thread_id)
                     
@@ -167,82 +186,83 @@ async def nightly_report(bot, target_user_id: int = None) -> None:
                 logger.error(f"SCHEDULER: Failed to send admin report: {e}", exc_info=True)
 
         # --- بخش ۲: گزارش کاربران ---
-        if target_user_id:
-            user_ids_to_process = [target_user_id]
-        else:
-            user_ids_to_process = [uid async for uid in db.get_all_user_ids()]
-            
         separator = '\n' + '─' * 18 + '\n'
 
         import time  # برای بررسی زمان انقضا
 
-        for user_id in user_ids_to_process:
-            try:
-                if is_friday and user_id not in ADMIN_IDS and not target_user_id:
-                    continue
+        async for user_ids_to_process in _user_id_batches(target_user_id):
+            # تنظیمات کاربران هر دسته با یک کوئری
+            settings_map = await db.get_settings_for_users(user_ids_to_process)
+            auto_deletes = []
+
+            for user_id in user_ids_to_process:
+                try:
+                    if is_friday and user_id not in ADMIN_IDS and not target_user_id:
+                        continue
 
-                user_settings = await db.get_user_settings(user_id)
-                if not user_settings.get('daily_reports', True) and not target_user_id:
-                    continue
+                    user_settings = settings_map[user_id]
+                    if not user_settings.get('daily_reports', True) and not target_user_id:
+                        continue
 
-                user_uuids_from_db = await db.uuids(user_id)
-                reports_content = []
+                    user_uuids_from_db = await db.uuids(user_id)
+                    reports_content = []
                 
-                for u_row in user_uuids_from_db:
-                    uuid_str = str(u_row['uuid'])
+                    for u_row in user_uuids_from_db:
+                        uuid_str = str(u_row['uuid'])
                     
-                    # 1. تلاش برای پیدا کردن با UUID
-                    user_data = user_map_by_uuid.get(uuid_str)
+                        # 1. تلاش برای پیدا کردن با UUID
+                        user_data = user_map_by_uuid.get(uuid_str)
                     
-                    # 2. اگر با UUID پیدا نشد، تلاش برای پیدا کردن با Name
-                    if not user_data:
-                        # دریافت نام از رکورد دیتابیس (در صورتی که وجود داشته باشد)
-                        row_name = u_row.get('name')
-                        if row_name:
-                            user_data = user_map_by_name.get(str(row_name).lower())
+                        # 2. اگر با UUID پیدا نشد، تلاش برای پیدا کردن با Name
+                        if not user_data:
+                            # دریافت نام از رکورد دیتابیس (در صورتی که وجود داشته باشد)
+                            row_name = u_row.get('name')
+                            if row_name:
+                                user_data = user_map_by_name.get(str(row_name).lower())
                     
-                    if user_data:
-                        # --- فیلتر کردن سرویس‌های منقضی شده ---
-                        
-                        if user_data.get('status') == 'expired':
-                            continue
+                        if user_data:
+                            # --- فیلتر کردن سرویس‌های منقضی شده ---
                         
-                        # 2. بررسی تاریخ انقضا (اگر وجود داشته باشد و نامحدود نباشد)
-                        expire_ts = user_data.get('expire')
-                        if expire_ts and isinstance(expire_ts, (int, float)) and expire_ts > 0:
-                            if time.time() > expire_ts:
+                            if user_data.get('status') == 'expired':
                                 continue
+                        
+                            # 2. بررسی تاریخ انقضا (اگر وجود داشته باشد و نامحدود نباشد)
+                            expire_ts = user_data.get('expire')
+                            if expire_ts and isinstance(expire_ts, (int, float)) and expire_ts > 0:
+                                if time.time() > expire_ts:
+                                    continue
 
-                        this_uuid_daily = daily_usage_map.get(uuid_str, {})
+                            this_uuid_daily = daily_usage_map.get(uuid_str, {})
                         
-                        report_block = user_formatter.notification.nightly_report(
-                            user_data, 
-                            this_uuid_daily,
-                            type_flags_map
-                        )
-                        reports_content.append(report_block)
-
-                if reports_content:
-                    header = f"🌙 *گزارش شبانه* {escape_markdown('-')} {escape_markdown(now_str)}\n"
-                    full_body = ("\n" + separator + "\n").join(reports_content)
-                    final_msg = header + full_body
+                            report_block = user_formatter.notification.nightly_report(
+                                user_data, 
+                                this_uuid_daily,
+                                type_flags_map
+                            )
+                            reports_content.append(report_block)
+
+                    if reports_content:
+                        header = _NIGHTLY_HEADER.render(date=now_str)
+                        full_body = ("\n" + separator + "\n").join(reports_content)
+                        final_msg = header + full_body
                     
-                    sent_message = await bot.send_message(user_id, final_msg, parse_mode="MarkdownV2")
+                        sent_message = await bot.send_message(user_id, final_msg, parse_mode="MarkdownV2")
                     
-                    if sent_message and hasattr(db, 'add_sent_report'):
-                        await db.add_sent_report(user_id, sent_message.message_id)
-                
-                await asyncio.sleep(0.05) 
+                        if sent_message:
+                            await _track_sent_report(user_id, sent_message.message_id, user_settings, auto_deletes)
+
+                except apihelper.ApiTelegramException as e:
+                    if "bot was blocked" in e.description or "user is deactivated" in e.description:
+                        user_uuids = await db.uuids(user_id)
+                        for u in user_uuids:
+                            await db.deactivate_uuid(u['id'])
+                    else:
+                        logger.error(f"SCHEDULER: API error for user {user_id}: {e}")
+                except Exception as e:
+                    logger.error(f"SCHEDULER: CRITICAL for user {user_id}: {e}", exc_info=True)
 
-            except apihelper.ApiTelegramException as e:
-                if "bot was blocked" in e.description or "user is deactivated" in e.description:
-                    user_uuids = await db.uuids(user_id)
-                    for u in user_uuids:
-                        await db.deactivate_uuid(u['id'])
-                else:
-                    logger.error(f"SCHEDULER: API error for user {user_id}: {e}")
-            except Exception as e:
-                logger.error(f"SCHEDULER: CRITICAL for user {user_id}: {e}", exc_info=True)
+            # حذف‌های خودکار هر دسته با یک INSERT
+            await timer_wheel.schedule_many(auto_deletes)
 
         logger.info("SCHEDULER (Async): ----- Finished nightly report job -----")
     except Exception as e:
@@ -279,47 +299,49 @@ async def weekly_report(bot, target_user_id: int = None) -> None:
             user_map_by_name[uname] = combined_handler._merge_users_runtime(u_list) if len(u_list) > 1 else u_list[0]
         # ----------------------------------------------------------
         
-        if target_user_id:
-            user_ids_to_process = [target_user_id]
-        else:
-            user_ids_to_process = [uid async for uid in db.get_all_user_ids()]
 
         separator = '\n' + '─' * 18 + '\n'
 
-        for user_id in user_ids_to_process:
-            try:
-                user_settings = await db.get_user_settings(user_id)
-                if not user_settings.get('weekly_reports', True) and not target_user_id:
-                    continue
+        async for user_ids_to_process in _user_id_batches(target_user_id):
+            # تنظیمات کاربران هر دسته با یک کوئری
+            settings_map = await db.get_settings_for_users(user_ids_to_process)
+            auto_deletes = []
+
+            for user_id in user_ids_to_process:
+                try:
+                    user_settings = settings_map[user_id]
+                    if not user_settings.get('weekly_reports', True) and not target_user_id:
+                        continue
 
-                user_uuids = await db.uuids(user_id)
+                    user_uuids = await db.uuids(user_id)
                 
-                user_infos = []
-                for u in user_uuids:
-                    uuid_str = str(u['uuid'])
+                    user_infos = []
+                    for u in user_uuids:
+                        uuid_str = str(u['uuid'])
                     
-                    # جستجوی دو مرحله‌ای
-                    data = user_map_by_uuid.get(uuid_str)
-                    if not data and u.get('name'):
-                         data = user_map_by_name.get(str(u['name']).lower())
+                        # جستجوی دو مرحله‌ای
+                        data = user_map_by_uuid.get(uuid_str)
+                        if not data and u.get('name'):
+                             data = user_map_by_name.get(str(u['name']).lower())
                     
-                    if data:
-                        user_infos.append(data)
+                        if data:
+                            user_infos.append(data)
                 
-                if user_infos:
-                    header = f"📊 *گزارش هفتگی* {escape_markdown('-')} {escape_markdown(now_str)}{separator}"
-                    lang_code = await db.get_user_language(user_id)
+                    if user_infos:
+                        header = _WEEKLY_HEADER.render(date=now_str) + separator
+                        lang_code = await db.get_user_language(user_id)
                     
-                    report_text = _fmt_user_weekly_report(user_infos, lang_code)
-                    final_message = header + report_text
+                        report_text = _fmt_user_weekly_report(user_infos, lang_code)
+                        final_message = header + report_text
                     
-                    sent_message = await bot.send_message(user_id, final_message, parse_mode="MarkdownV2")
-                    if sent_message and hasattr(db, 'add_sent_report'):
-                         await db.add_sent_report(user_id, sent_message.message_id)
-                await asyncio.sleep(0.05)
+                        sent_message = await bot.send_message(user_id, final_message, parse_mode="MarkdownV2")
+                        if sent_message:
+                            await _track_sent_report(user_id, sent_message.message_id, user_settings, auto_deletes)
 
-            except Exception as e:
-                logger.error(f"SCHEDULER (Weekly): Failure for user {user_id}: {e}")
+                except Exception as e:
+                    logger.error(f"SCHEDULER (Weekly): Failure for user {user_id}: {e}")
+
+            await timer_wheel.schedule_many(auto_deletes)
                 
     except Exception as e:
         logger.error(f"SCHEDULER (Async): Error in weekly_report: {e}", exc_info=True)
@@ -360,7 +382,7 @@ async def send_weekly_admin_summary(bot) -> None:
                     rank = i + 1
                     user_name = user.get('name')
                     usage_raw = user.get('total_usage', 0)
-                    formatted_usage = escape_markdown(f"{usage_raw:.2f} GB")
+                    formatted_usage = f"{usage_raw:.2f} GB"
                     
                     user_id = user_map.get(user_name)
 
@@ -374,12 +396,10 @@ async def send_weekly_admin_summary(bot) -> None:
                         elif rank == 5: key = "weekly_top_user_rank_5"
                         else: key = "weekly_top_user_rank_6_to_20"
                         
-                        template = get_string(key, lang_code)
-                        if template:
-                            format_args = {"usage": formatted_usage, "rank": rank}
-                            final_msg = template.format(**format_args)
-                            await send_warning_message(bot, user_id, final_msg, name=user_name)
-                            await asyncio.sleep(0.5)
+                        template = get_template(key, lang_code, markup=True)
+                        if template.source:
+                            final_msg = template.render(usage=formatted_usage, rank=rank)
+                            await send_warning_message(bot, user_id, final_msg)
 
                 except Exception as e:
                     logger.error(f"Failed to send weekly top user notification for rank {rank}: {e}")
@@ -410,19 +430,17 @@ async def send_monthly_satisfaction_survey(bot) -> None:
 
         logger.info("SCHEDULER: It's the last Shamsi Friday! Sending survey.")
         
-        user_ids = [uid async for uid in db.get_all_user_ids()]
-        
         menu = UserMainMenu()
         kb = await menu.feedback_rating_menu() 
 
         prompt = "🗓 *گزارش ماهانه*\n\nچقدر از عملکرد و پایداری سرویس ما در این ماه راضی بودید؟\n\nلطفاً با انتخاب ستاره‌ها، به ما امتیاز دهید:"
         
-        for uid in user_ids:
-            try:
-                await bot.send_message(uid, prompt, reply_markup=kb, parse_mode="Markdown")
-                await asyncio.sleep(0.05)
-            except Exception as e:
-                logger.warning(f"Failed to send feedback poll to user {uid}: {e}")
+        async for user_ids in db.iter_user_id_batches():
+            for uid in user_ids:
+                try:
+                    await bot.send_message(uid, prompt, reply_markup=kb, parse_mode="Markdown")
+                except Exception as e:
+                    logger.warning(f"Failed to send feedback poll to user {uid}: {e}")
 
     except Exception as e:
         logger.error(f"SCHEDULER (Async): Error in satisfaction_survey: {e}", exc_info=True)
\ No newline at end of file
@@ -15,6 +15,11 @@ from bot.keyboards.user import wallet as wallet_kb
 
 logger = logging.getLogger(__name__)
 
+# بزرگ‌ترین بازه تکرار هشدارها (ساعت)؛ لاگ هشدارها یک بار برای این بازه پیش‌خوانی می‌شود
+WARNING_LOOKBACK_HOURS = 168
+# کاربران دسته به دسته بررسی می‌شوند: رکوردهای هر دسته با یک کوئری لود و هشدارهای آن در پایان دسته ثبت می‌شوند
+WARNING_BATCH_SIZE = 200
+
 # --- شروع کدهای اضافه شده ---
 COUNTRY_TO_EMOJI = {
     'ir': '🇮🇷', 'fr': '🇫🇷', 'de': '🇩🇪', 'tr': '🇹🇷',
@@ -85,124 +90,156 @@ async def check_and_send_warnings(bot):
         logger.info("No users found in cache/combined handler.")
         return
 
-    for user in all_users:
-        try:
-            uuid = user.get('uuid')
-            if not uuid: continue
-
-            db_user = await db.get_bot_user_by_uuid(uuid)
-            if not db_user or not db_user.get('user_id'):
-                continue 
+    # تنظیمات همه کاربران دارای سرویس فعال با یک کوئری
+    uuid_user_map = await db.get_uuid_to_user_id_map()
+    settings_map = await db.get_settings_for_users(list(set(uuid_user_map.values())))
+
+    # وضعیت هشدارهای اخیر با یک کوئری؛ هشدارهای جدید در پایان هر دسته به صورت گروهی ثبت می‌شوند
+    # تا توقف جاب در میانه اجرا باعث ارسال دوباره همه هشدارها نشود
+    recent_warnings = await db.get_recent_warnings(hours=WARNING_LOOKBACK_HOURS)
+    sent_warnings = []
+    logged = 0
+    now_utc = datetime.now(pytz.utc)
+
+    def has_recent_warning(uuid_id, warning_type, hours):
+        sent_at = recent_warnings.get((uuid_id, warning_type))
+        return sent_at is not None and sent_at >= now_utc - timedelta(hours=hours)
+
+    def log_warning(uuid_id, warning_type):
+        recent_warnings[(uuid_id, warning_type)] = now_utc
+        sent_warnings.append((uuid_id, warning_type))
+
+    for batch_start in range(0, len(all_users), WARNING_BATCH_SIZE):
+        batch = all_users[batch_start:batch_start + WARNING_BATCH_SIZE]
+        # رکورد UUID، مالک و پنل‌های مجاز همه کاربران دسته با یک کوئری
+        records = await db.get_uuid_records_map([u.get('uuid') for u in batch])
+
+        for user in batch:
+            try:
+                uuid = user.get('uuid')
+                if not uuid: continue
+
+                record = records.get(str(uuid).lower())
+                if not record or not record.user_id:
+                    continue
 
-            telegram_id = db_user['user_id']
-            uuid_id_in_db = await db.get_uuid_id_by_uuid(uuid)
+                telegram_id = record.user_id
+                uuid_id_in_db = record.id
             
-            user_settings = await db.get_user_settings(telegram_id)
-            if not user_settings.get('expiry_warnings', True):
-                continue
+                user_settings = settings_map.get(telegram_id) or await db.get_user_settings(telegram_id)
+                if not user_settings.get('expiry_warnings', True):
+                    continue
 
-            # دریافت پرچم و نام سرور
-            flags = get_dynamic_flags_for_user(await db.get_user_uuid_record(uuid), None)
-            server_display_name = f"سرور {flags}"
+                # دریافت پرچم و نام سرور
+                flags = get_dynamic_flags_for_user(record, None)
+                server_display_name = f"سرور {flags}"
 
-            # محاسبات حجم و زمان
-            remaining_bytes = (user.get('usage_limit_GB', 0) * 1024**3) - (user.get('current_usage_GB', 0) * 1024**3)
-            remaining_gb = bytes_to_gb(remaining_bytes)
+                # محاسبات حجم و زمان
+                remaining_bytes = (user.get('usage_limit_GB', 0) * 1024**3) - (user.get('current_usage_GB', 0) * 1024**3)
+                remaining_gb = bytes_to_gb(remaining_bytes)
             
-            expire_ts = float(user.get('expire') or 0)
-            days_left = -999
-            if expire_ts > 0:
-                days_left = (datetime.fromtimestamp(expire_ts) - datetime.now()).days
-
-            # ====================================================
-            # 4. هشدار اتمام حجم + هدیه اضطراری
-            # ====================================================
-            if 0 < remaining_gb < 0.2 and user.get('enable'):
-                if not await db.has_recent_warning(uuid_id_in_db, 'volume_depleted', hours=72):
+                expire_ts = float(user.get('expire') or 0)
+                days_left = -999
+                if expire_ts > 0:
+                    days_left = (datetime.fromtimestamp(expire_ts) - datetime.now()).days
+
+                # ====================================================
+                # 4. هشدار اتمام حجم + هدیه اضطراری
+                # ====================================================
+                if 0 < remaining_gb < 0.2 and user.get('enable'):
+                    if not has_recent_warning(uuid_id_in_db, 'volume_depleted', hours=72):
                     
-                    add_success = await user_modifier.add_traffic(uuid, EMERGENCY_GB)
+                        add_success = await user_modifier.add_traffic(uuid, EMERGENCY_GB)
                     
-                    if add_success:
+                        if add_success:
+                            # حجم هدیه داده شد؛ ثبت فوری (حتی اگر ارسال پیام ناموفق باشد) تا در اجرای بعدی دوباره داده نشود
+                            recent_warnings[(uuid_id_in_db, 'volume_depleted')] = now_utc
+                            logged += await db.log_warnings_bulk([(uuid_id_in_db, 'volume_depleted')])
+                            msg = (
+                                f"🔴 *اتمام حجم*\n\n"
+                                f"حجم سرویس شما در *{escape_markdown(server_display_name)}* به پایان رسیده بود\\.\n\n"
+                                f"🎁 *{EMERGENCY_GB} گیگابایت* حجم اضطراری برای شما فعال شد تا بتوانید به راحتی سرویس خود را تمدید کنید\\."
+                            )
+                            kb = types.InlineKeyboardMarkup()
+                            kb.add(types.InlineKeyboardButton("🔄 تمدید سرویس", callback_data=f"wallet:renew:{uuid}"))
+                        
+                            await send_warning_message(bot, telegram_id, msg, kb)
+                            logger.info(f"Emergency volume ({EMERGENCY_GB}GB) given to {uuid}")
+                        continue
+
+                # ====================================================
+                # 3.5. هشدار منقضی شده
+                # ====================================================
+                if days_left <= 0 and expire_ts > 0:
+                    if not has_recent_warning(uuid_id_in_db, 'expired', hours=120):
                         msg = (
-                            f"🔴 *اتمام حجم*\n\n"
-                            f"حجم سرویس شما در *{escape_markdown(server_display_name)}* به پایان رسیده بود\\.\n\n"
-                            f"🎁 *{EMERGENCY_GB} گیگابایت* حجم اضطراری برای شما فعال شد تا بتوانید به راحتی سرویس خود را تمدید کنید\\."
+                            f"❌ *سرویس منقضی شد*\n\n"
+                            f"مشترک گرامی، مهلت سرویس *{escape_markdown(server_display_name)}* شما به پایان رسیده است\\.\n"
+                            f"جهت جلوگیری از حذف سرویس، لطفا نسبت به تمدید اقدام کنید\\."
                         )
                         kb = types.InlineKeyboardMarkup()
-                        kb.add(types.InlineKeyboardButton("🔄 تمدید سرویس", callback_data=f"wallet:renew:{uuid}"))
-                        
+                        kb.add(types.InlineKeyboardButton("🔄 تمدید فوری", callback_data=f"wallet:renew:{uuid}"))
+                    
                         if await send_warning_message(bot, telegram_id, msg, kb):
-                            await db.log_warning(uuid_id_in_db, 'volume_depleted')
-                            logger.info(f"Emergency volume ({EMERGENCY_GB}GB) given to {uuid}")
+                            log_warning(uuid_id_in_db, 'expired')
                     continue
 
-            # ====================================================
-            # 3.5. هشدار منقضی شده
-            # ====================================================
-            if days_left <= 0 and expire_ts > 0:
-                if not await db.has_recent_warning(uuid_id_in_db, 'expired', hours=120):
-                    msg = (
-                        f"❌ *سرویس منقضی شد*\n\n"
-                        f"مشترک گرامی، مهلت سرویس *{escape_markdown(server_display_name)}* شما به پایان رسیده است\\.\n"
-                        f"جهت جلوگیری از حذف سرویس، لطفا نسبت به تمدید اقدام کنید\\."
-                    )
-                    kb = types.InlineKeyboardMarkup()
-                    kb.add(types.InlineKeyboardButton("🔄 تمدید فوری", callback_data=f"wallet:renew:{uuid}"))
+                # ====================================================
+                # 3. هشدار انقضای نزدیک
+                # ====================================================
+                if 0 <= days_left <= WARNING_DAYS:
+                    if not has_recent_warning(uuid_id_in_db, f'expiry_{days_left}d', hours=20):
                     
-                    if await send_warning_message(bot, telegram_id, msg, kb):
-                        await db.log_warning(uuid_id_in_db, 'expired')
-                continue
-
-            # ====================================================
-            # 3. هشدار انقضای نزدیک
-            # ====================================================
-            if 0 <= days_left <= WARNING_DAYS:
-                if not await db.has_recent_warning(uuid_id_in_db, f'expiry_{days_left}d', hours=20):
-                    
-                    status_color = "🟠" if days_left > 1 else "🔴"
-                    msg = (
-                        f"{status_color} *یادآوری تمدید*\n\n"
-                        f"تنها *{days_left} روز* از اعتبار سرویس *{escape_markdown(server_display_name)}* باقی مانده است\\.\n"
-                        f"پیشنهاد می‌کنیم پیش از قطعی، سرویس خود را تمدید کنید\\."
-                    )
-                    kb = types.InlineKeyboardMarkup()
-                    kb.add(types.InlineKeyboardButton("💳 تمدید آنلاین", callback_data=f"wallet:renew:{uuid}"))
+                        status_color = "🟠" if days_left > 1 else "🔴"
+                        msg = (
+                            f"{status_color} *یادآوری تمدید*\n\n"
+                            f"تنها *{days_left} روز* از اعتبار سرویس *{escape_markdown(server_display_name)}* باقی مانده است\\.\n"
+                            f"پیشنهاد می‌کنیم پیش از قطعی، سرویس خود را تمدید کنید\\."
+                        )
+                        kb = types.InlineKeyboardMarkup()
+                        kb.add(types.InlineKeyboardButton("💳 تمدید آنلاین", callback_data=f"wallet:renew:{uuid}"))
                     
-                    if await send_warning_message(bot, telegram_id, msg, kb):
-                        await db.log_warning(uuid_id_in_db, f'expiry_{days_left}d')
-                continue
+                        if await send_warning_message(bot, telegram_id, msg, kb):
+                            log_warning(uuid_id_in_db, f'expiry_{days_left}d')
+                    continue
 
-            # ====================================================
-            # 5. پیام عدم فعالیت
-            # ====================================================
-            last_seen_str = user.get('last_online')
-            if last_seen_str and remaining_gb > 1:
-                try:
-                    if 'T' in str(last_seen_str):
-                        last_seen_dt = datetime.fromisoformat(str(last_seen_str).replace('Z', ''))
-                    else:
-                        last_seen_dt = datetime.utcfromtimestamp(float(last_seen_str))
+                # ====================================================
+                # 5. پیام عدم فعالیت
+                # ====================================================
+                last_seen_str = user.get('last_online')
+                if last_seen_str and remaining_gb > 1:
+                    try:
+                        if 'T' in str(last_seen_str):
+                            last_seen_dt = datetime.fromisoformat(str(last_seen_str).replace('Z', ''))
+                        else:
+                            last_seen_dt = datetime.utcfromtimestamp(float(last_seen_str))
                     
-                    days_inactive = (datetime.utcnow() - last_seen_dt).days
+                        days_inactive = (datetime.utcnow() - last_seen_dt).days
                     
-                    if days_inactive >= INACTIVE_DAYS:
-                        if not await db.has_recent_warning(uuid_id_in_db, 'inactive_reminder', hours=168):
-                            msg = (
-                                f"👋 *دلمون برات تنگ شده\\!*\n\n"
-                                f"چند وقته از سرویس *{escape_markdown(server_display_name)}* استفاده نکردی\\.\n"
-                                f"همه چیز مرتبه؟ اگر مشکلی در اتصال داری، به پشتیبانی پیام بده\\."
-                            )
-                            kb = types.InlineKeyboardMarkup()
-                            kb.add(types.InlineKeyboardButton("🚑 پشتیبانی", callback_data="main:support"))
-                            kb.add(types.InlineKeyboardButton("آموزش اتصال", callback_data="main:tutorials"))
-
-                            if await send_warning_message(bot, telegram_id, msg, kb):
-                                await db.log_warning(uuid_id_in_db, 'inactive_reminder')
-
-                except Exception as e:
-                    logger.debug(f"Date error inactive check: {e}")
+                        if days_inactive >= INACTIVE_DAYS:
+                            if not has_recent_warning(uuid_id_in_db, 'inactive_reminder', hours=168):
+                                msg = (
+                                    f"👋 *دلمون برات تنگ شده\\!*\n\n"
+                                    f"چند وقته از سرویس *{escape_markdown(server_display_name)}* استفاده نکردی\\.\n"
+                                    f"همه چیز مرتبه؟ اگر مشکلی در اتصال داری، به پشتیبانی پیام بده\\."
+                                )
+                                kb = types.InlineKeyboardMarkup()
+                                kb.add(types.InlineKeyboardButton("🚑 پشتیبانی", callback_data="main:support"))
+                                kb.add(types.InlineKeyboardButton("آموزش اتصال", callback_data="main:tutorials"))
+
+                                if await send_warning_message(bot, telegram_id, msg, kb):
+                                    log_warning(uuid_id_in_db, 'inactive_reminder')
+
+                    except Exception as e:
+                        logger.debug(f"Date error inactive check: {e}")
+
+            except Exception as e:
+                logger.error(f"Error processing user {user.get('name')}: {e}")
 
+        try:
+            logged += await db.log_warnings_bulk(sent_warnings)
         except Exception as e:
-            logger.error(f"Error processing user {user.get('name')}: {e}")
+            logger.error(f"Failed to log sent warnings: {e}", exc_info=True)
+        sent_warnings.clear()
 
-    logger.info("Warnings check job finished.")
\ No newline at end of file
+    logger.info(f"Warnings check job finished ({logged} warnings logged).")
@@ -3,7 +3,7 @@
 import logging
 import uuid as uuid_lib
 from sqlalchemy import select, or_, update
-from sqlalchemy.orm import selectinload
+from bot.db.loaders import loader
 
 from bot.database import db
 from bot.db.base import User, UserUUID, Panel, PanelNode, ServerCategory
@@ -26,7 +26,7 @@ class AdminUserService:
     async def search_users(self, query: str, search_type: str = 'global'):
         """جستجوی کاربر بر اساس کوئری"""
         async with db.get_session() as session:
-            stmt = select(User).distinct().options(selectinload(User.uuids))
+            stmt = select(User).distinct().options(*loader('user_uuids'))
             
             if search_type == 'telegram_id':
                 if not query.isdigit(): return []
@@ -248,7 +248,7 @@ class AdminUserService:
     async def get_node_access_matrix(self, user_id: int):
         """دریافت ماتریس دسترسی کاربر به پنل‌ها و نودها"""
         async with db.get_session() as session:
-            stmt_user = select(UserUUID).options(selectinload(UserUUID.allowed_panels)).where(UserUUID.user_id == user_id).limit(1)
+            stmt_user = select(UserUUID).options(*loader('uuid_panels')).where(UserUUID.user_id == user_id).limit(1)
             res = await session.execute(stmt_user)
             user_uuid = res.scalar_one_or_none()
             if not user_uuid: return None
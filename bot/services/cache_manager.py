@@ -8,16 +8,18 @@ from bot.services import user_aggregator
 logger = logging.getLogger(__name__)
 
 _cached_data = []
+_by_uuid = {}
 _is_updating = False
 last_sync_time = None
 
 async def fetch_and_update_cache():
-    global _cached_data, _is_updating, last_sync_time
+    global _cached_data, _by_uuid, _is_updating, last_sync_time
     if _is_updating: return
     _is_updating = True
     try:
         logger.info("♻️ Cache: Syncing from panels...")
         _cached_data = await user_aggregator.fetch_all_users_from_panels()
+        _by_uuid = {str(u['uuid']).lower(): u for u in _cached_data if u.get('uuid')}
         last_sync_time = datetime.now()
         logger.info(f"✅ Cache Updated. Total Users: {len(_cached_data)}")
     except Exception as e:
@@ -30,6 +32,12 @@ async def get_data():
         await fetch_and_update_cache()
     return _cached_data
 
+async def get_by_uuid() -> dict:
+    """ایندکس کش بر اساس UUID (برای جستجوی O(1) بدون پیمایش کل لیست)"""
+    if not _cached_data:
+        await fetch_and_update_cache()
+    return _by_uuid
+
 async def sync_task():
     while True:
         await fetch_and_update_cache()
@@ -2,7 +2,7 @@
 import time
 import asyncio
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from bot.db.loaders import loader
 from bot.database import db
 from bot.db.base import ServerCategory, Panel, PanelNode, UserUUID, User
 
@@ -73,7 +73,7 @@ class ContextService:
         
         async with db.get_session() as session:
             # دریافت UUID و پنل‌های مجاز
-            stmt = select(UserUUID).where(UserUUID.uuid == uuid_str).options(selectinload(UserUUID.allowed_panels))
+            stmt = select(UserUUID).where(UserUUID.uuid == uuid_str).options(*loader('uuid_panels'))
             result = await session.execute(stmt)
             user_uuid_obj = result.scalar_one_or_none()
 
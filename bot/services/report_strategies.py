@@ -3,11 +3,16 @@
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, func, and_, or_, String, desc
-from sqlalchemy.orm import Session, selectinload
+from typing import Optional
+from sqlalchemy import select, func, and_, or_, String, case, cast, Integer
+from sqlalchemy.orm import Session
 
 # ایمپورت‌های پروژه شما
-from bot.db.base import User, UserUUID, UsageSnapshot, Panel, WalletTransaction, ClientUserAgent
+from bot.db.base import User, UserUUID, Panel, WalletTransaction, ClientUserAgent
+from bot.db.cache import LRUCache
+from bot.db.loaders import loader
+from bot.db.pagination import keyset_fetch, paginate_list
+from bot.database import db
 from bot.db import queries
 from bot.utils.date_helpers import to_shamsi, format_relative_time, days_until_next_birthday
 from bot.utils.formatters import escape_markdown
@@ -18,31 +23,52 @@ logger = logging.getLogger(__name__)
 LRM = "\u200e"
 RLM = "\u200f"
 
+# لیست کاربران هر پنل برای ورق زدن صفحات کوتاه‌مدت نگه داشته می‌شود تا هر صفحه دوباره از API خوانده نشود
+PANEL_LIST_TTL = 60
+_panel_lists = LRUCache(maxsize=64, ttl=PANEL_LIST_TTL)
+
+
 class ReportStrategy(ABC):
     """کلاس پایه برای تمام گزارش‌ها"""
     @abstractmethod
-    async def generate(self, session: Session, params: list, offset: int, limit: int) -> tuple[list, int, str]:
+    async def generate(self, session: Session, params: list, cursor: Optional[str], limit: int,
+                       page: int = 0) -> tuple[list, int, str, dict]:
         """
-        خروجی: (لیست آیتم‌های فرمت شده، تعداد کل، عنوان گزارش)
+        cursor: توکن صفحه (bot.db.pagination) یا None برای صفحه اول؛ page فقط برای شماره‌گذاری ردیف‌ها.
+        خروجی: (لیست آیتم‌های فرمت شده، تعداد کل، عنوان گزارش، {'next': توکن، 'prev': توکن})
         """
         pass
 
+
+def _nav(result: dict) -> dict:
+    return {'next': result['next'], 'prev': result['prev']}
+
 # =========================================================
 # استراتژی‌های مبتنی بر پنل (Panel Based)
 # =========================================================
 
 class BasePanelStrategy(ReportStrategy):
     """کلاس والد برای گزارش‌های مربوط به پنل جهت جلوگیری از تکرار کد"""
-    
+
+    # نام لیست در کش و فیلتر کاربران؛ در کلاس‌های فرزند مقداردهی می‌شود
+    list_name = 'all'
+
+    def filter_users(self, users: list) -> list:
+        return users
+
     async def _fetch_and_parse_users(self, session, panel_id):
         """دریافت کاربران از پنل و پردازش اولیه"""
         panel_obj = await session.get(Panel, panel_id)
         if not panel_obj:
             raise ValueError("Panel not found")
 
-        panel_service = await PanelFactory.get_panel(panel_obj.name)
-        all_users = await panel_service.get_all_users()
-        
+        try:
+            panel_service = await PanelFactory.get_panel(panel_obj.name)
+            all_users = await panel_service.get_all_users()
+        except Exception as e:
+            logger.error(f"Failed to fetch users from panel {panel_obj.name}: {e}")
+            return [], panel_obj
+
         parsed_users = []
         for u in all_users:
             # استانداردسازی زمان اتصال
@@ -56,22 +82,36 @@ class BasePanelStrategy(ReportStrategy):
                         clean_time = last_seen_raw.replace('Z', '').split('.')[0]
                         last_seen_dt = datetime.fromisoformat(clean_time)
                 except: pass
-            
+
             u['_parsed_last_seen'] = last_seen_dt
             u['_used_bytes'] = u.get('used_traffic') or (u.get('current_usage_GB', 0) * 1024**3)
             u['_limit_bytes'] = u.get('transfer_enable') or (u.get('usage_limit_GB', 0) * 1024**3)
             parsed_users.append(u)
-            
+
         return parsed_users, panel_obj
 
+    async def _page_users(self, session, panel_id, cursor, limit):
+        """
+        صفحه‌ای از کاربران فیلتر شده پنل. لیست فیلتر شده برای PANEL_LIST_TTL ثانیه کش می‌شود؛
+        صفحه اول (بدون cursor) همیشه لیست تازه از پنل می‌گیرد.
+        """
+        key = (self.list_name, panel_id)
+        cached = _panel_lists.get(key) if cursor else None
+        if cached is None:
+            users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
+            cached = (self.filter_users(users), panel_obj.name)
+            _panel_lists.set(key, cached)
+        filtered, panel_name = cached
+        return paginate_list(filtered, cursor, limit), len(filtered), panel_name
+
     async def _enrich_with_db_info(self, session, users_list, panel_id):
         """افزودن اطلاعات تلگرام (لینک پروفایل) به لیست کاربران پنل"""
         idents = [u.get('uuid') or u.get('username') for u in users_list]
         idents = [i for i in idents if i]
-        
+
         telegram_map = {}
         db_id_map = {} # map ident -> db_id (for usage calculation)
-        
+
         if idents:
             stmt = select(UserUUID).where(
                 and_(
@@ -81,10 +121,16 @@ class BasePanelStrategy(ReportStrategy):
             )
             db_users = (await session.execute(stmt)).scalars().all()
             for du in db_users:
-                key = str(du.uuid) if du.uuid else du.name
-                if du.user_id: telegram_map[key] = du.user_id
-                db_id_map[key] = du.id
-                
+                key_uuid = str(du.uuid) if du.uuid else None
+                key_name = du.name
+
+                if du.user_id:
+                    if key_uuid: telegram_map[key_uuid] = du.user_id
+                    if key_name: telegram_map[key_name] = du.user_id
+
+                if key_uuid: db_id_map[key_uuid] = du.id
+                if key_name: db_id_map[key_name] = du.id
+
         return telegram_map, db_id_map
 
     def _format_user_line(self, user, display_name, telegram_id=None):
@@ -96,37 +142,31 @@ class BasePanelStrategy(ReportStrategy):
         return name_esc
 
 class OnlineUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
+    list_name = 'online'
+
+    def filter_users(self, users):
         # فیلتر آنلاین‌ها (۳ دقیقه اخیر)
         window = timedelta(minutes=3)
         now_utc = datetime.utcnow()
-        filtered = [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
-        
-        # دریافت اطلاعات تکمیلی
-        tg_map, db_id_map = await self._enrich_with_db_info(session, filtered, panel_id)
-        
-        # محاسبه مصرف امروز (فقط برای آنلاین‌ها)
+        return [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
+
+    async def generate(self, session, params, cursor, limit, page=0):
+        panel_id = int(params[1])
+        result, total_count, panel_name = await self._page_users(session, panel_id, cursor, limit)
+        paged_users = result['rows']
+
+        # دریافت اطلاعات تکمیلی (فقط برای کاربران همین صفحه)
+        tg_map, db_id_map = await self._enrich_with_db_info(session, paged_users, panel_id)
+
+        # محاسبه مصرف امروز
         daily_usage = {}
         if db_id_map:
             start_of_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            snap_stmt = select(UsageSnapshot).where(
-                and_(
-                    UsageSnapshot.uuid_id.in_(list(db_id_map.values())),
-                    UsageSnapshot.taken_at >= start_of_day
-                )
-            )
-            snapshots = (await session.execute(snap_stmt)).scalars().all()
-            
-            first_usage_today = {}
-            for snap in snapshots:
-                if snap.uuid_id not in first_usage_today:
-                    total_gb = (snap.hiddify_usage_gb or 0) + (snap.marzban_usage_gb or 0)
-                    first_usage_today[snap.uuid_id] = total_gb * (1024**3)
-
-            for u in filtered:
+            # وضعیت شمارنده‌ها در ابتدای روز (آخرین اسنپ‌شات قبل از آن، یا اولین اسنپ‌شات امروز)
+            start_snaps = await db.get_start_snapshots(list(db_id_map.values()), start_of_day, panel_id=panel_id)
+            first_usage_today = {uuid_id: snap[panel_id] for uuid_id, snap in start_snaps.items()}
+
+            for u in paged_users:
                 ident = u.get('uuid') or u.get('username')
                 if ident and ident in db_id_map:
                     db_id = db_id_map[ident]
@@ -134,67 +174,66 @@ class OnlineUsersStrategy(BasePanelStrategy):
                         daily = u['_used_bytes'] - first_usage_today[db_id]
                         daily_usage[ident] = max(0, daily)
 
-        # صفحه‌بندی
-        total_count = len(filtered)
-        paged_users = filtered[offset : offset + limit]
-        
         items = []
         for u in paged_users:
             ident = u.get('uuid') or u.get('username')
             name = u.get('username') or u.get('name') or "No Name"
             link = self._format_user_line(u, name, tg_map.get(ident))
-            
+
             # فرمت مصرف
             usage_bytes = daily_usage.get(ident, 0)
             usage_str = f"{usage_bytes / (1024**3):.2f} GB" if usage_bytes >= 0.01 * (1024**3) else f"{usage_bytes / (1024**2):.0f} MB"
-            
+
             # روزهای مانده
             days_str = "?"
             try:
                 if 'remaining_days' in u and u['remaining_days'] is not None:
                     days_str = f"{int(u['remaining_days'])}d"
                 elif 'expire' in u and u['expire']:
-                    rem = int((float(u['expire']) - datetime.now().timestamp()) / 86400)
-                    days_str = f"{rem}d" if rem >= 0 else "Exp"
+                    ts = float(u['expire'])
+                    if ts > 0:
+                        rem = int((ts - datetime.now().timestamp()) / 86400)
+                        days_str = f"{rem}d" if rem >= 0 else "Exp"
+                    else:
+                        days_str = "∞"
             except: pass
 
             items.append(f"• {link} \| `{escape_markdown(usage_str)}` \| `{escape_markdown(days_str)}`")
 
-        return items, total_count, f"⚡️ *{escape_markdown(f'کاربران آنلاین ({panel_obj.name})')}*"
+        return items, total_count, f"⚡️ *{escape_markdown(f'کاربران آنلاین ({panel_name})')}*", _nav(result)
 
 class ActiveUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
+    list_name = 'active'
+
+    def filter_users(self, users):
         # فعال (۲۴ ساعت اخیر)
         window = timedelta(hours=24)
         now_utc = datetime.utcnow()
-        filtered = [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
-        
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
+        return [u for u in users if u['_parsed_last_seen'] and (now_utc - u['_parsed_last_seen']) < window]
+
+    async def generate(self, session, params, cursor, limit, page=0):
+        panel_id = int(params[1])
+        result, total_count, panel_name = await self._page_users(session, panel_id, cursor, limit)
+
+        tg_map, _ = await self._enrich_with_db_info(session, result['rows'], panel_id)
         items = []
-        
-        for u in paged:
+
+        for u in result['rows']:
             ident = u.get('uuid') or u.get('username')
             name = u.get('username') or u.get('name') or "No Name"
             link = self._format_user_line(u, name, tg_map.get(ident))
-            
+
             last_seen = to_shamsi(u['_parsed_last_seen'])
             percent = int((u['_used_bytes'] / u['_limit_bytes']) * 100) if u['_limit_bytes'] > 0 else 0
-            
+
             items.append(f"• {link}{LRM} \| {RLM}{escape_markdown(last_seen)} {RLM}\| {RLM}`{percent}%`")
-            
-        return items, total_count, f"✅ *{escape_markdown(f'کاربران فعال ({panel_obj.name})')}*"
+
+        return items, total_count, f"✅ *{escape_markdown(f'کاربران فعال ({panel_name})')}*", _nav(result)
 
 class InactiveUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
-        panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
+    list_name = 'inactive'
+
+    def filter_users(self, users):
         # غیرفعال (بین ۱ تا ۷ روز پیش)
         now = datetime.utcnow()
         filtered = []
@@ -204,66 +243,67 @@ class InactiveUsersStrategy(BasePanelStrategy):
                 diff = now - dt
                 if timedelta(days=1) <= diff < timedelta(days=7):
                     filtered.append(u)
+        return filtered
+
+    async def generate(self, session, params, cursor, limit, page=0):
+        panel_id = int(params[1])
+        result, total_count, panel_name = await self._page_users(session, panel_id, cursor, limit)
 
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
+        tg_map, _ = await self._enrich_with_db_info(session, result['rows'], panel_id)
         items = []
 
-        for u in paged:
+        for u in result['rows']:
             ident = u.get('uuid') or u.get('username')
             name = u.get('username') or u.get('name') or "No Name"
             link = self._format_user_line(u, name, tg_map.get(ident))
             time_ago = format_relative_time(u['_parsed_last_seen'])
-            
+
             items.append(f"• {link}{LRM} \| {RLM}{escape_markdown(time_ago)}")
-            
-        return items, total_count, f"⏳ *{escape_markdown(f'کاربران غیرفعال ({panel_obj.name})')}*"
+
+        return items, total_count, f"⏳ *{escape_markdown(f'کاربران غیرفعال ({panel_name})')}*", _nav(result)
 
 class NeverConnectedStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
+    list_name = 'never'
+
+    def filter_users(self, users):
+        return [u for u in users if not u['_parsed_last_seen'] or u['_used_bytes'] == 0]
+
+    async def generate(self, session, params, cursor, limit, page=0):
         panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        filtered = [u for u in users if not u['_parsed_last_seen'] or u['_used_bytes'] == 0]
-        
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
+        result, total_count, panel_name = await self._page_users(session, panel_id, cursor, limit)
+
+        tg_map, _ = await self._enrich_with_db_info(session, result['rows'], panel_id)
         items = []
 
-        for u in paged:
+        for u in result['rows']:
             ident = u.get('uuid') or u.get('username')
             name = u.get('username') or u.get('name') or "No Name"
             link = self._format_user_line(u, name, tg_map.get(ident))
-            
+
             limit_gb = u.get('_limit_bytes', 0) / (1024**3)
             limit_str = f"{limit_gb:.0f}GB" if limit_gb.is_integer() else f"{limit_gb:.1f}GB"
-            
+
             items.append(f"• {link}{LRM} \| `0/{limit_str}`")
-            
-        return items, total_count, f"🚫 *{escape_markdown(f'هرگز متصل نشده ({panel_obj.name})')}*"
+
+        return items, total_count, f"🚫 *{escape_markdown(f'هرگز متصل نشده ({panel_name})')}*", _nav(result)
 
 class PanelUsersStrategy(BasePanelStrategy):
-    async def generate(self, session, params, offset, limit):
+    list_name = 'all'
+
+    async def generate(self, session, params, cursor, limit, page=0):
         panel_id = int(params[1])
-        users, panel_obj = await self._fetch_and_parse_users(session, panel_id)
-        
-        # همه کاربران
-        filtered = users
-        
-        tg_map, _ = await self._enrich_with_db_info(session, filtered, panel_id)
-        total_count = len(filtered)
-        paged = filtered[offset : offset + limit]
+        result, total_count, panel_name = await self._page_users(session, panel_id, cursor, limit)
+
+        tg_map, _ = await self._enrich_with_db_info(session, result['rows'], panel_id)
         items = []
 
-        for u in paged:
+        for u in result['rows']:
             ident = u.get('uuid') or u.get('username')
             name = u.get('username') or u.get('name') or "No Name"
             link = self._format_user_line(u, name, tg_map.get(ident))
             items.append(f"• {link}")
-            
-        return items, total_count, f"👥 *{escape_markdown(f'همه کاربران پنل {panel_obj.name}')}*"
+
+        return items, total_count, f"👥 *{escape_markdown(f'همه کاربران پنل {panel_name}')}*", _nav(result)
 
 
 # =========================================================
@@ -271,149 +311,153 @@ class PanelUsersStrategy(BasePanelStrategy):
 # =========================================================
 
 class BirthdayStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(User).where(User.birthday.isnot(None))
-        result = await session.execute(stmt)
-        users = result.scalars().all()
-        
-        # سورت پایتونی
-        users_sorted = sorted(users, key=lambda u: days_until_next_birthday(u.birthday) if u.birthday else 999)
-        total_count = len(users_sorted)
-        paged = users_sorted[offset : offset + limit]
-        
+    async def generate(self, session, params, cursor, limit, page=0):
+        # ترتیب «نزدیک‌ترین تولد» در خود SQL: اول تولدهای باقیمانده امسال، سپس سال بعد
+        today = datetime.now().date()
+        month_day = cast(func.extract('month', User.birthday) * 100 + func.extract('day', User.birthday), Integer)
+        passed = case((month_day < today.month * 100 + today.day, 1), else_=0)
+
+        stmt = select(User, passed.label('passed'), month_day.label('month_day')).where(User.birthday.isnot(None))
+        total_count = await session.scalar(select(func.count(User.user_id)).where(User.birthday.isnot(None))) or 0
+
+        result = await keyset_fetch(
+            session, stmt, [passed, month_day, User.user_id], cursor, limit,
+            key_of=lambda r: (r.passed, r.month_day, r.User.user_id), descending=False
+        )
+
         items = []
-        for user in paged:
+        for row in result['rows']:
+            user = row.User
             name = escape_markdown((user.first_name or 'ناشناس').replace('|', ''))
             shamsi = to_shamsi(user.birthday)
             rem = days_until_next_birthday(user.birthday)
-            days_str = "امروز! 🎉" if rem == 0 else f"{rem} روز"
-            
+
+            if rem == 0: days_str = "امروز! 🎉"
+            elif rem is not None: days_str = f"{rem} روز"
+            else: days_str = "نامشخص"
+
             items.append(f"🎂 {name} \| {shamsi} \| {escape_markdown(days_str)}")
-            
-        return items, total_count, f"🎂 *{escape_markdown('لیست تولد کاربران')}*"
+
+        return items, total_count, f"🎂 *{escape_markdown('لیست تولد کاربران')}*", _nav(result)
 
 class PlanReportStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
+    async def generate(self, session, params, cursor, limit, page=0):
         plan_id = int(params[1])
         stmt = queries.get_users_by_plan_query(plan_id)
-        
+
         # شمارش
         count_stmt = select(func.count()).select_from(stmt.subquery())
         total_count = await session.scalar(count_stmt) or 0
-        
+
         # دریافت دیتا
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        users = result.scalars().all()
-        
+        result = await keyset_fetch(session, stmt, [User.user_id], cursor, limit,
+                                    key_of=lambda u: (u.user_id,), scalars=True)
+
         items = []
-        for user in users:
+        for user in result['rows']:
             name = escape_markdown(user.first_name or "بدون نام")
             link = f"[{name}](tg://user?id={user.user_id})"
             items.append(f"• {link}{LRM} \(`{user.user_id}`\)")
-            
-        return items, total_count, f"📊 *{escape_markdown('گزارش بر اساس پلن')}*"
+
+        return items, total_count, f"📊 *{escape_markdown('گزارش بر اساس پلن')}*", _nav(result)
 
 class BotUsersStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(User).order_by(User.user_id.desc())
-        
+    async def generate(self, session, params, cursor, limit, page=0):
         count_stmt = select(func.count(User.user_id))
-        total_count = await session.scalar(count_stmt)
-        
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        users = result.scalars().all()
-        
+        total_count = await session.scalar(count_stmt) or 0
+
+        result = await keyset_fetch(session, select(User), [User.user_id], cursor, limit,
+                                    key_of=lambda u: (u.user_id,), scalars=True)
+
         items = []
-        for user in users:
+        for user in result['rows']:
             name = escape_markdown(user.first_name or "بدون نام")
             link = f"[{name}](tg://user?id={user.user_id})"
             items.append(f"• {link}{LRM} \(`{user.user_id}`\)")
-            
-        return items, total_count, f"👥 *{escape_markdown('کل کاربران ربات')}*"
+
+        return items, total_count, f"👥 *{escape_markdown('کل کاربران ربات')}*", _nav(result)
 
 class WalletBalancesStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(User).where(User.wallet_balance > 0).order_by(desc(User.wallet_balance))
-        
+    async def generate(self, session, params, cursor, limit, page=0):
+        stmt = select(User).where(User.wallet_balance > 0)
+
         total_stmt = select(func.sum(User.wallet_balance)).where(User.wallet_balance > 0)
         total_balance = await session.scalar(total_stmt) or 0
-        
+
         count_stmt = select(func.count(User.user_id)).where(User.wallet_balance > 0)
         total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        users = result.scalars().all()
-        
+
+        result = await keyset_fetch(session, stmt, [User.wallet_balance, User.user_id], cursor, limit,
+                                    key_of=lambda u: (u.wallet_balance, u.user_id), scalars=True)
+
         items = []
-        start_index = offset + 1
-        for idx, user in enumerate(users, start=start_index):
+        start_index = page * limit + 1
+        for idx, user in enumerate(result['rows'], start=start_index):
             name = escape_markdown(user.first_name or "Unknown")
             balance = escape_markdown(f"{int(user.wallet_balance):,}")
-            
+
             line = f"{idx}\. {name} \(`{user.user_id}`\): `{balance}` تومان"
             items.append(line)
-            
+
         header_amount = escape_markdown(f"{int(total_balance):,}")
         header = f"💰 *موجودی کیف پول کاربران \| مجموع کل: {header_amount} تومان*"
-        return items, total_count, header
+        return items, total_count, header, _nav(result)
 
 class PaymentHistoryStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        stmt = select(WalletTransaction).order_by(desc(WalletTransaction.transaction_date))
-        
+    async def generate(self, session, params, cursor, limit, page=0):
+        stmt = select(WalletTransaction).options(*loader('transaction_user'))
+
         count_stmt = select(func.count(WalletTransaction.id))
         total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(
-            stmt.options(selectinload(WalletTransaction.user))
-            .offset(offset).limit(limit)
+
+        result = await keyset_fetch(
+            session, stmt, [WalletTransaction.transaction_date, WalletTransaction.id], cursor, limit,
+            key_of=lambda tx: (tx.transaction_date, tx.id), scalars=True
         )
-        txs = result.scalars().all()
-        
+
         items = []
-        start_index = offset + 1
-        for idx, tx in enumerate(txs, start=start_index):
+        start_index = page * limit + 1
+        for idx, tx in enumerate(result['rows'], start=start_index):
             u_name = escape_markdown(tx.user.first_name if (tx.user and tx.user.first_name) else str(tx.user_id))
-            
+
             raw_date = to_shamsi(tx.transaction_date)
             date_str = escape_markdown(str(raw_date))
-            
+
             line = f"{idx}\. {u_name} \(💳 {date_str}\)"
             items.append(line)
-            
-        return items, total_count, f"📝 *گزارش تمام پرداخت‌های ثبت‌شده*"
+
+        return items, total_count, f"📝 *گزارش تمام پرداخت‌های ثبت‌شده*", _nav(result)
 
 class ConnectedDevicesStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
-        from bot.db.base import ClientUserAgent, UserUUID
-        
+    async def generate(self, session, params, cursor, limit, page=0):
         stmt = (
             select(ClientUserAgent, UserUUID.name)
             .join(UserUUID, ClientUserAgent.uuid_id == UserUUID.id)
-            .order_by(desc(ClientUserAgent.last_seen))
         )
-        
+
         count_stmt = select(func.count(ClientUserAgent.id))
         total_count = await session.scalar(count_stmt) or 0
-        
-        result = await session.execute(stmt.offset(offset).limit(limit))
-        rows = result.all()
-        
+
+        result = await keyset_fetch(
+            session, stmt, [ClientUserAgent.last_seen, ClientUserAgent.id], cursor, limit,
+            key_of=lambda row: (row[0].last_seen, row[0].id)
+        )
+
         items = []
-        for row in rows:
+        for row in result['rows']:
             agent, config_name = row
             raw_ua = agent.user_agent[:30] + "..." if len(agent.user_agent) > 30 else agent.user_agent
             ua_clean = escape_markdown(raw_ua)
             conf_clean = escape_markdown(config_name)
             time_ago = escape_markdown(format_relative_time(agent.last_seen))
             items.append(f"• `{conf_clean}`: {ua_clean} \({time_ago}\)")
-            
-        return items, total_count, f"📱 *دستگاه‌های متصل اخیر*"
+
+        return items, total_count, f"📱 *دستگاه‌های متصل اخیر*", _nav(result)
 
 class FeedbackReportStrategy(ReportStrategy):
-    async def generate(self, session, params, offset, limit):
+    async def generate(self, session, params, cursor, limit, page=0):
         text = escape_markdown("🔧 این بخش به زودی تکمیل می‌شود.")
-        
+
         items = [text]
         total_count = 1
-        return items, total_count, f"🗣 *بازخورد کاربران*"
\ No newline at end of file
+        return items, total_count, f"🗣 *بازخورد کاربران*", {'next': None, 'prev': None}
@@ -0,0 +1,365 @@
+# bot/services/send_scheduler.py
+
+import asyncio
+import functools
+import hashlib
+import heapq
+import itertools
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telebot.apihelper import ApiTelegramException
+from telebot.async_telebot import AsyncTeleBot
+
+from bot.config import (
+    SEND_SCHEDULER_ENABLED, SEND_GLOBAL_PER_SECOND, SEND_PER_CHAT_LIMIT, SEND_PER_CHAT_WINDOW,
+    SEND_PER_GROUP_PER_MINUTE, SEND_MAX_CONCURRENCY, SEND_MAX_RETRIES,
+    EDIT_DEDUP_SIZE, EDIT_DEDUP_TTL,
+)
+from bot.db.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """اولویت ارسال؛ عدد کمتر زودتر ارسال می‌شود."""
+    INTERACTIVE = 0
+    PURCHASE = 1
+    WARNING = 2
+    REPORT = 3
+    BROADCAST = 4
+
+
+# اولویت پیش‌فرض ارسال‌های تسک فعلی؛ هندلرها تعاملی هستند و جاب‌ها آن را تغییر می‌دهند
+_current_priority: ContextVar[Priority] = ContextVar("send_priority", default=Priority.INTERACTIVE)
+
+# حداکثر تعداد کارهای صف که برای یافتن یک چت آزاد بررسی می‌شوند
+_SCAN_LIMIT = 256
+_PRUNE_EVERY = 1000
+
+
+@contextmanager
+def send_priority(priority: Priority):
+    """همه ارسال‌های داخل این بلاک با اولویت `priority` در صف قرار می‌گیرند."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def with_send_priority(priority: Priority, func: Callable) -> Callable:
+    """نسخه دکوریتوری send_priority برای جاب‌های زمان‌بندی‌شده."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with send_priority(priority):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+class _Window:
+    """پنجره لغزان: حداکثر `limit` ارسال در هر `period` ثانیه."""
+
+    __slots__ = ('limit', 'period', 'stamps', 'paused_until')
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.stamps: deque = deque()
+        self.paused_until = 0.0
+
+    def ready_at(self, now: float) -> float:
+        while self.stamps and self.stamps[0] <= now - self.period:
+            self.stamps.popleft()
+        ready = now if len(self.stamps) < self.limit else self.stamps[0] + self.period
+        return max(ready, self.paused_until)
+
+    def record(self, now: float):
+        self.stamps.append(now)
+
+    def idle(self, now: float) -> bool:
+        return self.ready_at(now) <= now and not self.stamps
+
+
+class _Job:
+    __slots__ = ('priority', 'chat_key', 'call', 'future', 'attempts')
+
+    def __init__(self, priority, chat_key, call, future):
+        self.priority = priority
+        self.chat_key = chat_key
+        self.call = call
+        self.future = future
+        self.attempts = 0
+
+
+def _is_group(chat_key) -> bool:
+    # شناسه گروه/کانال منفی است یا به صورت @username داده می‌شود
+    return isinstance(chat_key, str) or (isinstance(chat_key, int) and chat_key < 0)
+
+
+def _retry_after(e: ApiTelegramException) -> float:
+    params = (e.result_json or {}).get('parameters') or {}
+    return float(params.get('retry_after', 1))
+
+
+class SendScheduler:
+    """
+    صف مرکزی ارسال پیام‌ها به تلگرام.
+    محدودیت‌های کلی (پیام در ثانیه)، هر چت خصوصی و هر گروه (پیام در دقیقه) را رعایت می‌کند،
+    کارها را به ترتیب اولویت و سپس ترتیب ورود ارسال می‌کند و در صورت 429 بعد از retry_after دوباره می‌فرستد.
+    ارسال‌ها به صورت هم‌زمان (تا SEND_MAX_CONCURRENCY) انجام می‌شوند تا تأخیر شبکه سقف سرعت نشود.
+    """
+
+    def __init__(self, enabled: bool = SEND_SCHEDULER_ENABLED):
+        self.enabled = enabled
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._global = _Window(SEND_GLOBAL_PER_SECOND, 1.0)
+        self._chats: Dict[Any, _Window] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # حلقه رویداد فقط ارجاع ضعیف به تسک‌ها نگه می‌دارد؛ ارسال‌های در جریان تا پایان اینجا نگه داشته می‌شوند
+        self._tasks: set = set()
+        self._dispatched = 0
+        self.stats = {'sent': 0, 'failed': 0, 'flood_waits': 0}
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def submit(self, chat_id, call: Callable[[], Awaitable], priority: Optional[Priority] = None):
+        """`call` را در نوبت خود اجرا کرده و نتیجه (یا خطای) آن را برمی‌گرداند."""
+        if not self.enabled:
+            return await call()
+
+        self._ensure_worker()
+        job = _Job(_current_priority.get() if priority is None else priority,
+                   chat_id, call, asyncio.get_running_loop().create_future())
+        self._push(job)
+        return await job.future
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._inflight = asyncio.Semaphore(SEND_MAX_CONCURRENCY)
+            self._worker = asyncio.create_task(self._run())
+
+    def _push(self, job: _Job):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _window(self, chat_key) -> Optional[_Window]:
+        if chat_key is None:
+            return None
+        window = self._chats.get(chat_key)
+        if window is None:
+            if _is_group(chat_key):
+                window = _Window(SEND_PER_GROUP_PER_MINUTE, 60.0)
+            else:
+                window = _Window(SEND_PER_CHAT_LIMIT, SEND_PER_CHAT_WINDOW)
+            self._chats[chat_key] = window
+        return window
+
+    def _pick(self, now: float):
+        """
+        پراولویت‌ترین کاری که چت آن آزاد است؛ خروجی (کار، None) یا (None، زودترین زمان آزاد شدن).
+        """
+        skipped, job, next_ready = [], None, None
+        while self._heap and len(skipped) < _SCAN_LIMIT:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            if candidate.future.done():  # فراخواننده منصرف شده است
+                continue
+            window = self._window(candidate.chat_key)
+            ready = window.ready_at(now) if window else now
+            if ready <= now:
+                job = candidate
+                break
+            skipped.append(entry)
+            next_ready = ready if next_ready is None else min(next_ready, ready)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return job, next_ready
+
+    async def _sleep(self, delay: float):
+        """انتظار تا `delay` ثانیه یا ورود کار جدید (که ممکن است پراولویت‌تر باشد)."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0.001))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if not self._heap:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                now = loop.time()
+                global_ready = self._global.ready_at(now)
+                if global_ready > now:
+                    await self._sleep(global_ready - now)
+                    continue
+
+                job, next_ready = self._pick(now)
+                if job is None:
+                    if next_ready is not None:
+                        await self._sleep(next_ready - now)
+                    continue
+
+                await self._inflight.acquire()
+                now = loop.time()
+                self._global.record(now)
+                window = self._window(job.chat_key)
+                if window:
+                    window.record(now)
+                task = asyncio.create_task(self._execute(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+                self._dispatched += 1
+                if self._dispatched % _PRUNE_EVERY == 0:
+                    self._prune(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SEND_SCHEDULER: dispatcher error: {e}", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await job.call()
+        except ApiTelegramException as e:
+            if e.error_code == 429 and job.attempts < SEND_MAX_RETRIES:
+                self._on_flood(job.chat_key, _retry_after(e))
+                job.attempts += 1
+                self._push(job)
+                return
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._inflight.release()
+
+    def _on_flood(self, chat_key, retry_after: float):
+        """
+        محدودیت گروه‌ها مستقل است، پس فقط همان گروه متوقف می‌شود؛
+        429 در چت خصوصی یعنی سقف کلی ربات پر شده و همه ارسال‌ها صبر می‌کنند.
+        """
+        self.stats['flood_waits'] += 1
+        until = asyncio.get_running_loop().time() + retry_after
+        target = self._window(chat_key) if _is_group(chat_key) else self._global
+        target.paused_until = max(target.paused_until, until)
+        logger.warning(f"SEND_SCHEDULER: flood wait {retry_after}s (chat={chat_key})")
+
+    def _prune(self, now: float):
+        for key in [k for k, w in self._chats.items() if w.idle(now)]:
+            del self._chats[key]
+
+
+send_scheduler = SendScheduler()
+
+
+class EditDedup:
+    """
+    اثر انگشت آخرین محتوای (متن، کیبورد، گزینه‌ها) هر پیام به ازای (chat_id, message_id).
+    _safe_edit اگر محتوای جدید با آخرین محتوا یکی باشد ویرایش را بدون تماس با تلگرام رد می‌کند؛
+    هر ویرایش یا حذف دیگری روی همان پیام اثر انگشت را پاک می‌کند تا ویرایش بعدی حتما ارسال شود.
+    """
+
+    def __init__(self, maxsize: int = EDIT_DEDUP_SIZE, ttl: float = EDIT_DEDUP_TTL):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.skipped = 0
+
+    @staticmethod
+    def fingerprint(text: str, kwargs: dict) -> bytes:
+        markup = kwargs.get('reply_markup')
+        if markup is not None and hasattr(markup, 'to_json'):
+            markup = markup.to_json()
+        options = sorted((k, repr(v)) for k, v in kwargs.items() if k != 'reply_markup')
+        raw = f"{text}\x00{markup}\x00{options}".encode('utf-8', 'surrogatepass')
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def is_duplicate(self, chat_id, message_id, fingerprint: bytes) -> bool:
+        if self._cache.get((chat_id, message_id)) == fingerprint:
+            self.skipped += 1
+            return True
+        return False
+
+    def remember(self, chat_id, message_id, fingerprint: bytes):
+        self._cache.set((chat_id, message_id), fingerprint)
+
+    def forget(self, chat_id, message_id):
+        if message_id is not None:
+            self._cache.invalidate((chat_id, message_id))
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        return {'skipped': self.skipped, 'tracked': stats['size'], 'lookups': stats['hits'] + stats['misses']}
+
+
+edit_dedup = EditDedup()
+
+
+def _arg(args: tuple, kwargs: dict, name: str, position: int):
+    if name in kwargs:
+        return kwargs[name]
+    return args[position] if len(args) > position else None
+
+
+def _chat_arg(args: tuple, kwargs: dict, position: int):
+    return _arg(args, kwargs, 'chat_id', position)
+
+
+class ScheduledTeleBot(AsyncTeleBot):
+    """
+    AsyncTeleBot که send_message، copy_message و edit_message_text آن از صف مرکزی ارسال عبور می‌کنند.
+    اولویت با send_priority (یا with_send_priority برای جاب‌ها) تعیین می‌شود.
+    """
+
+    async def send_message(self, *args, **kwargs):
+        return await send_scheduler.submit(
+            _chat_arg(args, kwargs, 0), lambda: AsyncTeleBot.send_message(self, *args, **kwargs))
+
+    async def copy_message(self, *args, **kwargs):
+        return await send_scheduler.submit(
+            _chat_arg(args, kwargs, 0), lambda: AsyncTeleBot.copy_message(self, *args, **kwargs))
+
+    async def edit_message_text(self, *args, **kwargs):
+        chat_id = _chat_arg(args, kwargs, 1)
+        edit_dedup.forget(chat_id, _arg(args, kwargs, 'message_id', 2))
+        return await send_scheduler.submit(
+            chat_id, lambda: AsyncTeleBot.edit_message_text(self, *args, **kwargs))
+
+    # تغییرات دیگر روی پیام اثر انگشت ذخیره‌شده برای _safe_edit را باطل می‌کنند
+
+    async def edit_message_reply_markup(self, *args, **kwargs):
+        edit_dedup.forget(_chat_arg(args, kwargs, 0), _arg(args, kwargs, 'message_id', 1))
+        return await super().edit_message_reply_markup(*args, **kwargs)
+
+    async def edit_message_caption(self, *args, **kwargs):
+        edit_dedup.forget(_chat_arg(args, kwargs, 1), _arg(args, kwargs, 'message_id', 2))
+        return await super().edit_message_caption(*args, **kwargs)
+
+    async def edit_message_media(self, *args, **kwargs):
+        edit_dedup.forget(_chat_arg(args, kwargs, 1), _arg(args, kwargs, 'message_id', 2))
+        return await super().edit_message_media(*args, **kwargs)
+
+    async def delete_message(self, *args, **kwargs):
+        edit_dedup.forget(_chat_arg(args, kwargs, 0), _arg(args, kwargs, 'message_id', 1))
+        return await super().delete_message(*args, **kwargs)
@@ -0,0 +1,145 @@
+# bot/services/timer_wheel.py
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from telebot.apihelper import ApiTelegramException
+
+from bot.bot_instance import bot
+from bot.database import db
+from bot.config import TIMER_BATCH_SIZE, TIMER_POLL_INTERVAL, TIMER_LEASE_SECONDS, TIMER_MAX_ATTEMPTS
+from bot.services.send_scheduler import send_scheduler, Priority
+
+logger = logging.getLogger(__name__)
+
+# کمترین فاصله بین دو بررسی صف (جلوگیری از حلقه داغ وقتی تایمر سررسید شده دست ورکر دیگری است)
+_MIN_SLEEP = 0.5
+
+
+class TimerWheel:
+    """
+    تایمرهای پایدار روی جدول delayed_actions به جای یک asyncio.sleep برای هر پیام.
+    تایمرها فقط در دیتابیس نگه داشته می‌شوند (حافظه ثابت، بدون تسک به ازای هر تایمر) و با ری‌استارت از دست نمی‌روند؛
+    یک ورکر سررسیدها را دسته به دسته (TIMER_BATCH_SIZE) برمی‌دارد و هندلر هر action را اجرا می‌کند.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sleep_until: Optional[float] = None
+        self.stats = {'executed': 0, 'failed': 0, 'dropped': 0}
+
+    def handler(self, action: str):
+        """دکوریتور ثبت هندلر یک نوع تایمر؛ هندلر یک dict (chat_id, message_id, payload, attempts) می‌گیرد."""
+        def decorator(func):
+            self._handlers[action] = func
+            return func
+        return decorator
+
+    async def schedule(self, action: str, chat_id: int, message_id: Optional[int] = None,
+                       delay: float = 0, payload: Optional[dict] = None) -> None:
+        await self.schedule_many([
+            {'action': action, 'chat_id': chat_id, 'message_id': message_id, 'delay': delay, 'payload': payload}
+        ])
+
+    async def schedule_many(self, actions: Iterable[dict]) -> int:
+        """ثبت گروهی (مثلا حذف خودکار همه گزارش‌های یک دسته کاربر) با یک INSERT."""
+        actions = list(actions)
+        count = await db.schedule_actions(actions)
+        if count:
+            self._wake_if_earlier(min(a.get('delay', 0) for a in actions))
+        return count
+
+    def _wake_if_earlier(self, delay: float):
+        if self._wakeup is None:
+            return
+        due = asyncio.get_running_loop().time() + delay
+        if self._sleep_until is None or due < self._sleep_until:
+            self._wakeup.set()
+
+    async def _sleep(self, delay: float):
+        loop = asyncio.get_running_loop()
+        self._sleep_until = loop.time() + delay
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._sleep_until = None
+
+    async def run(self):
+        """تسک پس‌زمینه ورکر (یک بار در custom_bot اجرا می‌شود)."""
+        self._wakeup = asyncio.Event()
+        logger.info(f"TIMERS: worker started ({await db.count_pending_actions()} pending)")
+        while True:
+            try:
+                batch = await db.claim_due_actions(TIMER_BATCH_SIZE, TIMER_LEASE_SECONDS)
+                if batch:
+                    await self._execute(batch)
+                    if len(batch) >= TIMER_BATCH_SIZE:
+                        continue
+
+                next_due = await db.next_action_due_at()
+                delay = TIMER_POLL_INTERVAL
+                if next_due is not None:
+                    delay = min(delay, (next_due - datetime.now(timezone.utc)).total_seconds())
+                await self._sleep(max(delay, _MIN_SLEEP))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"TIMERS: worker error: {e}", exc_info=True)
+                await asyncio.sleep(TIMER_POLL_INTERVAL)
+
+    async def _execute(self, batch: list):
+        results = await asyncio.gather(*(self._run_one(item) for item in batch))
+        # تایمرهای ناموفق در صف می‌مانند و بعد از پایان مهلت (lease) دوباره اجرا می‌شوند
+        await db.complete_actions([item['id'] for item, done in zip(batch, results) if done])
+
+    async def _run_one(self, item: dict) -> bool:
+        handler = self._handlers.get(item['action'])
+        if handler is None:
+            logger.error(f"TIMERS: no handler for action '{item['action']}' (id={item['id']}), dropping")
+            self.stats['dropped'] += 1
+            return True
+        try:
+            await handler(item)
+            self.stats['executed'] += 1
+            return True
+        except Exception as e:
+            self.stats['failed'] += 1
+            if item['attempts'] >= TIMER_MAX_ATTEMPTS:
+                logger.warning(f"TIMERS: '{item['action']}' for {item['chat_id']} failed {item['attempts']} times, dropping: {e}")
+                self.stats['dropped'] += 1
+                return True
+            logger.info(f"TIMERS: '{item['action']}' for {item['chat_id']} failed, will retry: {e}")
+            return False
+
+
+timer_wheel = TimerWheel()
+
+
+async def _delete(chat_id: int, message_id: int):
+    # از صف مرکزی ارسال عبور می‌کند تا حذف‌های یک دسته (مثلا ۲۰۰ گزارش شبانه) محدودیت‌های تلگرام را رعایت کنند
+    # و 429 با retry_after دوباره امتحان شود، نه با پایان مهلت تایمر
+    try:
+        await send_scheduler.submit(chat_id, lambda: bot.delete_message(chat_id, message_id), priority=Priority.REPORT)
+    except ApiTelegramException as e:
+        # پیام قبلا حذف شده، خیلی قدیمی است یا کاربر ربات را بلاک کرده؛ تلاش دوباره فایده ندارد
+        if e.error_code in (400, 403):
+            return
+        raise
+
+
+@timer_wheel.handler('delete_message')
+async def _delete_message(item: dict):
+    await _delete(item['chat_id'], item['message_id'])
+
+
+@timer_wheel.handler('delete_report')
+async def _delete_report(item: dict):
+    """حذف خودکار گزارش (auto_delete_reports) همراه با رکورد sent_reports آن."""
+    await _delete(item['chat_id'], item['message_id'])
+    await db.delete_sent_report_by_message(item['chat_id'], item['message_id'])
@@ -22,6 +22,7 @@ async def sync_user_service(uuid_obj: UserUUID):
     """
     یک سرویس خاص را از پنل استعلام گرفته و دیتابیس را آپدیت می‌کند.
     این تابع توسط بخش‌های مختلف (مثل خرید یا مشاهده حساب) صدا زده می‌شود.
+    uuid_obj باید با پروفایل uuid_panels (bot.db.loaders) لود شده باشد.
     """
     try:
         # اگر لیست پنل‌ها لود نشده یا خالی است
@@ -0,0 +1,63 @@
+# bot/templates.py
+
+import re
+from string import Formatter
+from typing import Any, Tuple
+
+# کاراکترهای رزرو MarkdownV2 تلگرام
+MD_SPECIAL_CHARS = r'_*[]()~`>#+-=|{}.!'
+_MD_TABLE = str.maketrans({c: '\\' + c for c in MD_SPECIAL_CHARS})
+
+# در قالب‌هایی که خودشان MarkdownV2 هستند (*پررنگ*، `کد`، لینک) فقط کاراکترهایی که هرگز
+# نقش قالب‌بندی ندارند و اسکیپ نشده‌اند اسکیپ می‌شوند
+_MD_LOOSE_CHARS = re.compile(r'(?<!\\)([.!\-=+#])')
+
+
+def escape_md(value: Any) -> str:
+    """اسکیپ MarkdownV2 با str.translate (بدون regex)."""
+    return str(value).translate(_MD_TABLE)
+
+
+class Markdown(str):
+    """مقداری که از قبل MarkdownV2 است و هنگام رندر قالب دوباره اسکیپ نمی‌شود."""
+    __slots__ = ()
+
+
+class MarkdownTemplate:
+    """
+    قالب از پیش کامپایل‌شده: بخش‌های ثابت یک بار اسکیپ می‌شوند و در render فقط مقادیر
+    جایگذاری‌شده اسکیپ می‌شوند. فرمت فیلدها همان str.format است ({usage:.2f}).
+
+        MarkdownTemplate("📊 حجم‌کل : {volume}").render(volume="10.5 GB")
+        MarkdownTemplate("👤 اکانت : *{name}*", markup=True).render(name=name)
+    """
+    __slots__ = ('source', '_parts')
+
+    def __init__(self, source: str, markup: bool = False):
+        self.source = source
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                literal = _MD_LOOSE_CHARS.sub(r'\\\1', literal) if markup else escape_md(literal)
+            parts.append((literal, field, spec or '', conversion))
+        self._parts: Tuple[tuple, ...] = tuple(parts)
+
+    def render(self, **values) -> str:
+        out = []
+        for literal, field, spec, conversion in self._parts:
+            if literal:
+                out.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            if isinstance(value, Markdown):
+                out.append(value)
+            else:
+                out.append(escape_md(format(value, spec)))
+        return ''.join(out)
+
+    __call__ = render
@@ -1,6 +1,7 @@
 # bot/user_handlers/account.py
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards.user import user_keyboard as user_menu
 from bot.formatters import user_formatter
 from bot.database import db
@@ -18,7 +19,7 @@ logger = logging.getLogger(__name__)
 
 user_steps = {}
 
-@bot.callback_query_handler(func=lambda call: call.data == "add")
+@callback_router.exact("add")
 async def add_account_prompt(call: types.CallbackQuery):
     """درخواست ارسال UUID از کاربر"""
     user_id = call.from_user.id
@@ -42,7 +43,7 @@ async def add_account_prompt(call: types.CallbackQuery):
         reply_markup=markup
     )
 
-@bot.callback_query_handler(func=lambda call: call.data == "manage")
+@callback_router.exact("manage")
 async def account_list_handler(call: types.CallbackQuery):
     """نمایش لیست اکانت‌های کاربر با محاسبه درصد مصرف و روزهای باقی‌مانده"""
     user_id = call.from_user.id
@@ -101,7 +102,7 @@ async def account_list_handler(call: types.CallbackQuery):
         parse_mode='Markdown'
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('acc_'))
+@callback_router.prefix('acc_')
 async def account_detail_handler(call: types.CallbackQuery):
     """جزئیات یک اکانت خاص (با قابلیت آپدیت کش و دکمه حذف در صورت عدم وجود)"""
     user_id = call.from_user.id
@@ -149,7 +150,7 @@ async def account_detail_handler(call: types.CallbackQuery):
 
 # --- بخش هندلر آمار فوری (Quick Stats) ---
 
-@bot.callback_query_handler(func=lambda call: call.data == "quick_stats")
+@callback_router.exact("quick_stats")
 async def quick_stats_init(call: types.CallbackQuery):
     """
     نمایش آمار فوری برای اولین اکانت (صفحه ۰)
@@ -157,7 +158,7 @@ async def quick_stats_init(call: types.CallbackQuery):
     await _show_quick_stats(call, page=0)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("qstats_acc_page_"))
+@callback_router.prefix("qstats_acc_page_")
 async def quick_stats_pagination(call: types.CallbackQuery):
     """
     مدیریت دکمه‌های بعدی و قبلی در آمار فوری
@@ -203,7 +204,7 @@ async def _show_quick_stats(call: types.CallbackQuery, page: int):
 # اما برای حفظ ساختار فایل شما و هندلرها، بقیه توابع را نگه می‌داریم)
 
 # --- 3. دریافت لینک (Get Link) ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('getlinks_'))
+@callback_router.prefix('getlinks_')
 async def get_subscription_link(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -218,7 +219,7 @@ async def get_subscription_link(call: types.CallbackQuery):
 # --- 4. تغییر نام (Change Name) ---
 # در فایل bot/user_handlers/account.py
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('changename_'))
+@callback_router.prefix('changename_')
 async def change_name_prompt(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -307,7 +308,7 @@ async def process_change_name_step(message: types.Message):
         logger.error(f"Change Name Refresh Error: {e}", exc_info=True)
 
 # --- 5. حذف اکانت (Delete) ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('del_'))
+@callback_router.prefix('del_')
 async def delete_account_confirm(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -324,7 +325,7 @@ async def delete_account_confirm(call: types.CallbackQuery):
     
     await _safe_edit(user_id, call.message.message_id, warning_text, reply_markup=kb, parse_mode="Markdown")
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_del_'))
+@callback_router.prefix('confirm_del_')
 async def delete_account_execute(call: types.CallbackQuery):
     """اجرای حذف"""
     user_id = call.from_user.id
@@ -339,7 +340,7 @@ async def delete_account_execute(call: types.CallbackQuery):
     await account_list_handler(call)
 
 # --- 6. تاریخچه پرداخت (Payment History) ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('payment_history_'))
+@callback_router.prefix('payment_history_')
 async def payment_history_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -364,7 +365,7 @@ async def payment_history_handler(call: types.CallbackQuery):
 
 
 # --- 7. تاریخچه مصرف (Usage History) ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('usage_history_'))
+@callback_router.prefix('usage_history_')
 async def usage_history_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -387,7 +388,7 @@ async def usage_history_handler(call: types.CallbackQuery):
     await _safe_edit(user_id, call.message.message_id, safe_text, reply_markup=kb, parse_mode='MarkdownV2')
 
 # --- 10. صفحه حساب کاربری (User Account) ---
-@bot.callback_query_handler(func=lambda call: call.data == "user_account")
+@callback_router.exact("user_account")
 async def user_account_page_handler(call: types.CallbackQuery):
     """نمایش صفحه اطلاعات کاربری"""
     user_id = call.from_user.id
@@ -401,7 +402,7 @@ async def user_account_page_handler(call: types.CallbackQuery):
     
     await _safe_edit(user_id, call.message.message_id, text, reply_markup=kb, parse_mode='MarkdownV2')
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('win_select_'))
+@callback_router.prefix('win_select_')
 async def periodic_usage_handler(call: types.CallbackQuery):
     """نمایش آمار مصرف بازه‌ای (هفتگی/ماهانه)"""
     user_id = call.from_user.id
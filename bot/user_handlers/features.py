@@ -4,6 +4,7 @@ import logging
 import jdatetime
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 from bot.keyboards import user_menu 
 from bot.utils.network import _safe_edit
@@ -18,7 +19,7 @@ logger = logging.getLogger(__name__)
 feature_states = {}
 
 # --- 1. Referral System ---
-@bot.callback_query_handler(func=lambda call: call.data == "referral:info")
+@callback_router.exact("referral:info")
 async def referral_info_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang_code = await db.get_user_language(user_id)
@@ -32,7 +33,7 @@ async def referral_info_handler(call: types.CallbackQuery):
     await _safe_edit(user_id, call.message.message_id, text, reply_markup=kb, parse_mode="MarkdownV2")
 
 # --- 2. Request Service ---
-@bot.callback_query_handler(func=lambda call: call.data == "request_service")
+@callback_router.exact("request_service")
 async def request_service_handler(call: types.CallbackQuery):
     user = call.from_user
     msg = f"👤 Service Request from:\n{user.first_name} (@{user.username})\nID: {user.id}"
@@ -44,12 +45,12 @@ async def request_service_handler(call: types.CallbackQuery):
         
     await bot.answer_callback_query(call.id, "✅ درخواست ارسال شد.", show_alert=True)
 
-@bot.callback_query_handler(func=lambda call: call.data == "coming_soon")
+@callback_router.exact("coming_soon")
 async def coming_soon(call: types.CallbackQuery):
     await bot.answer_callback_query(call.id, "🔜 به زودی...", show_alert=True)
 
 # --- 3. Birthday Gift ---
-@bot.callback_query_handler(func=lambda call: call.data == "birthday_gift")
+@callback_router.exact("birthday_gift")
 async def handle_birthday_gift_request(call: types.CallbackQuery):
     uid = call.from_user.id
     msg_id = call.message.message_id
@@ -1,9 +1,10 @@
 # bot/user_handlers/feedback.py
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("feedback:rating:"))
+@callback_router.prefix("feedback:rating:")
 async def submit_rating(call: types.CallbackQuery):
     score = int(call.data.split(":")[2])
     # استفاده از متد Async
@@ -4,6 +4,7 @@ import logging
 from telebot import types
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 from bot.keyboards import user as user_menu
 from bot.utils.network import _safe_edit
@@ -17,7 +18,7 @@ logger = logging.getLogger(__name__)
 # بخش آموزش‌های اتصال (Tutorials)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "tutorials")
+@callback_router.exact("tutorials")
 async def show_tutorial_main_menu(call: types.CallbackQuery):
     """نمایش منوی انتخاب سیستم عامل برای آموزش"""
     lang = await db.get_user_language(call.from_user.id)
@@ -27,7 +28,7 @@ async def show_tutorial_main_menu(call: types.CallbackQuery):
         reply_markup=await user_menu.tutorial_main_menu(lang)
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("tutorial_os:"))
+@callback_router.prefix("tutorial_os:")
 async def show_tutorial_os_menu(call: types.CallbackQuery):
     """نمایش لیست برنامه‌های موجود برای یک سیستم عامل خاص"""
     os_type = call.data.split(":")[1]
@@ -39,7 +40,7 @@ async def show_tutorial_os_menu(call: types.CallbackQuery):
         reply_markup=await user_menu.tutorial_os_menu(os_type, lang)
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("tutorial_app:"))
+@callback_router.prefix("tutorial_app:")
 async def send_tutorial_link(call: types.CallbackQuery):
     """ارسال لینک و متن آموزش انتخاب شده"""
     _, os_type, app_name = call.data.split(":")
@@ -70,7 +71,7 @@ async def send_tutorial_link(call: types.CallbackQuery):
 # راهنمای ویژگی‌ها (Features Guide)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "show_features_guide")
+@callback_router.exact("show_features_guide")
 async def show_features_guide_handler(call: types.CallbackQuery):
     """نمایش متن راهنمای ویژگی‌های ربات"""
     uid = call.from_user.id
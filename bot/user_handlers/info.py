@@ -1,12 +1,13 @@
 # bot/user_handlers/info.py
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards import user_menu
 from bot.database import db
 from bot.language import get_string
 from bot.config import TUTORIAL_LINKS
 
-@bot.callback_query_handler(func=lambda call: call.data == "tutorials")
+@callback_router.exact("tutorials")
 async def tutorials_menu(call: types.CallbackQuery):
     # ✅ اصلاح نام و افزودن await
     lang = await db.get_user_language(call.from_user.id)
@@ -21,7 +22,7 @@ async def tutorials_menu(call: types.CallbackQuery):
         reply_markup=markup
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("tutorial_os:"))
+@callback_router.prefix("tutorial_os:")
 async def tutorial_os_handler(call: types.CallbackQuery):
     os_type = call.data.split(":")[1]
     lang = await db.get_user_language(call.from_user.id) # ✅ await
@@ -36,7 +37,7 @@ async def tutorial_os_handler(call: types.CallbackQuery):
         reply_markup=markup
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("tutorial_app:"))
+@callback_router.prefix("tutorial_app:")
 async def show_tutorial_link(call: types.CallbackQuery):
     parts = call.data.split(":")
     os_type, app_key = parts[1], parts[2]
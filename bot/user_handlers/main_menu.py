@@ -11,6 +11,7 @@ from sqlalchemy import select
 
 # --- Imports ---
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 from bot.db.base import UserUUID
 from bot.keyboards.user import user_keyboard as user_menu
@@ -111,7 +112,7 @@ async def start_command(message: types.Message):
 # 2. هندلر انتخاب زبان (مخصوص Start)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('start_lang:'))
+@callback_router.prefix('start_lang:')
 async def start_language_callback(call: types.CallbackQuery):
     """زبان انتخاب شد -> نمایش منوی انتخاب (ورود / سرویس جدید)"""
     user_id = call.from_user.id
@@ -141,7 +142,7 @@ async def start_language_callback(call: types.CallbackQuery):
 # 3. هندلر انتخاب مسیر (ورود یا اکانت جدید)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('auth:'))
+@callback_router.prefix('auth:')
 async def auth_choice_callback(call: types.CallbackQuery):
     user_id = call.from_user.id
     action = call.data.split(':')[1]
@@ -206,7 +207,7 @@ async def auth_choice_callback(call: types.CallbackQuery):
             await bot.answer_callback_query(call.id, "Error loading list.")
 
 
-@bot.callback_query_handler(func=lambda call: call.data == "back_to_welcome")
+@callback_router.exact("back_to_welcome")
 async def back_to_welcome_handler(call: types.CallbackQuery):
     """بازگشت به منوی انتخاب مسیر (بعد از تایید زبان)"""
     user_id = call.from_user.id
@@ -233,7 +234,7 @@ async def back_to_welcome_handler(call: types.CallbackQuery):
 # 4. هندلر درخواست نام برای اکانت تستی (پس از انتخاب کشور)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('new_acc_country:'))
+@callback_router.prefix('new_acc_country:')
 async def create_test_account_callback(call: types.CallbackQuery):
     user_id = call.from_user.id
     country_code = call.data.split(':')[1]
@@ -400,7 +401,7 @@ async def handle_test_name_input(message: types.Message):
 # 5. دکمه بازگشت به اول (Reset)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "start_reset")
+@callback_router.exact("start_reset")
 async def reset_start_flow(call: types.CallbackQuery):
     """بازگشت به منوی انتخاب زبان با استفاده از safe_edit"""
     user_id = call.from_user.id
@@ -585,7 +586,7 @@ async def handle_uuid_login(message: types.Message):
 # 7. دکمه بازگشت (Back)
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "back")
+@callback_router.exact("back")
 async def back_to_main_menu_handler(call: types.CallbackQuery):
     """بازگشت به منوی اصلی با متن داینامیک"""
     user_id = call.from_user.id
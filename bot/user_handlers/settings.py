@@ -1,11 +1,12 @@
 # bot/user_handlers/settings.py
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards import user_menu
 from bot.database import db
 from bot.language import get_string
 
-@bot.callback_query_handler(func=lambda call: call.data == "settings")
+@callback_router.exact("settings")
 async def settings_menu_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -20,7 +21,7 @@ async def settings_menu_handler(call: types.CallbackQuery):
         reply_markup=await user_menu.settings(settings, lang, access)
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("toggle:"))
+@callback_router.prefix("toggle:")
 async def toggle_setting_handler(call: types.CallbackQuery):
     setting_key = call.data.split(":")[1]
     user_id = call.from_user.id
@@ -43,13 +44,13 @@ async def toggle_setting_handler(call: types.CallbackQuery):
     except Exception:
         pass
 
-@bot.callback_query_handler(func=lambda call: call.data == "change_language")
+@callback_router.exact("change_language")
 async def change_language_handler(call: types.CallbackQuery):
     markup = await user_menu.language_change_menu()
     
     await bot.edit_message_text("Language / زبان:", call.from_user.id, call.message.message_id, reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("set_lang:"))
+@callback_router.prefix("set_lang:")
 async def set_language_confirm(call: types.CallbackQuery):
     new_lang = call.data.split(":")[1]
     await db.set_user_language(call.from_user.id, new_lang)
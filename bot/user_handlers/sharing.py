@@ -6,8 +6,10 @@ from sqlalchemy import select, update, delete
 from datetime import datetime
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 from bot.db.base import User, UserUUID, SharedRequest, Panel
+from bot.db.loaders import loader
 from bot.services.panels import PanelFactory
 from bot.utils.formatters import escape_markdown
 from bot.formatters import user_formatter
@@ -85,7 +87,7 @@ async def handle_uuid_conflict(message, uuid_str: str):
 
 # --- 2. هندلر دکمه‌های صاحب اکانت (Accept / Reject) ---
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('share:accept:') or call.data.startswith('share:reject:'))
+@callback_router.prefix('share:accept:', 'share:reject:')
 async def handle_owner_decision(call: types.CallbackQuery):
     action, req_msg_id = call.data.split(':')[1], int(call.data.split(':')[2])
     owner_id = call.from_user.id
@@ -117,7 +119,7 @@ async def handle_owner_decision(call: types.CallbackQuery):
             # ---------------- قبول درخواست ----------------
             
             # 1. اضافه کردن UUID برای درخواست‌دهنده
-            srv_stmt = select(UserUUID).where(UserUUID.uuid == uuid_str)
+            srv_stmt = select(UserUUID).where(UserUUID.uuid == uuid_str).options(*loader('uuid_panels'))
             srv_res = await session.execute(srv_stmt)
             orig_srv = srv_res.scalars().first()
             orig_name = orig_srv.name if orig_srv else "Shared Service"
@@ -197,7 +199,7 @@ async def handle_owner_decision(call: types.CallbackQuery):
 
 # --- 3. هندلر لغو درخواست توسط درخواست‌دهنده ---
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('share:cancel:'))
+@callback_router.prefix('share:cancel:')
 async def handle_request_cancel(call: types.CallbackQuery):
     uuid_str = call.data.split(':')[2]
     requester_id = call.from_user.id
@@ -1,10 +1,10 @@
 # bot/user_handlers/support.py
 
 import logging
-import asyncio
 from telebot import types
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.database import db
 from bot.keyboards.user import user_keyboard as user_menu
 from bot.utils.network import _safe_edit
@@ -12,6 +12,7 @@ from bot.utils.formatters import escape_markdown
 from bot.language import get_string
 from bot.config import ADMIN_IDS
 from bot.formatters import user_formatter
+from bot.services.timer_wheel import timer_wheel
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ support_states = {}
 # 1. شروع تیکت
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "support:new")
+@callback_router.exact("support:new")
 async def handle_support_request(call: types.CallbackQuery):
     await start_support_session(call.from_user.id, call.message.message_id, is_reply=False)
 
@@ -142,8 +143,9 @@ async def process_support_ticket(message: types.Message):
         
         await _safe_edit(uid, original_msg_id, success_text, reply_markup=kb_back, parse_mode="MarkdownV2")
         
-        # حذف و بازگشت به منو
-        asyncio.create_task(delete_and_return_home(uid, original_msg_id, delay_seconds, lang_code))
+        # حذف و بازگشت به منو (تایمر پایدار timer_wheel)
+        await timer_wheel.schedule('delete_and_home', uid, original_msg_id, delay=delay_seconds,
+                                   payload={'lang': lang_code})
 
     except Exception as e:
         logger.error(f"Support Error: {e}")
@@ -152,9 +154,11 @@ async def process_support_ticket(message: types.Message):
             error_message = escape_markdown("❌ خطای سیستمی: گروه پشتیبانی یافت نشد.")
         await _safe_edit(uid, original_msg_id, error_message, reply_markup=None, parse_mode="MarkdownV2")
 
-async def delete_and_return_home(chat_id, message_id, delay, lang_code):
-    """صبر می‌کند، پیام را حذف می‌کند و منوی اصلی را می‌فرستد"""
-    await asyncio.sleep(delay)
+@timer_wheel.handler('delete_and_home')
+async def delete_and_return_home(item: dict):
+    """پیام را حذف می‌کند و منوی اصلی را می‌فرستد"""
+    chat_id, message_id = item['chat_id'], item['message_id']
+    lang_code = (item.get('payload') or {}).get('lang', 'fa')
     try:
         await bot.delete_message(chat_id, message_id)
     except: pass 
@@ -175,11 +179,11 @@ async def delete_and_return_home(chat_id, message_id, delay, lang_code):
 # 3. دکمه‌های کاربر
 # =============================================================================
 
-@bot.callback_query_handler(func=lambda call: call.data == "support:user_reply")
+@callback_router.exact("support:user_reply")
 async def user_reply_to_admin(call: types.CallbackQuery):
     await start_support_session(call.from_user.id, call.message.message_id, is_reply=True)
 
-@bot.callback_query_handler(func=lambda call: call.data == "support:user_close")
+@callback_router.exact("support:user_close")
 async def user_close_ticket(call: types.CallbackQuery):
     try: await bot.delete_message(call.message.chat.id, call.message.message_id)
     except: pass
@@ -3,6 +3,7 @@
 import logging
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards.user import user_keyboard as user_menu
 from bot.database import db
 from bot.language import get_string
@@ -26,7 +27,7 @@ async def wallet_input_handler(message: types.Message):
         await process_receipt_upload(message)
 
 # --- 2. شروع پروسه شارژ ---
-@bot.callback_query_handler(func=lambda call: call.data == "wallet:charge")
+@callback_router.exact("wallet:charge")
 async def wallet_charge_start(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -72,7 +73,7 @@ async def process_charge_amount(message: types.Message):
     await bot.edit_message_text(text, user_id, prev_msg_id, reply_markup=markup, parse_mode='MarkdownV2')
 
 # --- 4. انتخاب روش پرداخت و نمایش اطلاعات ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith("payment:select:"))
+@callback_router.prefix("payment:select:")
 async def show_payment_details(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -2,6 +2,7 @@
 
 from telebot import types
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards import user_menu
 from bot.database import db
 from bot.utils.date_helpers import to_shamsi
@@ -10,7 +11,7 @@ from .states import user_payment_states
 from bot.formatters import user_formatter
 
 # --- منوی اصلی کیف پول ---
-@bot.callback_query_handler(func=lambda call: call.data == "wallet:main")
+@callback_router.exact("wallet:main")
 async def wallet_main_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -31,7 +32,7 @@ async def wallet_main_handler(call: types.CallbackQuery):
         await bot.send_message(user_id, text, reply_markup=markup, parse_mode='MarkdownV2')
 
 # --- تاریخچه تراکنش‌ها ---
-@bot.callback_query_handler(func=lambda call: call.data == "wallet:history")
+@callback_router.exact("wallet:history")
 async def wallet_history_handler(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -42,6 +43,6 @@ async def wallet_history_handler(call: types.CallbackQuery):
     kb = await user_menu.wallet_history_menu(lang)
     await bot.edit_message_text(text, user_id, call.message.message_id, reply_markup=kb, parse_mode='MarkdownV2')
 
-@bot.callback_query_handler(func=lambda call: call.data == "show_addons")
+@callback_router.exact("show_addons")
 async def placeholder_handler(call: types.CallbackQuery):
     await bot.answer_callback_query(call.id, "🔜 این قابلیت به زودی فعال می‌شود.", show_alert=True)
\ No newline at end of file
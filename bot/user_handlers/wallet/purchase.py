@@ -8,12 +8,15 @@ from telebot import types
 from sqlalchemy import select
 
 from bot.bot_instance import bot
+from bot.utils.callback_router import callback_router
 from bot.keyboards import user_menu
 from bot.formatters import user_formatter, admin_formatter
 from bot.database import db
 from bot.db.base import UserUUID, Panel
+from bot.db.loaders import loader
 from bot.language import get_string
 from bot.services.panels import PanelFactory
+from bot.services.send_scheduler import Priority, send_priority
 from bot.utils.formatters import escape_markdown
 from bot import combined_handler
 
@@ -21,7 +24,7 @@ logger = logging.getLogger(__name__)
 
 # در فایل bot/user_handlers/wallet/purchase.py
 
-@bot.callback_query_handler(func=lambda call: call.data == "view_plans")
+@callback_router.exact("view_plans")
 async def view_plans_categories(call: types.CallbackQuery):
     user_id = call.from_user.id
     lang = await db.get_user_language(user_id)
@@ -53,7 +56,7 @@ async def view_plans_categories(call: types.CallbackQuery):
     msg_text = get_string('prompt_select_plan_category', lang)
     await bot.edit_message_text(msg_text, user_id, call.message.message_id, reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("show_plans:"))
+@callback_router.prefix("show_plans:")
 async def show_plans_list(call: types.CallbackQuery):
     category = call.data.split(":")[1]
     user_id = call.from_user.id
@@ -102,7 +105,7 @@ async def show_plans_list(call: types.CallbackQuery):
 
 
 # --- مرحله ۱: انتخاب مقصد ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('wallet:buy_confirm:'))
+@callback_router.prefix('wallet:buy_confirm:')
 async def select_service_destination(call: types.CallbackQuery):
     plan_id = int(call.data.split(':')[2])
     user_id = call.from_user.id
@@ -172,7 +175,7 @@ async def select_service_destination(call: types.CallbackQuery):
     )
 
 # --- مرحله ۲: پیش‌نمایش خرید جدید ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('wallet:preview_new:'))
+@callback_router.prefix('wallet:preview_new:')
 async def handler_preview_new(call: types.CallbackQuery):
     plan_id = int(call.data.split(':')[2])
     await _show_new_service_preview(call, plan_id, call.from_user.id)
@@ -197,7 +200,7 @@ async def _show_new_service_preview(call, plan_id, user_id):
         await bot.edit_message_text(text.replace('*',''), user_id, call.message.message_id, reply_markup=markup)
 
 # --- مرحله ۳: پیش‌نمایش تمدید ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('wallet:preview_renew:'))
+@callback_router.prefix('wallet:preview_renew:')
 async def handler_preview_renew(call: types.CallbackQuery):
     parts = call.data.split(':')
     uuid_id = int(parts[2])
@@ -207,7 +210,7 @@ async def handler_preview_renew(call: types.CallbackQuery):
     plan = await db.get_plan_by_id(plan_id)
     
     async with db.get_session() as session:
-        uuid_obj = await session.get(UserUUID, uuid_id)
+        uuid_obj = await session.get(UserUUID, uuid_id, options=loader('uuid_panels'))
         if not uuid_obj: return
         
         # --- اصلاح: دریافت اطلاعات زنده (اول پنل، بعد دیتابیس) ---
@@ -293,7 +296,7 @@ async def handler_preview_renew(call: types.CallbackQuery):
 # 3. اجرای عملیات (خرید جدید یا تمدید)
 # ---------------------------------------------------------
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('wallet:do_buy_new:'))
+@callback_router.prefix('wallet:do_buy_new:')
 async def execute_purchase_new(call: types.CallbackQuery):
     user_id = call.from_user.id
     msg_id = call.message.message_id
@@ -341,7 +344,7 @@ async def execute_purchase_new(call: types.CallbackQuery):
         logger.error(f"New Purchase Error: {e}")
         await bot.edit_message_text("❌ خطای غیرمنتظره.", user_id, msg_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('wallet:do_renew:'))
+@callback_router.prefix('wallet:do_renew:')
 async def execute_purchase_renew(call: types.CallbackQuery):
     parts = call.data.split(':')
     uuid_id = int(parts[2])
@@ -359,7 +362,7 @@ async def execute_purchase_renew(call: types.CallbackQuery):
             return
 
         async with db.get_session() as session:
-            uuid_obj = await session.get(UserUUID, uuid_id)
+            uuid_obj = await session.get(UserUUID, uuid_id, options=loader('uuid_panels'))
             if not uuid_obj or not uuid_obj.allowed_panels:
                 await bot.edit_message_text("❌ سرویس یا پنل مربوطه یافت نشد.", user_id, msg_id)
                 return
@@ -519,11 +522,12 @@ async def _finalize_transaction(user_id, plan, username, service_data, panel_nam
             
             target_thread = int(shop_topic_id) if shop_topic_id and int(shop_topic_id) != 0 else None
             
-            await bot.send_message(
-                chat_id=int(main_group_id),
-                text=log_text,
-                message_thread_id=target_thread,
-                parse_mode='HTML'
-            )
+            with send_priority(Priority.PURCHASE):
+                await bot.send_message(
+                    chat_id=int(main_group_id),
+                    text=log_text,
+                    message_thread_id=target_thread,
+                    parse_mode='HTML'
+                )
     except Exception as e:
         logger.error(f"Failed to send log to supergroup: {e}")
\ No newline at end of file
@@ -0,0 +1,151 @@
+# bot/utils/callback_router.py
+
+import logging
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+
+class Route:
+    __slots__ = ('name', 'handler', 'guard', 'seq', 'calls', 'total_ms', 'max_ms', 'errors')
+
+    def __init__(self, name: str, handler: Callable, guard: Optional[Callable], seq: int):
+        self.name = name
+        self.handler = handler
+        self.guard = guard
+        self.seq = seq
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+
+class _Node:
+    __slots__ = ('children', 'exact', 'prefix')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.exact: Optional[Route] = None
+        self.prefix: Optional[Route] = None
+
+
+class CallbackRouter:
+    """
+    مسیریاب مرکزی callback_data با درخت پیشوندی (Trie).
+    هزینه پیدا کردن هندلر به طول callback_data بستگی دارد، نه به تعداد هندلرها.
+    از بین مسیرهای منطبق (دقیق یا پیشوندی) مسیری که زودتر ثبت شده برنده است؛
+    یعنی همان رفتار قبلی ترتیب ثبت callback_query_handler ها حفظ می‌شود.
+
+        @callback_router.exact("settings")
+        @callback_router.prefix("toggle:")
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._seq = count()
+        self.routes: List[Route] = []
+
+    # --- ثبت مسیرها ---
+
+    def _node(self, key: str) -> _Node:
+        node = self._root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+        return node
+
+    def _add(self, kind: str, key: str, handler: Callable, guard: Optional[Callable]):
+        node = self._node(key)
+        if getattr(node, kind) is not None:
+            # مثل قبل اولین هندلر ثبت‌شده برای یک کلید برنده است
+            logger.debug(f"CALLBACK_ROUTER: duplicate {kind} route '{key}' ignored ({handler.__name__})")
+            return
+        route = Route(f"{kind}:{key}", handler, guard, next(self._seq))
+        setattr(node, kind, route)
+        self.routes.append(route)
+
+    def exact(self, key: str, guard: Optional[Callable] = None):
+        """دکوریتور: callback_data دقیقا برابر key."""
+        def decorator(handler):
+            self._add('exact', key, handler, guard)
+            return handler
+        return decorator
+
+    def prefix(self, *keys: str, guard: Optional[Callable] = None):
+        """دکوریتور: callback_data با یکی از keys شروع شود."""
+        def decorator(handler):
+            for key in keys:
+                self._add('prefix', key, handler, guard)
+            return handler
+        return decorator
+
+    def action(self, key: str, handler: Callable, guard: Optional[Callable] = None):
+        """یک اکشن با پارامترهای اختیاری: key یا key:param1:param2..."""
+        self._add('exact', key, handler, guard)
+        self._add('prefix', key + ':', handler, guard)
+
+    # --- پیدا کردن و اجرا ---
+
+    def match(self, call: types.CallbackQuery) -> Optional[Route]:
+        data = call.data or ''
+        node = self._root
+        candidates = [node.prefix] if node.prefix else []
+        for ch in data:
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.prefix:
+                candidates.append(node.prefix)
+        else:
+            if node.exact:
+                candidates.append(node.exact)
+
+        if len(candidates) > 1:
+            candidates.sort(key=lambda r: r.seq)
+        for route in candidates:
+            if route.guard is None or route.guard(call):
+                return route
+        return None
+
+    async def dispatch(self, call: types.CallbackQuery):
+        route = self.match(call)
+        if route is None:
+            logger.debug(f"CALLBACK_ROUTER: no route for '{call.data}'")
+            return
+
+        started = time.perf_counter()
+        try:
+            await route.handler(call)
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            route.calls += 1
+            route.total_ms += elapsed_ms
+            route.max_ms = max(route.max_ms, elapsed_ms)
+
+    def attach(self, bot):
+        """ثبت یک callback_query_handler واحد در بات که همه دکمه‌ها را به این مسیریاب می‌دهد."""
+        bot.callback_query_handler(func=lambda call: True)(self.dispatch)
+
+    # --- آمار ---
+
+    def top_routes(self, limit: int = 10, order_by: str = 'total_ms') -> list:
+        used = [r for r in self.routes if r.calls]
+        used.sort(key=lambda r: getattr(r, order_by), reverse=True)
+        return [
+            {'route': r.name, 'calls': r.calls, 'total_ms': r.total_ms, 'max_ms': r.max_ms,
+             'avg_ms': r.total_ms / r.calls, 'errors': r.errors}
+            for r in used[:limit]
+        ]
+
+    def reset_stats(self):
+        for r in self.routes:
+            r.calls, r.total_ms, r.max_ms, r.errors = 0, 0.0, 0.0, 0
+
+
+callback_router = CallbackRouter()
@@ -1,10 +1,10 @@
 # bot/utils/formatters.py
-import re
 import uuid
 import csv
 from datetime import datetime, date
 # اگر فایل کانفیگ شما رنگ‌ها را ندارد، می‌توانید خط زیر را کامنت کنید
 from bot.config import PROGRESS_COLORS 
+from bot.templates import escape_md
 
 # ---------------------------------------------------------
 # توابع فرمت‌دهی متن و اعداد
@@ -12,9 +12,7 @@ from bot.config import PROGRESS_COLORS
 
 def escape_markdown(text: str) -> str:
     """ایمن‌سازی متن برای پروتکل MarkdownV2 تلگرام"""
-    text = str(text)
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+    return escape_md(text)
 
 def bytes_to_gb(bytes_value: int) -> float:
     """تبدیل بایت به گیگابایت (عدد خام)"""
@@ -0,0 +1,47 @@
+# bot/utils/middlewares.py
+
+import re
+
+from telebot import types
+from telebot.asyncio_handler_backends import BaseMiddleware
+
+from bot.db.instrumentation import begin_scope, end_scope
+from bot.utils.callback_router import callback_router
+
+# پارامترهای callback_data که نباید حوزه جدید بسازند: عدد، UUID، توکن هگز و هر بخش طولانی
+_PARAM_PART = re.compile(r'-?\d+|[0-9a-fA-F-]{8,}|.{16,}')
+
+
+def _callback_scope(call: types.CallbackQuery) -> str:
+    """
+    نام حوزه یک دکمه: نام مسیر منطبق در callback_router (تعداد محدود)، وگرنه callback_data
+    با پارامترهای جایگزین‌شده با * (مثلا wallet:renew:*).
+    """
+    route = callback_router.match(call)
+    if route is not None:
+        return "cb:" + route.name
+    parts = ['*' if _PARAM_PART.fullmatch(part) else part for part in (call.data or '').split(':')[:3]]
+    return "cb:" + (':'.join(parts) or '?')
+
+
+class QueryScopeMiddleware(BaseMiddleware):
+    """
+    هر آپدیت (پیام یا دکمه) را یک حوزه مستقل برای آمار کوئری‌ها در نظر می‌گیرد
+    تا کوئری‌های تکراری یک هندلر (N+1) قابل شناسایی باشند.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+
+    async def pre_process(self, update, data):
+        if isinstance(update, types.CallbackQuery):
+            name = _callback_scope(update)
+        elif update.text and update.text.startswith('/'):
+            name = "msg:" + update.text.split()[0].split('@')[0]
+        else:
+            name = "msg:" + update.content_type
+        data['_sql_scope'] = begin_scope(name)
+
+    async def post_process(self, update, data, exception=None):
+        end_scope(data.pop('_sql_scope', None))
@@ -1,29 +1,36 @@
 # bot/utils/network.py
 
 import logging
-import asyncio
 from bot.bot_instance import bot
+from bot.services.send_scheduler import edit_dedup
+from bot.services.timer_wheel import timer_wheel
 
 logger = logging.getLogger(__name__)
 
 async def _safe_edit(chat_id: int, msg_id: int, text: str, **kwargs):
     """
     ویرایش امن پیام با قابلیت دیباگ و مدیریت خطاهای رایج تلگرام.
+    اگر متن و کیبورد با آخرین ویرایش همین پیام یکی باشد، درخواستی به تلگرام ارسال نمی‌شود.
     """
+    # تنظیم پیش‌فرض برای حالت نمایش
+    kwargs.setdefault('parse_mode', 'MarkdownV2')
+    fingerprint = edit_dedup.fingerprint(text, kwargs)
+    if edit_dedup.is_duplicate(chat_id, msg_id, fingerprint):
+        return
+
     try:
-        # تنظیم پیش‌فرض برای حالت نمایش
-        kwargs.setdefault('parse_mode', 'MarkdownV2')
-        
         await bot.edit_message_text(
             text=text, 
             chat_id=chat_id, 
             message_id=msg_id, 
             **kwargs
         )
+        edit_dedup.remember(chat_id, msg_id, fingerprint)
         
     except Exception as e:
         # نادیده گرفتن خطای "پیام تغییر نکرده است" (چون عملیات عملاً موفق بوده)
         if 'message is not modified' in str(e).lower():
+            edit_dedup.remember(chat_id, msg_id, fingerprint)
             return
 
         # نمایش دقیق خطا و متنی که باعث خطا شده در کنسول
@@ -38,8 +45,8 @@ async def _safe_edit(chat_id: int, msg_id: int, text: str, **kwargs):
 
 async def delete_message_delayed(chat_id, message_id, delay):
     """
-    حذف پیام با تاخیر (قابل استفاده در تسک‌های پس‌زمینه)
-    این تابع عمومی است و در همه جای ربات قابل استفاده می‌باشد.
+    حذف پیام با تاخیر (قابل استفاده در همه جای ربات).
+    حذف‌های با تاخیر در جدول delayed_actions ثبت می‌شوند (timer_wheel) و با ری‌استارت ربات از دست نمی‌روند.
     """
     if delay <= 0:
         try:
@@ -48,10 +55,4 @@ async def delete_message_delayed(chat_id, message_id, delay):
             pass
         return
 
-    await asyncio.sleep(delay)
-    try:
-        await bot.delete_message(chat_id, message_id)
-    except Exception as e:
-        # خطاهای معمول مثل "پیام یافت نشد" را لاگ نکنیم بهتر است
-        if "message to delete not found" not in str(e):
-            logger.warning(f"Failed to delete message (delayed): {e}")
\ No newline at end of file
+    await timer_wheel.schedule('delete_message', chat_id, message_id, delay=delay)
\ No newline at end of file
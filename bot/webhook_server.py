@@ -0,0 +1,216 @@
+# bot/webhook_server.py
+
+import asyncio
+import hmac
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from telebot import types
+
+from bot.services.send_scheduler import edit_dedup
+from bot.config import (
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS, WEBHOOK_MAX_CONNECTIONS,
+)
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+logger = logging.getLogger(__name__)
+
+# آپدیت‌هایی که در آن‌ها کاربر مشخص است به ترتیب ورود و پشت سر هم پردازش می‌شوند
+_USER_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request',
+)
+
+
+def _update_user_key(update: types.Update) -> Optional[int]:
+    for field in _USER_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is None:
+            continue
+        user = getattr(obj, 'from_user', None) or getattr(obj, 'user', None)
+        if user is not None:
+            return user.id
+    return None
+
+
+class UpdateDispatcher:
+    """
+    صف محدود آپدیت‌ها و استخر ورکر.
+    آپدیت‌های یک کاربر پشت سر هم و آپدیت‌های کاربران مختلف هم‌زمان پردازش می‌شوند؛
+    آپدیت کاربری که در حال پردازش است ورکر را اشغال نمی‌کند و در صف همان کاربر منتظر می‌ماند.
+    وقتی ظرفیت پر باشد enqueue مقدار False برمی‌گرداند و وب‌هوک 503 می‌دهد تا تلگرام بعدا دوباره بفرستد.
+    """
+
+    def __init__(self, bot, queue_size: int = WEBHOOK_QUEUE_SIZE, workers: int = WEBHOOK_WORKERS):
+        self.bot = bot
+        self.capacity = queue_size
+        self.worker_count = workers
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._user_backlog: Dict[int, deque] = {}
+        self._held = 0
+        self._workers = []
+        self.stats = {
+            'received': 0, 'processed': 0, 'rejected': 0, 'failed': 0,
+            'max_depth': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0, 'handle_ms_total': 0.0,
+        }
+        self._last_pressure_log = 0.0
+
+    def depth(self) -> int:
+        """آپدیت‌های منتظر: صف اصلی + صف‌های کاربران در حال پردازش."""
+        return self.queue.qsize() + self._held
+
+    def metrics(self) -> dict:
+        processed = max(self.stats['processed'], 1)
+        return {
+            'mode': 'webhook',
+            'depth': self.depth(),
+            'capacity': self.capacity,
+            'busy_users': len(self._user_backlog),
+            'workers': self.worker_count,
+            'received': self.stats['received'],
+            'processed': self.stats['processed'],
+            'rejected': self.stats['rejected'],
+            'failed': self.stats['failed'],
+            'max_depth': self.stats['max_depth'],
+            'avg_wait_ms': round(self.stats['wait_ms_total'] / processed, 1),
+            'max_wait_ms': round(self.stats['wait_ms_max'], 1),
+            'avg_handle_ms': round(self.stats['handle_ms_total'] / processed, 1),
+            'edit_dedup': edit_dedup.stats(),
+        }
+
+    def enqueue(self, update: types.Update) -> bool:
+        if self.depth() >= self.capacity:
+            self.stats['rejected'] += 1
+            self._log_pressure()
+            return False
+        self.stats['received'] += 1
+        self.queue.put_nowait((time.perf_counter(), update))
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.depth())
+        if self.depth() >= self.capacity * 0.8:
+            self._log_pressure()
+        return True
+
+    def _log_pressure(self):
+        now = time.monotonic()
+        if now - self._last_pressure_log >= 10:
+            self._last_pressure_log = now
+            logger.warning(f"WEBHOOK: update queue under pressure {json.dumps(self.metrics())}")
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                key = _update_user_key(item[1])
+                if key is not None and key in self._user_backlog:
+                    # کاربر در حال پردازش است؛ ورکر دیگر بعد از اتمام، این آپدیت را برمی‌دارد
+                    self._user_backlog[key].append(item)
+                    self._held += 1
+                    continue
+
+                if key is None:
+                    await self._process(item)
+                    continue
+
+                backlog = self._user_backlog[key] = deque()
+                try:
+                    await self._process(item)
+                    while backlog:
+                        self._held -= 1
+                        await self._process(backlog.popleft())
+                finally:
+                    self._held -= len(backlog)
+                    del self._user_backlog[key]
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, item):
+        enqueued_at, update = item
+        started = time.perf_counter()
+        wait_ms = (started - enqueued_at) * 1000
+        try:
+            await self.bot.process_new_updates([update])
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"WEBHOOK: failed to process update {update.update_id}: {e}", exc_info=True)
+        finally:
+            self.stats['processed'] += 1
+            self.stats['wait_ms_total'] += wait_ms
+            self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], wait_ms)
+            self.stats['handle_ms_total'] += (time.perf_counter() - started) * 1000
+
+
+def _build_app(dispatcher: UpdateDispatcher):
+    async def handle_update(request):
+        if WEBHOOK_SECRET_TOKEN:
+            token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if not hmac.compare_digest(token, WEBHOOK_SECRET_TOKEN):
+                return web.Response(status=403)
+        try:
+            update = types.Update.de_json(await request.text())
+        except Exception as e:
+            logger.warning(f"WEBHOOK: bad update payload: {e}")
+            return web.Response(status=400)
+        if not dispatcher.enqueue(update):
+            # تلگرام آپدیت‌های با پاسخ غیر 2xx را دوباره ارسال می‌کند
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(request):
+        return web.json_response(dispatcher.metrics())
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get('/healthz', handle_health)
+    return app
+
+
+async def run_webhook(bot):
+    """
+    اجرای ربات در حالت وب‌هوک: سرور aiohttp آپدیت‌ها را در صف می‌گذارد و استخر ورکر آن‌ها را پردازش می‌کند.
+    در صورت خطا در راه‌اندازی Exception بالا می‌رود تا فراخواننده به پولینگ برگردد.
+    """
+    if web is None:
+        raise RuntimeError("aiohttp is not installed")
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL (or BOT_DOMAIN) is not set")
+
+    dispatcher = UpdateDispatcher(bot)
+    runner = web.AppRunner(_build_app(dispatcher))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET_TOKEN or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    except Exception:
+        await runner.cleanup()
+        raise
+
+    dispatcher.start()
+    logger.info(f"WEBHOOK: listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} "
+                f"({WEBHOOK_WORKERS} workers, queue {WEBHOOK_QUEUE_SIZE})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await dispatcher.stop()
+        await runner.cleanup()
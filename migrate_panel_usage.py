@@ -0,0 +1,91 @@
+# migrate_panel_usage.py
+# انتقال اسنپ‌شات‌های مصرف از ساختار قدیمی (یک ستون برای هر نوع پنل در usage_snapshots)
+# به جدول panel_usage_snapshots (یک ردیف برای هر سرویس/پنل، شمارنده به بایت).
+# اجرا: python migrate_panel_usage.py [--drop-old]
+import asyncio
+import os
+import sys
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+from bot.db.base import DatabaseManager, Base
+
+load_dotenv()
+
+# ستون قدیمی -> نوع پنل
+LEGACY_COLUMNS = {
+    'hiddify_usage_gb': 'hiddify',
+    'marzban_usage_gb': 'marzban',
+    'remnawave_usage_gb': 'remnawave',
+    'pasarguard_usage_gb': 'pasarguard',
+}
+
+
+async def migrate():
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        print("❌ خطا: DATABASE_URL پیدا نشد. مطمئن شوید فایل .env وجود دارد.")
+        return
+
+    print("🔌 در حال اتصال به دیتابیس...")
+    db = DatabaseManager(db_url)
+
+    async with db.engine.begin() as conn:
+        # ---------------------------------------------------------
+        # 1. حذف نسخه قدیمی usage_day_baseline (بیس‌لاین‌ها هر شب دوباره ساخته می‌شوند)
+        # ---------------------------------------------------------
+        try:
+            print("⚙️ [1/3] بررسی ساختار usage_day_baseline...")
+            is_legacy = await conn.scalar(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'usage_day_baseline' AND column_name = 'hiddify_usage_gb'
+                )
+            """))
+            if is_legacy:
+                await conn.execute(text("DROP TABLE usage_day_baseline"))
+                print("✅ جدول قدیمی usage_day_baseline حذف شد.")
+        except Exception as e:
+            print(f"⚠️ خطا در بخش 1: {e}")
+
+        # ---------------------------------------------------------
+        # 2. ساخت جداول جدید
+        # ---------------------------------------------------------
+        print("⚙️ [2/3] ساخت جدول panel_usage_snapshots...")
+        await conn.run_sync(Base.metadata.create_all)
+
+        # ---------------------------------------------------------
+        # 3. کپی داده‌ها: مقدار هر ستون به پنلی از همان نوع که سرویس به آن دسترسی دارد
+        #    (در نبود دسترسی، اولین پنل همان نوع) نسبت داده می‌شود.
+        # ---------------------------------------------------------
+        for col, p_type in LEGACY_COLUMNS.items():
+            try:
+                print(f"⚙️ [3/3] انتقال ستون {col}...")
+                res = await conn.execute(text(f"""
+                    INSERT INTO panel_usage_snapshots (uuid_id, panel_id, taken_at, used_bytes)
+                    SELECT s.uuid_id, p.panel_id, s.taken_at, ROUND(s.{col} * 1073741824)::bigint
+                    FROM usage_snapshots s
+                    JOIN LATERAL (
+                        SELECT pn.id AS panel_id
+                        FROM panels pn
+                        LEFT JOIN uuid_panel_access a ON a.panel_id = pn.id AND a.uuid_id = s.uuid_id
+                        WHERE pn.panel_type = :p_type
+                        ORDER BY (a.uuid_id IS NULL), pn.id
+                        LIMIT 1
+                    ) p ON true
+                    WHERE s.uuid_id IS NOT NULL AND COALESCE(s.{col}, 0) > 0
+                    ON CONFLICT DO NOTHING
+                """), {'p_type': p_type})
+                print(f"✅ {res.rowcount} ردیف منتقل شد.")
+            except Exception as e:
+                print(f"⚠️ خطا در انتقال {col}: {e}")
+
+        if '--drop-old' in sys.argv:
+            await conn.execute(text("DROP TABLE IF EXISTS usage_snapshots"))
+            print("🗑 جدول قدیمی usage_snapshots حذف شد.")
+
+    await db.close()
+    print("🏁 عملیات دیتابیس به پایان رسید.")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -28,7 +28,7 @@ async def update_schema():
         # 1. اضافه کردن ستون remnawave_usage_gb
         # ---------------------------------------------------------
         try:
-            print("⚙️ [1/3] بررسی ستون remnawave_usage_gb...")
+            print("⚙️ [1/7] بررسی ستون remnawave_usage_gb...")
             await conn.execute(text("""
                 ALTER TABLE usage_snapshots 
                 ADD COLUMN IF NOT EXISTS remnawave_usage_gb FLOAT DEFAULT 0.0;
@@ -41,7 +41,7 @@ async def update_schema():
         # 2. اضافه کردن ستون pasarguard_usage_gb (جدید - حل مشکل شما)
         # ---------------------------------------------------------
         try:
-            print("⚙️ [2/3] بررسی ستون pasarguard_usage_gb...")
+            print("⚙️ [2/7] بررسی ستون pasarguard_usage_gb...")
             await conn.execute(text("""
                 ALTER TABLE usage_snapshots 
                 ADD COLUMN IF NOT EXISTS pasarguard_usage_gb FLOAT DEFAULT 0.0;
@@ -54,7 +54,7 @@ async def update_schema():
         # 3. اصلاح ستون updated_at در جدول broadcast_tasks
         # ---------------------------------------------------------
         try:
-            print("⚙️ [3/3] اصلاح ستون updated_at در جدول broadcast_tasks...")
+            print("⚙️ [3/7] اصلاح ستون updated_at در جدول broadcast_tasks...")
             await conn.execute(text("""
                 ALTER TABLE broadcast_tasks 
                 ALTER COLUMN updated_at DROP NOT NULL;
@@ -63,6 +63,67 @@ async def update_schema():
         except Exception as e:
             print(f"⚠️ خطا در بخش 3 (احتمالاً قبلاً انجام شده): {e}")
 
+        # ---------------------------------------------------------
+        # 4. ایندکس یکتای (uuid_id, warning_type) در warning_log برای Upsert گروهی
+        # ---------------------------------------------------------
+        try:
+            print("⚙️ [4/7] حذف رکوردهای تکراری و ساخت ایندکس یکتای warning_log...")
+            await conn.execute(text("""
+                DELETE FROM warning_log w
+                USING warning_log newer
+                WHERE w.uuid_id = newer.uuid_id
+                  AND w.warning_type = newer.warning_type
+                  AND (w.sent_at, w.id) < (newer.sent_at, newer.id);
+            """))
+            await conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_warning_uuid_type
+                ON warning_log (uuid_id, warning_type);
+            """))
+            print("✅ ایندکس 'uq_warning_uuid_type' ساخته شد.")
+        except Exception as e:
+            print(f"⚠️ خطا در بخش 4: {e}")
+
+        # ---------------------------------------------------------
+        # 5. ستون‌های پیشرفت و تفکیک خطا در broadcast_tasks (ادامه برادکست بعد از ری‌استارت)
+        # ---------------------------------------------------------
+        try:
+            print("⚙️ [5/7] بررسی ستون‌های پیشرفت broadcast_tasks...")
+            await conn.execute(text("""
+                ALTER TABLE broadcast_tasks
+                ADD COLUMN IF NOT EXISTS blocked_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS deactivated_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS flood_count INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS last_user_id BIGINT;
+            """))
+            print("✅ ستون‌های 'blocked_count', 'deactivated_count', 'flood_count', 'last_user_id' بررسی شدند.")
+        except Exception as e:
+            print(f"⚠️ خطا در بخش 5: {e}")
+
+        # ---------------------------------------------------------
+        # 6. ستون bot_blocked_at در users (حذف کاربران بلاک‌کننده از برادکست)
+        # ---------------------------------------------------------
+        try:
+            print("⚙️ [6/7] بررسی ستون bot_blocked_at...")
+            await conn.execute(text("""
+                ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS bot_blocked_at TIMESTAMP WITH TIME ZONE;
+            """))
+            print("✅ ستون 'bot_blocked_at' بررسی شد.")
+        except Exception as e:
+            print(f"⚠️ خطا در بخش 6: {e}")
+
+        # ---------------------------------------------------------
+        # 7. حذف ایندکس اضافی (uuid_id, taken_at)؛ کلید اصلی (uuid_id, panel_id, taken_at) همین جستجوها را پوشش می‌دهد
+        # ---------------------------------------------------------
+        try:
+            print("⚙️ [7/7] حذف ایندکس idx_panel_usage_uuid_time...")
+            await conn.execute(text("""
+                DROP INDEX IF EXISTS idx_panel_usage_uuid_time;
+            """))
+            print("✅ ایندکس 'idx_panel_usage_uuid_time' حذف شد.")
+        except Exception as e:
+            print(f"⚠️ خطا در بخش 7: {e}")
+
     await engine.dispose()
     print("🏁 عملیات دیتابیس به پایان رسید.")
 